@@ -1,9 +1,14 @@
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import Blueprint, Flask, current_app, render_template, request, jsonify, send_file, make_response
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
+import hmac
 import os
 import uuid
+import zipfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
+from functools import cached_property, wraps
 
 from dotenv import load_dotenv
 
@@ -14,35 +19,199 @@ if os.environ.get('FLASK_ENV') == 'production':
 else:
     from config import Config
 
-from core.pdf_processor import PDFProcessor
-from core.pdf_type_detector import PDFTypeDetector
-from core.final_smart_extractor_v17_accurate import FinalSmartExtractorV17Accurate
-from core.measure_based_extractor import MeasureBasedExtractor
-from core.ai_layout_extractor import AILayoutExtractor, AILayoutError
+# 抽出器やcv2・pytesseract・PIL等の重い依存は初回利用時にimportする（ワーカー起動を軽くするため）
+from core.ai_layout_extractor import AILayoutError
+from core.ocr_cache import configure_ocr_cache, get_ocr_cache
+from core.extractor_registry import ExtractorCache, get_spec, list_engines, resolve_engine, select_engine
 from utils.file_handler import FileHandler
+from utils.request_profiler import RequestProfiler, PROFILE_FORMATS
+from utils.retention_sweeper import RetentionSweeper
 
-app = Flask(__name__)
-app.config.from_object(Config)
-Config.init_app(app)
+bp = Blueprint('main', __name__)
 
-CORS(app, origins=app.config['CORS_ORIGINS'])
 
-# インスタンス化
-pdf_processor = PDFProcessor()
-pdf_type_detector = PDFTypeDetector()
-final_smart_extractor = FinalSmartExtractorV17Accurate()
-measure_based_extractor = MeasureBasedExtractor()
-file_handler = FileHandler(app.config)
-ai_layout_extractor = AILayoutExtractor(app.config)
+class AppServices:
+    """アプリが利用する処理クラス群（初回アクセス時に生成）"""
 
-@app.route('/')
+    def __init__(self, config):
+        self.config = config
+        self.extractors = ExtractorCache(config)
+
+    @cached_property
+    def file_handler(self):
+        return FileHandler(self.config)
+
+    @cached_property
+    def pdf_processor(self):
+        from core.pdf_processor import PDFProcessor
+        return PDFProcessor(self.config.get('TEMP_FOLDER', 'temp'))
+
+    @cached_property
+    def pdf_type_detector(self):
+        from core.pdf_type_detector import PDFTypeDetector
+        return PDFTypeDetector()
+
+    @cached_property
+    def ai_layout_extractor(self):
+        from core.ai_layout_extractor import AILayoutExtractor
+        return AILayoutExtractor(self.config)
+
+    @cached_property
+    def retention_sweeper(self):
+        return RetentionSweeper(self.file_handler, self.config.get('CLEANUP_INTERVAL', 0))
+
+    @cached_property
+    def request_profiler(self):
+        return RequestProfiler(self.config, self.file_handler.temp_folder)
+
+
+def services():
+    """現在のアプリのAppServicesを取得"""
+    return current_app.extensions['band_part_key']
+
+
+def analyze_upload(svc, file_id, filepath):
+    """PDFタイプの解析結果（アップロードごとに索引へ保存して再利用）"""
+    record = svc.file_handler.get_upload_record(file_id)
+    if record and record['profile']:
+        return record['profile']
+    analysis = svc.pdf_type_detector.analyze_for_extraction(filepath)
+    svc.file_handler.update_upload(file_id, profile=analysis)
+    return analysis
+
+
+def save_uploaded_pdf(svc, file):
+    """アップロードされたPDFを保存してページ数を記録（file_id, ファイル名, ページ数を返す）"""
+    # ユニークなIDを生成
+    file_id = str(uuid.uuid4())
+    
+    # ファイルを保存
+    filename = secure_filename(file.filename)
+    current_app.logger.info(f"Uploading file: {file.filename} -> {filename}")
+    filepath = svc.file_handler.save_upload(file, file_id, filename)
+    current_app.logger.info(f"Saved file to: {filepath}")
+    
+    # 基本的な解析を実行
+    page_count = svc.pdf_processor.get_page_count(filepath)
+    svc.file_handler.update_upload(file_id, page_count=page_count)
+    return file_id, filename, page_count
+
+
+class ExtractionFailed(Exception):
+    """抽出器が出力を作らなかった"""
+
+
+def plan_fast_extraction(svc, file_id, filepath, engine, options, logger):
+    """エンジンを決め（engine='auto' はPDFタイプから選択）、同じ条件の抽出結果があれば cached に入れる"""
+    engine_selection = 'requested'
+    if engine == 'auto':
+        try:
+            analysis = analyze_upload(svc, file_id, filepath)
+        except Exception as e:
+            logger.warning(f"PDF type detection failed: {e}")
+            analysis = None
+        engine = select_engine(analysis, options['parts'])
+        engine_selection = 'auto'
+
+    logger.info(f"Extraction engine: {engine} ({engine_selection})")
+
+    # 同じ内容のPDFを同じエンジン・バージョン・オプションで抽出済みなら、その結果を使う
+    params = {'version': get_spec(engine).version, 'options': options}
+    cached = svc.file_handler.find_output(file_id, engine, params)
+    if cached:
+        logger.info(f"Reusing extraction result: {cached['id']}")
+    return {
+        'engine': engine,
+        'engine_selection': engine_selection,
+        'params': params,
+        'output_id': cached['id'] if cached else svc.file_handler.output_id_for(file_id, engine, params),
+        'cached': cached,
+    }
+
+
+def finish_fast_extraction(svc, plan, file_id, output_path, result):
+    """抽出結果を索引に登録して、run_fast_extraction と同じ形の結果を返す"""
+    svc.file_handler.register_output(
+        plan['output_id'], output_path, upload_id=file_id, engine=plan['engine'], params=plan['params'],
+        result=result
+    )
+    return {'output_id': plan['output_id'], 'path': output_path, 'result': result,
+            'engine_selection': plan['engine_selection'], 'cached': False}
+
+
+def run_fast_extraction(svc, file_id, filepath, engine, options, logger):
+    """高速抽出を実行（engine='auto' はPDFタイプから選択、同じ条件の抽出結果があれば再利用）
+
+    リクエスト外のスレッドからも呼べるよう、アプリコンテキストに依存しない
+    """
+    plan = plan_fast_extraction(svc, file_id, filepath, engine, options, logger)
+    cached = plan['cached']
+    if cached:
+        return {'output_id': cached['id'], 'path': cached['path'], 'result': cached['result'],
+                'engine_selection': plan['engine_selection'], 'cached': True}
+    return run_planned_extraction(svc, plan, file_id, filepath, options)
+
+
+def run_planned_extraction(svc, plan, file_id, filepath, options):
+    """plan_fast_extraction で決めたエンジンでこのプロセス内で抽出"""
+    # 抽出器は一時フォルダの出力先へ直接保存する（ダウンロード時はこのファイルをそのまま返す）
+    extraction = svc.extractors.get(plan['engine']).extract(
+        filepath, options, output_path=svc.file_handler.build_output_path(plan['output_id'])
+    )
+    if not extraction.output_path or not os.path.exists(extraction.output_path):
+        raise ExtractionFailed(plan['engine'])
+
+    return finish_fast_extraction(svc, plan, file_id, extraction.output_path, {
+        'engine': extraction.engine,
+        'engine_version': extraction.version,
+        'parts_extracted': extraction.parts_extracted,
+        'details': extraction.details,
+    })
+
+
+def create_app(config_object=Config):
+    """アプリケーションファクトリ"""
+    app = Flask(__name__)
+    app.config.from_object(config_object)
+    config_object.init_app(app)
+
+    CORS(app, origins=app.config['CORS_ORIGINS'])
+
+    app.extensions['band_part_key'] = AppServices(app.config)
+    app.register_blueprint(bp)
+    configure_ocr_cache(app.config)
+
+    # 古いファイルの削除と容量管理はバックグラウンドで定期実行
+    if not app.testing:
+        app.extensions['band_part_key'].retention_sweeper.start()
+    return app
+
+
+def profiled(view):
+    """設定で有効かつ要求された場合、リクエストをプロファイラ下で実行"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        request_profiler = services().request_profiler
+        if not request_profiler.is_requested(request):
+            return view(*args, **kwargs)
+
+        result, profile_id = request_profiler.run(request.endpoint, view, *args, **kwargs)
+        current_app.logger.info(f"Profile saved: {profile_id}")
+
+        response = make_response(result)
+        response.headers['X-Profile-Id'] = profile_id
+        return response
+    return wrapper
+
+@bp.route('/')
 def index():
     """メインページ"""
     return render_template('index_v3.html')
 
-@app.route('/api/upload', methods=['POST'])
+@bp.route('/api/upload', methods=['POST'])
 def upload_file():
     """PDFファイルのアップロード"""
+    svc = services()
     if 'file' not in request.files:
         return jsonify({'error': 'ファイルが選択されていません'}), 400
     
@@ -50,21 +219,11 @@ def upload_file():
     if file.filename == '':
         return jsonify({'error': 'ファイルが選択されていません'}), 400
     
-    if not file_handler.allowed_file(file.filename):
+    if not svc.file_handler.allowed_file(file.filename):
         return jsonify({'error': 'PDFファイルのみアップロード可能です'}), 400
     
     try:
-        # ユニークなIDを生成
-        file_id = str(uuid.uuid4())
-        
-        # ファイルを保存
-        filename = secure_filename(file.filename)
-        app.logger.info(f"Uploading file: {file.filename} -> {filename}")
-        filepath = file_handler.save_upload(file, file_id, filename)
-        app.logger.info(f"Saved file to: {filepath}")
-        
-        # 基本的な解析を実行
-        page_count = pdf_processor.get_page_count(filepath)
+        file_id, filename, page_count = save_uploaded_pdf(svc, file)
         
         return jsonify({
             'id': file_id,
@@ -76,31 +235,36 @@ def upload_file():
     except Exception as e:
         return jsonify({'error': f'アップロード中にエラーが発生しました: {str(e)}'}), 500
 
-@app.route('/api/analyze/<file_id>', methods=['GET'])
+@bp.route('/api/analyze/<file_id>', methods=['GET'])
 def analyze_score(file_id):
     """楽譜の解析"""
+    svc = services()
     try:
-        filepath = file_handler.get_upload_path(file_id)
-        app.logger.info(f"Analyzing file_id: {file_id}, filepath: {filepath}")
+        filepath = svc.file_handler.get_upload_path(file_id)
+        current_app.logger.info(f"Analyzing file_id: {file_id}, filepath: {filepath}")
         
         if not filepath:
-            app.logger.error(f"File not found for file_id: {file_id}")
+            current_app.logger.error(f"File not found for file_id: {file_id}")
             return jsonify({'error': 'ファイルが見つかりません'}), 404
         
         # 簡易解析（ページ数のみ）
-        page_count = pdf_processor.get_page_count(filepath)
+        record = svc.file_handler.get_upload_record(file_id)
+        page_count = record['page_count'] if record and record['page_count'] is not None else None
+        if page_count is None:
+            page_count = svc.pdf_processor.get_page_count(filepath)
+            svc.file_handler.update_upload(file_id, page_count=page_count)
         
         # PDFタイプの自動検出
         pdf_type_info = None
         extraction_recommendation = None
         
         try:
-            analysis_result = pdf_type_detector.analyze_for_extraction(filepath)
+            analysis_result = analyze_upload(svc, file_id, filepath)
             pdf_type_info = analysis_result['pdf_type']
             extraction_recommendation = analysis_result['extraction_config']
-            app.logger.info(f"PDF type detected: {pdf_type_info['type']}")
+            current_app.logger.info(f"PDF type detected: {pdf_type_info['type']}")
         except Exception as e:
-            app.logger.warning(f"PDF type detection failed: {e}")
+            current_app.logger.warning(f"PDF type detection failed: {e}")
         
         return jsonify({
             'id': file_id,
@@ -113,37 +277,52 @@ def analyze_score(file_id):
         }), 200
         
     except Exception as e:
-        app.logger.error(f"Error analyzing file: {str(e)}")
+        current_app.logger.error(f"Error analyzing file: {str(e)}")
         return jsonify({'error': f'解析中にエラーが発生しました: {str(e)}'}), 500
 
-@app.route('/api/extract', methods=['POST'])
+@bp.route('/api/extract', methods=['POST'])
+@profiled
 def extract_parts():
-    """パートの抽出 - 最終スマート抽出のみ使用"""
+    """パートの抽出 - engine未指定時はPDFタイプから自動選択"""
+    svc = services()
     data = request.json
     file_id = data.get('file_id')
     mode = data.get('mode', 'fast')
     margin = int(data.get('margin', 0))
+    engine = data.get('engine') or 'auto'
     
     if not file_id:
         return jsonify({'error': 'ファイルIDが指定されていません'}), 400
     
+    if engine != 'auto':
+        try:
+            engine = resolve_engine(engine)
+        except KeyError as e:
+            return jsonify({'error': str(e.args[0])}), 400
+    
+    options = {
+        'parts': data.get('parts'),
+        'measures_per_line': data.get('measures_per_line'),
+        'show_lyrics': data.get('show_lyrics'),
+    }
+    
     try:
-        filepath = file_handler.get_upload_path(file_id)
+        filepath = svc.file_handler.get_upload_path(file_id)
         if not filepath:
             return jsonify({'error': 'ファイルが見つかりません'}), 404
         
         if mode == 'ai_precision':
-            app.logger.info("AI precision extraction requested")
+            current_app.logger.info("AI precision extraction requested")
             try:
-                temp_output_path = os.path.join(
-                    file_handler.temp_folder,
-                    f"{file_id}_ai_precision.pdf"
-                )
-                ai_result = ai_layout_extractor.extract_parts_pdf(
+                temp_output_path = svc.file_handler.build_output_path(f"{file_id}_ai_precision")
+                ai_result = svc.ai_layout_extractor.extract_parts_pdf(
                     filepath,
                     temp_output_path,
                     margin_px=margin,
                 )
+                svc.file_handler.register_output(
+                    f"{file_id}_ai_precision", temp_output_path, upload_id=file_id, engine='ai_precision'
+                )
                 return jsonify({
                     'id': file_id,
                     'output_id': f"{file_id}_ai_precision",
@@ -154,78 +333,258 @@ def extract_parts():
                     'fallback': False
                 }), 200
             except AILayoutError as e:
-                app.logger.warning(f"AI precision failed, fallback to fast: {e}")
+                current_app.logger.warning(f"AI precision failed, fallback to fast: {e}")
                 fallback_message = str(e)
             except Exception as e:
-                app.logger.error(f"AI precision error: {e}")
+                current_app.logger.error(f"AI precision error: {e}")
                 fallback_message = "AI精度モードでエラーが発生したため高速モードに切り替えました"
         else:
             fallback_message = None
 
-        # 最終スマート抽出V17（正確版：ギター位置回避ロジック付き）を実行
-        app.logger.info("Final smart extraction V17 (accurate: with guitar position avoidance logic)")
-
-        output_path = final_smart_extractor.extract_smart_final(filepath)
-
-        if output_path and os.path.exists(output_path):
-            temp_output_path = os.path.join(file_handler.temp_folder, f"{file_id}_final_smart.pdf")
-            import shutil
-            shutil.copy2(output_path, temp_output_path)
-
-            return jsonify({
-                'id': file_id,
-                'output_id': f"{file_id}_final_smart",
-                'status': 'completed',
-                'mode': 'final_smart',
-                'parts_extracted': ['vocal_integrated', 'keyboard'],
-                'fallback': mode == 'ai_precision',
-                'fallback_message': fallback_message
-            }), 200
-        return jsonify({'error': '抽出に失敗しました'}), 500
+        try:
+            extraction = run_fast_extraction(svc, file_id, filepath, engine, options, current_app.logger)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        except ExtractionFailed:
+            return jsonify({'error': '抽出に失敗しました'}), 500
+        output_id = extraction['output_id']
+        result = extraction['result']
+        engine_selection = extraction['engine_selection']
+        cached = extraction['cached']
+
+        return jsonify({
+            'id': file_id,
+            'output_id': output_id,
+            'status': 'completed',
+            'mode': 'fast',
+            **result,
+            'engine_selection': engine_selection,
+            'cached': bool(cached),
+            'fallback': mode == 'ai_precision',
+            'fallback_message': fallback_message
+        }), 200
         
     except Exception as e:
-        app.logger.error(f"Extraction error: {str(e)}")
+        current_app.logger.error(f"Extraction error: {str(e)}")
         import traceback
-        app.logger.error(traceback.format_exc())
+        current_app.logger.error(traceback.format_exc())
         return jsonify({'error': f'抽出中にエラーが発生しました: {str(e)}'}), 500
 
-@app.route('/api/download/<output_id>', methods=['GET'])
+@bp.route('/api/setlist', methods=['POST'])
+@profiled
+def extract_setlist():
+    """セットリスト（複数の楽譜）をまとめて抽出し、1つのPDF（しおり付き）またはZIPにする
+
+    JSONの file_ids（アップロード済み）か、multipartの files（まとめてアップロード）で楽譜を指定する。
+    各楽譜の抽出は SETLIST_MAX_WORKERS 個のワーカープロセスで並列に実行する
+    """
+    svc = services()
+    config = current_app.config
+    
+    if request.files:
+        data = request.form
+        files = request.files.getlist('files')
+        if any(not svc.file_handler.allowed_file(f.filename) for f in files):
+            return jsonify({'error': 'PDFファイルのみアップロード可能です'}), 400
+        file_ids = [save_uploaded_pdf(svc, f)[0] for f in files]
+        parts = data.get('parts')
+        parts = [part.strip() for part in parts.split(',') if part.strip()] if parts else None
+    else:
+        data = request.json or {}
+        file_ids = data.get('file_ids') or []
+        parts = data.get('parts')
+    
+    if not file_ids:
+        return jsonify({'error': 'ファイルIDが指定されていません'}), 400
+    max_scores = config.get('SETLIST_MAX_SCORES', 30)
+    if len(file_ids) > max_scores:
+        return jsonify({'error': f'1回のセットリストは{max_scores}曲までです'}), 400
+    
+    bundle_format = data.get('format', 'pdf')
+    if bundle_format not in ('pdf', 'zip'):
+        return jsonify({'error': "formatは pdf か zip を指定してください"}), 400
+    
+    engine = data.get('engine') or 'auto'
+    if engine != 'auto':
+        try:
+            engine = resolve_engine(engine)
+        except KeyError as e:
+            return jsonify({'error': str(e.args[0])}), 400
+    
+    measures_per_line = data.get('measures_per_line')
+    if measures_per_line in (None, ''):
+        measures_per_line = None
+    else:
+        try:
+            measures_per_line = int(measures_per_line)
+        except (TypeError, ValueError):
+            measures_per_line = 0
+        if measures_per_line < 1:
+            return jsonify({'error': 'measures_per_lineは1以上の整数を指定してください'}), 400
+    options = {
+        'parts': parts,
+        'measures_per_line': measures_per_line,
+        'show_lyrics': data.get('show_lyrics'),
+    }
+    logger = current_app.logger
+    
+    def complete(score, extraction):
+        score.update({
+            'status': 'completed',
+            'output_id': extraction['output_id'],
+            'path': extraction['path'],
+            'engine': extraction['result']['engine'],
+            'cached': extraction['cached'],
+        })
+    
+    # エンジンの決定と抽出済み結果の検索はこのプロセスで行い、抽出が必要な楽譜だけを残す
+    scores = []
+    pending = []
+    for file_id in file_ids:
+        score = {'file_id': file_id, 'status': 'failed', 'output_id': None, 'error': None}
+        scores.append(score)
+        try:
+            filepath = svc.file_handler.get_upload_path(file_id)
+            if not filepath:
+                score['error'] = 'ファイルが見つかりません'
+                continue
+            metadata = svc.file_handler.get_metadata(file_id) or {}
+            score['title'] = os.path.splitext(metadata.get('original_filename') or os.path.basename(filepath))[0]
+            
+            plan = plan_fast_extraction(svc, file_id, filepath, engine, options, logger)
+            cached = plan['cached']
+            if cached:
+                complete(score, {'output_id': cached['id'], 'path': cached['path'], 'result': cached['result'],
+                                 'cached': True})
+            else:
+                pending.append((score, plan, filepath))
+        except Exception as e:
+            logger.error(f"Setlist extraction error ({file_id}): {e}")
+            score['error'] = str(e)
+    
+    # PyMuPDFはスレッドセーフではなく抽出器も呼び出しごとの状態を持つため、
+    # 並列に抽出するときは SETLIST_MAX_WORKERS 個のワーカープロセスで実行する
+    workers = max(1, min(config.get('SETLIST_MAX_WORKERS', 2), len(pending)))
+    if workers > 1:
+        from core.batch_extract import extract_document
+        worker_config = {name: value for name, value in config.items() if name.isupper()}
+        jobs = [
+            {'input': filepath, 'output': svc.file_handler.build_output_path(plan['output_id']), 'hash': None,
+             'engine': plan['engine'], 'options': options, 'config': worker_config}
+            for _, plan, filepath in pending
+        ]
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            futures = {
+                pool.submit(extract_document, job): (score, plan, job)
+                for (score, plan, _), job in zip(pending, jobs)
+            }
+            # 終わった楽譜から記録する（ワーカーが異常終了してもその楽譜だけを失敗にし、完了済みの出力は残す）
+            for future in as_completed(futures):
+                score, plan, job = futures[future]
+                try:
+                    record = future.result()
+                    if record['status'] != 'completed':
+                        logger.error(f"Setlist extraction error ({score['file_id']}): {record['error']}")
+                        score['error'] = '抽出に失敗しました'
+                        continue
+                    complete(score, finish_fast_extraction(svc, plan, score['file_id'], job['output'], {
+                        'engine': plan['engine'],
+                        'engine_version': plan['params']['version'],
+                        'parts_extracted': record['parts_extracted'],
+                        'details': record['details'],
+                    }))
+                except Exception as e:
+                    logger.error(f"Setlist extraction error ({score['file_id']}): {type(e).__name__}: {e}")
+                    score['error'] = '抽出に失敗しました'
+    else:
+        for score, plan, filepath in pending:
+            try:
+                complete(score, run_planned_extraction(svc, plan, score['file_id'], filepath, options))
+            except ExtractionFailed:
+                score['error'] = '抽出に失敗しました'
+            except Exception as e:
+                logger.error(f"Setlist extraction error ({score['file_id']}): {e}")
+                score['error'] = str(e)
+    
+    completed = [score for score in scores if score['status'] == 'completed']
+    if not completed:
+        return jsonify({'error': '抽出に失敗しました', 'scores': scores}), 500
+    
+    try:
+        setlist_id = f"setlist_{uuid.uuid4().hex}"
+        paths = [score.pop('path') for score in completed]
+        titles = [score['title'] for score in completed]
+        if bundle_format == 'pdf':
+            bundle_path = svc.pdf_processor.merge_pdfs(
+                paths, svc.file_handler.build_output_path(setlist_id), titles=titles
+            )
+        else:
+            bundle_path = svc.file_handler.build_output_path(setlist_id, '.zip')
+            # PDFは圧縮済みのため無圧縮で格納
+            with zipfile.ZipFile(bundle_path, 'w', compression=zipfile.ZIP_STORED) as bundle:
+                for index, (path, title) in enumerate(zip(paths, titles), start=1):
+                    bundle.write(path, f"{index:02d}_{secure_filename(title) or 'score'}.pdf")
+        svc.file_handler.register_output(setlist_id, bundle_path, engine='setlist',
+                                         params={'file_ids': file_ids, 'options': options})
+    except Exception as e:
+        current_app.logger.error(f"Setlist bundle error: {e}")
+        return jsonify({'error': f'セットリストの作成中にエラーが発生しました: {str(e)}', 'scores': scores}), 500
+    
+    return jsonify({
+        'output_id': setlist_id,
+        'format': bundle_format,
+        'status': 'completed' if len(completed) == len(scores) else 'partial',
+        'scores': scores,
+    }), 200
+
+@bp.route('/api/engines', methods=['GET'])
+def get_engines():
+    """利用可能な抽出エンジンと対応能力の一覧"""
+    return jsonify({'engines': list_engines()}), 200
+
+@bp.route('/api/download/<output_id>', methods=['GET'])
 def download_result(output_id):
     """抽出結果のダウンロード"""
+    svc = services()
     try:
         # 一時フォルダから出力ファイルを探す
-        output_path = os.path.join(file_handler.temp_folder, f"{output_id}.pdf")
+        output_path = svc.file_handler.get_output_path(output_id)
         
-        if not os.path.exists(output_path):
+        if not output_path:
             return jsonify({'error': 'ファイルが見つかりません'}), 404
         
-        # ダウンロード用のファイル名を生成
-        download_name = f"extracted_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+        # ダウンロード用のファイル名を生成（セットリストのZIPは拡張子を合わせる）
+        extension = os.path.splitext(output_path)[1] or '.pdf'
+        download_name = f"extracted_{datetime.now().strftime('%Y%m%d_%H%M%S')}{extension}"
         
+        # ファイルから逐次送信し、Rangeリクエスト（分割・再開ダウンロード）にも応答する
         return send_file(
             output_path,
             as_attachment=True,
             download_name=download_name,
-            mimetype='application/pdf'
+            mimetype='application/zip' if extension == '.zip' else 'application/pdf',
+            conditional=True
         )
         
     except Exception as e:
         return jsonify({'error': f'ダウンロード中にエラーが発生しました: {str(e)}'}), 500
 
-@app.route('/api/preview/<file_id>/<int:page_num>', methods=['GET'])
+@bp.route('/api/preview/<file_id>/<int:page_num>', methods=['GET'])
+@profiled
 def get_preview(file_id, page_num):
     """ページプレビューの取得"""
+    svc = services()
     try:
-        filepath = file_handler.get_upload_path(file_id)
+        filepath = svc.file_handler.get_upload_path(file_id)
         if not filepath:
             return jsonify({'error': 'ファイルが見つかりません'}), 404
         
         # プレビュー画像を生成
-        preview_path = pdf_processor.generate_preview(
+        preview_path = svc.pdf_processor.generate_preview(
             filepath,
             page_num,
             file_id=file_id,
-            dpi=app.config.get('PREVIEW_DPI', 150)
+            dpi=current_app.config.get('PREVIEW_DPI', 150)
         )
         
         if preview_path and os.path.exists(preview_path):
@@ -236,37 +595,77 @@ def get_preview(file_id, page_num):
     except Exception as e:
         return jsonify({'error': f'プレビュー取得中にエラーが発生しました: {str(e)}'}), 500
 
-@app.route('/api/ai-layout/<file_id>/<int:page_num>', methods=['GET'])
+@bp.route('/api/ai-layout/<file_id>/<int:page_num>', methods=['GET'])
 def get_ai_layout(file_id, page_num):
     """AIレイアウト推定の取得"""
+    svc = services()
     try:
-        filepath = file_handler.get_upload_path(file_id)
+        filepath = svc.file_handler.get_upload_path(file_id)
         if not filepath:
             return jsonify({'error': 'ファイルが見つかりません'}), 404
 
-        layout_result = ai_layout_extractor.extract_layout_for_page(filepath, page_num)
+        layout_result = svc.ai_layout_extractor.extract_layout_for_page(filepath, page_num)
         return jsonify({
             'layout': layout_result.layout
         }), 200
     except AILayoutError as e:
-        app.logger.warning(f"AI layout error: {e}")
+        current_app.logger.warning(f"AI layout error: {e}")
         return jsonify({'error': str(e)}), 400
     except Exception as e:
-        app.logger.error(f"AI layout error: {str(e)}")
+        current_app.logger.error(f"AI layout error: {str(e)}")
         return jsonify({'error': f'AIレイアウト取得中にエラーが発生しました: {str(e)}'}), 500
 
-@app.route('/api/cleanup', methods=['POST'])
+def is_admin_request():
+    admin_token = current_app.config.get('ADMIN_TOKEN')
+    return bool(admin_token) and hmac.compare_digest(request.headers.get('X-Admin-Token', ''), admin_token)
+
+@bp.route('/api/admin/ocr-cache', methods=['GET'])
+def get_ocr_cache_stats():
+    """OCRキャッシュのヒット率（管理者用、このワーカープロセスの値）"""
+    if not is_admin_request():
+        return jsonify({'error': '権限がありません'}), 403
+    return jsonify({'pid': os.getpid(), 'ocr_cache': get_ocr_cache().stats()}), 200
+
+@bp.route('/api/admin/profiles/<profile_id>', methods=['GET'])
+def get_profile(profile_id):
+    """保存済みプロファイルの取得（管理者用）"""
+    svc = services()
+    if not is_admin_request():
+        return jsonify({'error': '権限がありません'}), 403
+
+    fmt = request.args.get('format', 'text')
+    if fmt not in PROFILE_FORMATS:
+        return jsonify({'error': f"formatは {', '.join(PROFILE_FORMATS)} のいずれかを指定してください"}), 400
+
+    profile_path = svc.request_profiler.get_profile_path(profile_id, fmt)
+    if not profile_path:
+        return jsonify({'error': 'プロファイルが見つかりません'}), 404
+
+    return send_file(
+        profile_path,
+        mimetype=PROFILE_FORMATS[fmt][1],
+        as_attachment=fmt == 'pstats',
+        download_name=os.path.basename(profile_path)
+    )
+
+@bp.route('/api/cleanup', methods=['POST'])
 def cleanup_old_files():
-    """古いファイルのクリーンアップ"""
+    """古いファイルのクリーンアップ（定期実行とは別に今すぐ1回実行）"""
+    svc = services()
     try:
-        deleted_count = file_handler.cleanup_old_files()
+        result = svc.retention_sweeper.sweep()
         return jsonify({
             'status': 'success',
-            'deleted_count': deleted_count
+            'deleted_count': result['files_freed'],
+            'freed_bytes': result['bytes_freed'],
+            'error_count': len(result['errors']),
+            'totals': svc.retention_sweeper.totals
         }), 200
     except Exception as e:
         return jsonify({'error': f'クリーンアップ中にエラーが発生しました: {str(e)}'}), 500
 
+app = create_app()
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=Config.DEBUG)
@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+"""
+抽出器ベンチマーク
+登録済みの抽出器をコーパス上で実行し、速度と正確さを計測する
+
+計測項目：
+1. 実行時間（wall time）とページ/秒
+2. ピークRSS（ジョブごとに子プロセスで計測）
+3. OCR呼び出し回数（pytesseract）
+4. 正解bbox（<name>.json）に対するパート抽出スコア
+
+使い方：
+    python -m benchmarks.harness --corpus test_scores --extractor v17 --json results.json
+"""
+
+import argparse
+import csv
+import glob
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+import fitz
+
+from core.extractor_registry import EXTRACTORS, TARGET_PARTS, load_extractor
+
+OCR_FUNCTIONS = (
+    'image_to_string',
+    'image_to_data',
+    'image_to_boxes',
+    'image_to_osd',
+    'image_to_pdf_or_hocr',
+)
+
+
+def find_corpus(paths: List[str]) -> List[Tuple[str, Optional[str]]]:
+    """PDFと正解JSON（同名の.json）の組を列挙"""
+    documents = []
+    for path in paths:
+        if os.path.isdir(path):
+            candidates = sorted(glob.glob(os.path.join(path, '**', '*.pdf'), recursive=True))
+        else:
+            candidates = sorted(glob.glob(path))
+
+        for pdf_path in candidates:
+            truth_path = os.path.splitext(pdf_path)[0] + '.json'
+            documents.append((pdf_path, truth_path if os.path.exists(truth_path) else None))
+
+    return documents
+
+
+class Instrumentation:
+    """OCR呼び出し回数と抽出領域（show_pdf_pageのclip）を記録"""
+
+    def __init__(self, source_path: str):
+        self.source_path = os.path.abspath(source_path)
+        self.ocr_calls = 0
+        self.placements: List[Dict] = []
+        self._originals = []
+
+    def __enter__(self):
+        try:
+            import pytesseract
+        except ImportError:
+            pytesseract = None
+
+        if pytesseract is not None:
+            for name in OCR_FUNCTIONS:
+                if hasattr(pytesseract, name):
+                    self._patch(pytesseract, name, self._count_ocr(getattr(pytesseract, name)))
+
+        self._patch(fitz.Page, 'show_pdf_page', self._record_placement(fitz.Page.show_pdf_page))
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        for owner, name, original in reversed(self._originals):
+            setattr(owner, name, original)
+        self._originals = []
+        return False
+
+    def _patch(self, owner, name, replacement):
+        self._originals.append((owner, name, getattr(owner, name)))
+        setattr(owner, name, replacement)
+
+    def _count_ocr(self, original):
+        def wrapper(*args, **kwargs):
+            self.ocr_calls += 1
+            return original(*args, **kwargs)
+        return wrapper
+
+    def _record_placement(self, original):
+        instrumentation = self
+
+        def wrapper(page, rect, src, pno=0, *args, **kwargs):
+            clip = kwargs.get('clip')
+            if clip is None and len(args) >= 5:
+                clip = args[4]
+
+            # 入力PDFから配置された領域のみ記録（中間PDFからの再配置は除外）
+            src_name = getattr(src, 'name', '') or ''
+            if src_name and os.path.abspath(src_name) == instrumentation.source_path:
+                source_rect = src[pno].rect if clip is None else fitz.Rect(clip) & src[pno].rect
+                instrumentation.placements.append({
+                    'page_index': pno,
+                    'clip': [source_rect.x0, source_rect.y0, source_rect.x1, source_rect.y1],
+                })
+            return original(page, rect, src, pno, *args, **kwargs)
+        return wrapper
+
+
+def _vertical_overlap(a: List[float], b: List[float]) -> float:
+    return max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+
+
+def score_against_truth(placements: List[Dict], truth: Dict, target_parts=TARGET_PARTS) -> Dict:
+    """抽出領域を正解の五線bboxと照合してスコアを算出
+
+    - 再現率: 対象パートの五線のうち、高さの半分以上が抽出領域で覆われた割合
+    - 適合率: 抽出領域のうち、最も重なる五線が対象パートである割合
+    """
+    staves_by_page: Dict[int, List[Dict]] = {}
+    for page in truth.get('pages', []):
+        staves = []
+        for system in page.get('systems', []):
+            staves.extend(system.get('staves', []))
+        staves_by_page[page['page_index']] = staves
+
+    target_staves = [
+        (page_index, staff)
+        for page_index, staves in staves_by_page.items()
+        for staff in staves
+        if staff['part'] in target_parts
+    ]
+
+    covered = 0
+    for page_index, staff in target_staves:
+        bbox = staff['bbox']
+        height = max(bbox[3] - bbox[1], 1e-6)
+        for placement in placements:
+            if placement['page_index'] != page_index:
+                continue
+            if _vertical_overlap(placement['clip'], bbox) / height >= 0.5:
+                covered += 1
+                break
+
+    correct = 0
+    for placement in placements:
+        staves = staves_by_page.get(placement['page_index'], [])
+        best = max(staves, key=lambda s: _vertical_overlap(placement['clip'], s['bbox']), default=None)
+        if best and _vertical_overlap(placement['clip'], best['bbox']) > 0 and best['part'] in target_parts:
+            correct += 1
+
+    recall = covered / len(target_staves) if target_staves else 0.0
+    precision = correct / len(placements) if placements else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall > 0 else 0.0
+
+    return {
+        'precision': round(precision, 4),
+        'recall': round(recall, 4),
+        'f1': round(f1, 4),
+        'target_staves': len(target_staves),
+        'placements': len(placements),
+    }
+
+
+def _peak_rss_kb() -> Optional[int]:
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOSはバイト、Linuxはキロバイト
+    return int(peak / 1024) if sys.platform == 'darwin' else int(peak)
+
+
+def run_job(name: str, pdf_path: str, truth_path: Optional[str]) -> Dict:
+    """1つの抽出器を1つの文書で実行して計測結果を返す"""
+    record = {
+        'extractor': name,
+        'document': os.path.basename(pdf_path),
+        'pages': 0,
+        'wall_time': None,
+        'pages_per_sec': None,
+        'peak_rss_kb': None,
+        'ocr_calls': 0,
+        'precision': None,
+        'recall': None,
+        'f1': None,
+        'output_path': None,
+        'output_size': None,
+        'error': None,
+    }
+
+    try:
+        with fitz.open(pdf_path) as pdf:
+            record['pages'] = len(pdf)
+
+        _, extract, kwargs = load_extractor(name)
+
+        # 入力の隣に出力を書く抽出器があるため、作業用ディレクトリのコピーで実行
+        with tempfile.TemporaryDirectory(prefix='bench_') as work_dir:
+            work_path = os.path.join(work_dir, os.path.basename(pdf_path))
+            shutil.copy2(pdf_path, work_path)
+
+            with Instrumentation(work_path) as instrumentation:
+                start = time.perf_counter()
+                output_path = extract(work_path, **kwargs)
+                elapsed = time.perf_counter() - start
+
+            if isinstance(output_path, dict):
+                output_path = output_path.get('output_path')
+
+            if output_path and os.path.exists(output_path):
+                record['output_size'] = os.path.getsize(output_path)
+                if not os.path.abspath(output_path).startswith(os.path.abspath(work_dir)):
+                    record['output_path'] = output_path
+
+        record['wall_time'] = round(elapsed, 4)
+        record['pages_per_sec'] = round(record['pages'] / elapsed, 3) if elapsed > 0 else None
+        record['ocr_calls'] = instrumentation.ocr_calls
+
+        if truth_path:
+            with open(truth_path, 'r', encoding='utf-8') as f:
+                truth = json.load(f)
+            record.update({
+                key: value
+                for key, value in score_against_truth(instrumentation.placements, truth).items()
+                if key in ('precision', 'recall', 'f1')
+            })
+    except Exception as e:
+        record['error'] = f"{type(e).__name__}: {e}"
+
+    record['peak_rss_kb'] = _peak_rss_kb()
+    return record
+
+
+def run_job_isolated(name: str, pdf_path: str, truth_path: Optional[str]) -> Dict:
+    """ピークRSSを正しく測るため、ジョブごとに新しいプロセスで実行"""
+    with multiprocessing.Pool(processes=1, maxtasksperchild=1) as pool:
+        return pool.apply(run_job, (name, pdf_path, truth_path))
+
+
+def run_benchmark(extractor_names: List[str], documents: List[Tuple[str, Optional[str]]],
+                  repeat: int = 1, isolated: bool = True) -> List[Dict]:
+    """全抽出器×全文書のベンチマークを実行"""
+    runner = run_job_isolated if isolated else run_job
+    results = []
+
+    for name in extractor_names:
+        for pdf_path, truth_path in documents:
+            for iteration in range(repeat):
+                print(f"  ⏱  {name}: {os.path.basename(pdf_path)} (run {iteration + 1}/{repeat})")
+                record = runner(name, pdf_path, truth_path)
+                record['run'] = iteration + 1
+                results.append(record)
+
+    return results
+
+
+def summarize(results: List[Dict]) -> Dict[str, Dict]:
+    """抽出器ごとの集計"""
+    summary: Dict[str, Dict] = {}
+
+    for name in dict.fromkeys(r['extractor'] for r in results):
+        rows = [r for r in results if r['extractor'] == name]
+        ok = [r for r in rows if r['error'] is None and r['wall_time'] is not None]
+        total_time = sum(r['wall_time'] for r in ok)
+        total_pages = sum(r['pages'] for r in ok)
+        scored = [r['f1'] for r in ok if r['f1'] is not None]
+        rss = [r['peak_rss_kb'] for r in rows if r['peak_rss_kb'] is not None]
+
+        summary[name] = {
+            'runs': len(rows),
+            'errors': len(rows) - len(ok),
+            'total_wall_time': round(total_time, 4),
+            'pages_per_sec': round(total_pages / total_time, 3) if total_time > 0 else None,
+            'max_peak_rss_kb': max(rss) if rss else None,
+            'ocr_calls': sum(r['ocr_calls'] for r in ok),
+            'mean_f1': round(sum(scored) / len(scored), 4) if scored else None,
+        }
+
+    return summary
+
+
+def write_json(results: List[Dict], output_path: str) -> None:
+    payload = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'summary': summarize(results),
+        'results': results,
+    }
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
+
+
+def write_csv(results: List[Dict], output_path: str) -> None:
+    if not results:
+        return
+    with open(output_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(results[0].keys()))
+        writer.writeheader()
+        writer.writerows(results)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='抽出器ベンチマーク')
+    parser.add_argument('--corpus', nargs='+', required=True,
+                        help='PDFを含むディレクトリまたはglob（同名の.jsonを正解として使用）')
+    parser.add_argument('--extractor', action='append', dest='extractors',
+                        help=f"抽出器名（複数指定可、'all'で全て）: {', '.join(EXTRACTORS)}")
+    parser.add_argument('--repeat', type=int, default=1, help='各ジョブの繰り返し回数')
+    parser.add_argument('--in-process', action='store_true',
+                        help='子プロセスを使わずに実行（ピークRSSは累積値になる）')
+    parser.add_argument('--json', dest='json_path', help='JSON出力先')
+    parser.add_argument('--csv', dest='csv_path', help='CSV出力先')
+    args = parser.parse_args(argv)
+
+    names = args.extractors or ['v17']
+    if 'all' in names:
+        names = list(EXTRACTORS)
+    unknown = [n for n in names if n not in EXTRACTORS]
+    if unknown:
+        parser.error(f"未登録の抽出器: {', '.join(unknown)}")
+
+    documents = find_corpus(args.corpus)
+    if not documents:
+        parser.error('コーパスにPDFが見つかりません')
+
+    print(f"🏁 Benchmark: {len(names)} extractors × {len(documents)} documents")
+    results = run_benchmark(names, documents, repeat=args.repeat, isolated=not args.in_process)
+
+    for name, stats in summarize(results).items():
+        print(f"  {name:>14}: {stats['pages_per_sec']} pages/s, "
+              f"f1={stats['mean_f1']}, ocr={stats['ocr_calls']}, "
+              f"rss={stats['max_peak_rss_kb']}KB, errors={stats['errors']}")
+
+    if args.json_path:
+        write_json(results, args.json_path)
+        print(f"  JSON: {args.json_path}")
+    if args.csv_path:
+        write_csv(results, args.csv_path)
+        print(f"  CSV: {args.csv_path}")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
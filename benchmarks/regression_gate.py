@@ -0,0 +1,441 @@
+#!/usr/bin/env python3
+"""
+性能回帰ゲート
+本番抽出器・プレビュー生成・AIレイアウト抽出（HTTPはスタブ）の処理時間を計測し、
+保存済みのベースラインJSONと比較して許容範囲を超えて遅くなった場合に非ゼロで終了する
+
+使い方：
+    # ベースラインの作成/更新
+    python -m benchmarks.regression_gate --update-baseline
+    # 回帰チェック（CI用）
+    python -m benchmarks.regression_gate --tolerance 0.3
+"""
+
+import argparse
+import base64
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+from unittest import mock
+
+import fitz
+
+from benchmarks.harness import find_corpus, load_extractor
+from benchmarks.synthetic_scores import SyntheticScoreSpec, generate_score
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# 抽出器ごとの計測対象ステージ（メソッド名）
+STAGES = {
+    'v17': [
+        'detect_score_start',
+        'detect_pdf_type',
+        'extract_systems_accurately',
+        'segment_systems',
+        'ocr_label_lines',
+        'detect_all_instrument_labels_v17',
+        'map_instruments_accurately_v17',
+        'transfer_system_content_v17',
+        'save_output_v17',
+    ],
+    'measure_based': [
+        '_extract_systems_from_page',
+        '_extract_systems_fast',
+        '_find_instrument_labels',
+        '_page_token_index',
+        '_detect_page_measures',
+        '_detect_measures',
+        '_create_output_pdf',
+    ],
+}
+
+# 既定のコーパス（ベースラインと同じ条件で比較できるよう固定）
+DEFAULT_CORPUS = [
+    ('gate_vector', SyntheticScoreSpec(pages=2, systems_per_page=2, seed=11)),
+    ('gate_scan', SyntheticScoreSpec(pages=2, systems_per_page=2, seed=12, scan=True, noise=0.03)),
+]
+
+
+class StageTimer:
+    """インスタンスのメソッドを包んで、ステージごとの累積時間を記録"""
+
+    def __init__(self):
+        self.totals: Dict[str, float] = {}
+        self.calls: Dict[str, int] = {}
+
+    def wrap(self, instance, method_names: List[str]) -> None:
+        for name in method_names:
+            if hasattr(instance, name):
+                setattr(instance, name, self._timed(name, getattr(instance, name)))
+
+    def _timed(self, name, method):
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.totals[name] = self.totals.get(name, 0.0) + time.perf_counter() - start
+                self.calls[name] = self.calls.get(name, 0) + 1
+        return wrapper
+
+
+def _median_suite(runs: List[Dict]) -> Dict:
+    """繰り返し計測の中央値を取る（最初の1回はimport等のウォームアップとして除外）"""
+    runs = runs[1:] or runs
+    stage_names = sorted({name for run in runs for name in run['stages']})
+    return {
+        'pages': runs[0]['pages'],
+        'wall_time': round(statistics.median(r['wall_time'] for r in runs), 5),
+        'pages_per_sec': round(statistics.median(r['pages_per_sec'] for r in runs), 4),
+        'stages': {
+            name: round(statistics.median(r['stages'].get(name, 0.0) for r in runs), 5)
+            for name in stage_names
+        },
+    }
+
+
+def _page_count(pdf_path: str) -> int:
+    with fitz.open(pdf_path) as pdf:
+        return len(pdf)
+
+
+def ocr_available() -> bool:
+    """tesseract が使えるか（OCRなしの計測はOCRのステージが空になり、比較の基準にならない）"""
+    try:
+        import pytesseract
+        pytesseract.get_tesseract_version()
+        return True
+    except Exception:
+        return False
+
+
+def measure_extractor(name: str, documents: List[Tuple[str, Optional[str]]], repeat: int) -> Dict:
+    """本番抽出器の全体時間とステージ別時間（1ページあたり秒）
+
+    抽出に失敗した文書があれば RuntimeError（失敗した抽出の時間は比較の基準にならないため）
+    """
+    runs = []
+    for _ in range(repeat + 1):
+        instance, extract, kwargs = load_extractor(name)
+        timer = StageTimer()
+        timer.wrap(instance, STAGES.get(name, []))
+
+        pages = 0
+        start = time.perf_counter()
+        for pdf_path, _ in documents:
+            pages += _page_count(pdf_path)
+            output_path = extract(pdf_path, **kwargs)
+            if isinstance(output_path, dict):
+                output_path = output_path.get('output_path')
+            if not output_path or not os.path.exists(output_path):
+                raise RuntimeError(f"{name}: {os.path.basename(pdf_path)} の抽出に失敗しました")
+        elapsed = time.perf_counter() - start
+
+        runs.append({
+            'pages': pages,
+            'wall_time': elapsed,
+            'pages_per_sec': pages / elapsed if elapsed > 0 else 0.0,
+            'stages': {stage: total / pages for stage, total in timer.totals.items()},
+        })
+
+    return _median_suite(runs)
+
+
+def measure_preview(documents: List[Tuple[str, Optional[str]]], repeat: int, dpi: int = 150) -> Dict:
+    """PDFProcessor.generate_preview の1ページあたり時間"""
+    from core.pdf_processor import PDFProcessor
+
+    runs = []
+    with tempfile.TemporaryDirectory(prefix='gate_preview_') as temp_dir:
+        processor = PDFProcessor(temp_dir)
+
+        for _ in range(repeat + 1):
+            pages = 0
+            start = time.perf_counter()
+            for pdf_path, _ in documents:
+                for page_num in range(_page_count(pdf_path)):
+                    processor.generate_preview(pdf_path, page_num, file_id='gate', dpi=dpi)
+                    pages += 1
+            elapsed = time.perf_counter() - start
+            runs.append({
+                'pages': pages,
+                'wall_time': elapsed,
+                'pages_per_sec': pages / elapsed if elapsed > 0 else 0.0,
+                'stages': {'generate_preview': elapsed / pages},
+            })
+
+    return _median_suite(runs)
+
+
+class _StubResponse:
+    def __init__(self, payload: Dict):
+        self._payload = payload
+
+    def raise_for_status(self):
+        return None
+
+    def json(self):
+        return self._payload
+
+
+class _StubAIBackend:
+    """requests.post の代わりに正解データからレイアウトを返すスタブ"""
+
+    def __init__(self, truth: Optional[Dict], dpi: int):
+        self.truth = truth
+        self.dpi = dpi
+        self.calls = 0
+
+    def post(self, url, **kwargs):
+        from PIL import Image
+
+        image_url = kwargs['json']['input'][1]['content'][2]['image_url']
+        image = Image.open(io.BytesIO(base64.b64decode(image_url.split(',', 1)[1])))
+        layout = _stub_layout(self.truth, self.calls, image.width, image.height, self.dpi)
+        self.calls += 1
+        return _StubResponse({'output': [{'content': [
+            {'type': 'output_text', 'text': json.dumps(layout)}
+        ]}]})
+
+
+def _stub_layout(truth: Optional[Dict], page_index: int, width: int, height: int, dpi: int) -> Dict:
+    """正解データからAIレスポンス相当のレイアウトを作る（正解がなければ上下半分）"""
+    scale = dpi / 72.0
+    parts = []
+
+    if truth and page_index < len(truth.get('pages', [])):
+        for system in truth['pages'][page_index]['systems']:
+            for part in system.get('parts', []):
+                if part['part'] not in ('vocal', 'keyboard'):
+                    continue
+                x0, y0, x1, y1 = [v * scale for v in part['bbox']]
+                parts.append({
+                    'part_name': part['part'],
+                    'bbox': {'x': max(x0, 0), 'y': max(y0, 0),
+                             'width': max(x1 - x0, 1), 'height': max(y1 - y0, 1)},
+                    'confidence': 0.9,
+                })
+
+    if not parts:
+        parts = [
+            {'part_name': 'vocal', 'bbox': {'x': 0, 'y': 0, 'width': width, 'height': height / 2},
+             'confidence': 0.9},
+            {'part_name': 'keyboard', 'bbox': {'x': 0, 'y': height / 2, 'width': width, 'height': height / 2},
+             'confidence': 0.9},
+        ]
+
+    return {
+        'schema_version': '1.0',
+        'page_index': page_index,
+        'image_width': width,
+        'image_height': height,
+        'confidence': 0.9,
+        'parts': parts,
+    }
+
+
+def measure_ai_layout(documents: List[Tuple[str, Optional[str]]], repeat: int, dpi: int = 100) -> Dict:
+    """AILayoutExtractor.extract_parts_pdf をスタブHTTPで実行（レンダリング・検証・合成の時間）"""
+    from core.ai_layout_extractor import AILayoutExtractor
+
+    config = {
+        'AI_API_KEY': 'regression-gate',
+        'AI_IMAGE_DPI': dpi,
+        'AI_MAX_PAGES': 100,
+        'AI_CONFIDENCE_THRESHOLD': 0.6,
+    }
+
+    runs = []
+    with tempfile.TemporaryDirectory(prefix='gate_ai_') as temp_dir:
+        for _ in range(repeat + 1):
+            extractor = AILayoutExtractor(config)
+            timer = StageTimer()
+            timer.wrap(extractor, ['_render_page_image', '_call_ai_for_layout', '_validate_layout',
+                                   '_append_image_page'])
+            pages = 0
+            start = time.perf_counter()
+
+            for doc_index, (pdf_path, truth_path) in enumerate(documents):
+                truth = None
+                if truth_path:
+                    with open(truth_path, 'r', encoding='utf-8') as f:
+                        truth = json.load(f)
+
+                backend = _StubAIBackend(truth, dpi)
+                output_path = os.path.join(temp_dir, f"ai_{doc_index}.pdf")
+                with mock.patch('requests.post', backend.post):
+                    result = extractor.extract_parts_pdf(pdf_path, output_path, margin_px=0)
+                pages += result['total_pages']
+
+            elapsed = time.perf_counter() - start
+            runs.append({
+                'pages': pages,
+                'wall_time': elapsed,
+                'pages_per_sec': pages / elapsed if elapsed > 0 else 0.0,
+                'stages': {stage: total / pages for stage, total in timer.totals.items()},
+            })
+
+    return _median_suite(runs)
+
+
+def compare(current: Dict, baseline: Dict, tolerance: float, stage_tolerance: float,
+            min_seconds: float) -> List[str]:
+    """ベースラインと比較して回帰の一覧を返す"""
+    regressions = []
+
+    base_suites = baseline.get('suites', {})
+    for suite_name in sorted(set(current['suites']) - set(base_suites)):
+        regressions.append(f"{suite_name}: not in baseline (update it with --update-baseline)")
+
+    for suite_name, base_suite in base_suites.items():
+        suite = current['suites'].get(suite_name)
+        if suite is None:
+            continue
+
+        # ステージの名前が変わった・増えた・なくなった場合は、ベースラインを作り直すまで通さない
+        # （ベースラインにないステージは比較されず、回帰しても見逃すため）
+        base_stages = base_suite.get('stages', {})
+        for stage in sorted(set(suite['stages']) - set(base_stages)):
+            regressions.append(
+                f"{suite_name}.{stage}: not in baseline (update it with --update-baseline)"
+            )
+        for stage in sorted(set(base_stages) - set(suite['stages'])):
+            regressions.append(
+                f"{suite_name}.{stage}: in baseline but not measured (update it with --update-baseline)"
+            )
+
+        base_pps = base_suite.get('pages_per_sec') or 0
+        if base_pps and suite['pages_per_sec'] < base_pps * (1 - tolerance):
+            regressions.append(
+                f"{suite_name}: pages/sec {suite['pages_per_sec']:.3f} < "
+                f"baseline {base_pps:.3f} (-{tolerance:.0%})"
+            )
+
+        for stage, base_time in base_suite.get('stages', {}).items():
+            current_time = suite['stages'].get(stage)
+            if current_time is None:
+                continue
+            # ごく短いステージは揺らぎが大きいため絶対値の猶予を設ける
+            limit = base_time * (1 + stage_tolerance) + min_seconds
+            if current_time > limit:
+                regressions.append(
+                    f"{suite_name}.{stage}: {current_time * 1000:.1f}ms/page > "
+                    f"baseline {base_time * 1000:.1f}ms/page (+{stage_tolerance:.0%})"
+                )
+
+    return regressions
+
+
+def prepare_corpus(corpus: Optional[List[str]], work_dir: str) -> List[Tuple[str, Optional[str]]]:
+    if corpus:
+        return find_corpus(corpus)
+
+    documents = []
+    for name, spec in DEFAULT_CORPUS:
+        pdf_path = os.path.join(work_dir, f"{name}.pdf")
+        generate_score(pdf_path, spec)
+        documents.append((pdf_path, os.path.splitext(pdf_path)[0] + '.json'))
+    return documents
+
+
+def run_suites(extractors: List[str], documents: List[Tuple[str, Optional[str]]], repeat: int) -> Dict:
+    suites = {f"extract_{name}": measure_extractor(name, documents, repeat) for name in extractors}
+    suites['preview'] = measure_preview(documents, repeat)
+    suites['ai_layout_stub'] = measure_ai_layout(documents, repeat)
+    return {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'extractors': extractors,
+        'documents': [os.path.basename(p) for p, _ in documents],
+        'suites': suites,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='性能回帰ゲート')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='ベースラインJSONのパス')
+    parser.add_argument('--extractor', default=','.join(STAGES),
+                        help='本番抽出器の登録名（カンマ区切りで複数、既定: ステージを計測する全抽出器）')
+    parser.add_argument('--corpus', nargs='+', help='コーパス（省略時は固定の合成スコアを生成）')
+    parser.add_argument('--repeat', type=int, default=3, help='計測の繰り返し回数（中央値を採用）')
+    parser.add_argument('--tolerance', type=float, default=None,
+                        help='pages/secの許容低下率（既定: ベースライン記載値または0.3）')
+    parser.add_argument('--stage-tolerance', type=float, default=None,
+                        help='ステージ時間の許容増加率（既定: ベースライン記載値または0.5）')
+    parser.add_argument('--min-seconds', type=float, default=None,
+                        help='ステージ時間の絶対猶予（秒/ページ、既定: 0.02）')
+    parser.add_argument('--update-baseline', action='store_true', help='計測結果でベースラインを更新')
+    parser.add_argument('--output', help='今回の計測結果JSONの出力先')
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    saved = (baseline or {}).get('tolerances', {})
+    tolerance = args.tolerance if args.tolerance is not None else saved.get('tolerance', 0.3)
+    stage_tolerance = args.stage_tolerance if args.stage_tolerance is not None else \
+        saved.get('stage_tolerance', 0.5)
+    min_seconds = args.min_seconds if args.min_seconds is not None else saved.get('min_seconds', 0.02)
+
+    with tempfile.TemporaryDirectory(prefix='gate_corpus_') as work_dir:
+        documents = prepare_corpus(args.corpus, work_dir)
+        if not documents:
+            print('❌ コーパスにPDFが見つかりません')
+            return 2
+
+        extractors = [name.strip() for name in args.extractor.split(',') if name.strip()]
+        if extractors and not ocr_available():
+            print('❌ tesseract が見つかりません（OCRを含む抽出器の計測にはOCR環境が必要です）')
+            return 2
+
+        print(f"🚦 Regression gate: {', '.join(extractors)} × {len(documents)} documents (repeat={args.repeat})")
+        try:
+            current = run_suites(extractors, documents, args.repeat)
+        except RuntimeError as e:
+            print(f"❌ {e}")
+            return 2
+
+    current['tolerances'] = {
+        'tolerance': tolerance,
+        'stage_tolerance': stage_tolerance,
+        'min_seconds': min_seconds,
+    }
+
+    for suite_name, suite in current['suites'].items():
+        print(f"  {suite_name}: {suite['pages_per_sec']:.3f} pages/s")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(current, f, ensure_ascii=False, indent=2)
+            f.write('\n')
+
+    if args.update_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(current, f, ensure_ascii=False, indent=2)
+            f.write('\n')
+        print(f"✅ Baseline updated: {args.baseline}")
+        return 0
+
+    if baseline is None:
+        print(f"❌ ベースラインがありません: {args.baseline}（--update-baseline で作成してください）")
+        return 2
+
+    regressions = compare(current, baseline, tolerance, stage_tolerance, min_seconds)
+    if regressions:
+        print('❌ Performance regression detected:')
+        for line in regressions:
+            print(f"  - {line}")
+        return 1
+
+    print('✅ No performance regression')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+合成バンドスコアPDF生成
+著作権のある実楽譜の代わりに、再現可能なベンチマーク/テスト用の楽譜を生成する
+
+特徴：
+1. ページあたりのシステム数、パート順（Vo/Gt/Ba/Key/Dr）を指定可能
+2. 楽器ラベルの表記と言語（英略称・英語・日本語）を切り替え
+3. 小節線・コード記号・歌詞を描画
+4. ベクターPDFとスキャン風画像PDF（ノイズ・傾き付き）の両方を出力
+5. 五線とパートのbboxを正解JSONとして同時に出力
+
+使い方：
+    python -m benchmarks.synthetic_scores --out test_scores/synthetic --count 12
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+from dataclasses import asdict, dataclass, replace
+from typing import Dict, List, Optional, Tuple
+
+import fitz
+
+PARTS = ('vocal', 'guitar', 'bass', 'keyboard', 'drums')
+
+LABEL_STYLES = {
+    'en': {'vocal': 'Vo.', 'guitar': 'Gt.', 'bass': 'Ba.', 'keyboard': 'Key.', 'drums': 'Dr.'},
+    'en_long': {'vocal': 'Vocal', 'guitar': 'Guitar', 'bass': 'Bass', 'keyboard': 'Keyboard', 'drums': 'Drums'},
+    'ja': {'vocal': 'ボーカル', 'guitar': 'ギター', 'bass': 'ベース', 'keyboard': 'キーボード', 'drums': 'ドラム'},
+}
+
+CHORDS = ['C', 'Dm', 'Em', 'F', 'G7', 'Am', 'Bm7-5', 'Cmaj7', 'D/F#', 'Fm6', 'E7', 'Asus4']
+LYRICS = {
+    'en': ['la', 'oh', 'my', 'love', 'shine', 'on', 'the', 'night', 'we', 'go'],
+    'ja': ['あ', 'い', 'う', 'え', 'お', 'か', 'き', 'そ', 'ら', 'に'],
+}
+
+
+@dataclass
+class SyntheticScoreSpec:
+    pages: int = 3
+    systems_per_page: int = 2
+    staff_order: Tuple[str, ...] = PARTS
+    label_style: str = 'en'
+    labels: Optional[Dict[str, str]] = None
+    grand_staff_keyboard: bool = False
+    measures_per_system: int = 4
+    chords: bool = True
+    lyrics: bool = True
+    scan: bool = False
+    scan_dpi: int = 150
+    noise: float = 0.0
+    skew_deg: float = 0.0
+    seed: int = 0
+    page_width: float = 595
+    page_height: float = 842
+    margin: float = 40
+    label_width: float = 70
+
+
+def _rect(x0, y0, x1, y1) -> List[float]:
+    return [round(x0, 2), round(y0, 2), round(x1, 2), round(y1, 2)]
+
+
+def _insert_label(page: fitz.Page, point: Tuple[float, float], text: str, fontsize: float) -> None:
+    # 日本語はCJKフォント、ラテン文字はHelveticaで描画（テキスト層で正しく取り出せるように）
+    fontname = 'japan' if any(ord(c) > 0x2E80 for c in text) else 'helv'
+    page.insert_text(point, text, fontsize=fontsize, fontname=fontname)
+
+
+def _draw_system(page: fitz.Page, spec: SyntheticScoreSpec, rng: random.Random,
+                 y_top: float, system_height: float) -> Dict:
+    """1システムを描画して正解情報を返す"""
+    labels = spec.labels or LABEL_STYLES[spec.label_style]
+    lyric_words = LYRICS['ja' if spec.label_style == 'ja' else 'en']
+
+    # (パート, ラベル, 大譜表の2段目か)
+    part_counts = {part: spec.staff_order.count(part) for part in spec.staff_order}
+    part_seen: Dict[str, int] = {}
+    staves_to_draw = []
+    for part in spec.staff_order:
+        part_seen[part] = part_seen.get(part, 0) + 1
+        label_text = labels.get(part, part)
+        if part_counts[part] > 1:
+            label_text = f"{label_text}{part_seen[part]}"
+        staves_to_draw.append((part, label_text, False))
+        if part == 'keyboard' and spec.grand_staff_keyboard:
+            staves_to_draw.append((part, None, True))
+
+    slot_height = system_height / len(staves_to_draw)
+    line_spacing = min(slot_height * 0.12, 7.0)
+    staff_height = line_spacing * 4
+    x0 = spec.label_width
+    x1 = spec.page_width - spec.margin
+    measure_width = (x1 - x0) / spec.measures_per_system
+
+    staves = []
+    parts: List[Dict] = []
+    label_fontsize = max(6.0, min(10.0, staff_height * 0.45))
+
+    for slot_idx, (part, label_text, is_continuation) in enumerate(staves_to_draw):
+        # コード記号と歌詞のために五線の上下に余白を取る
+        staff_top = y_top + slot_idx * slot_height + (slot_height - staff_height) * 0.45
+        staff_bottom = staff_top + staff_height
+        line_ys = [staff_top + i * line_spacing for i in range(5)]
+
+        for y in line_ys:
+            page.draw_line((x0, y), (x1, y), color=(0, 0, 0), width=0.6)
+
+        # 小節線
+        for m in range(spec.measures_per_system + 1):
+            x = x0 + m * measure_width
+            page.draw_line((x, staff_top), (x, staff_bottom), color=(0, 0, 0), width=0.8)
+
+        # 音符（黒丸）
+        for m in range(spec.measures_per_system):
+            for beat in range(4):
+                if rng.random() < 0.7:
+                    nx = x0 + m * measure_width + (beat + 0.6) * measure_width / 4.6
+                    ny = staff_top + rng.randint(0, 8) * line_spacing / 2
+                    page.draw_oval(fitz.Rect(nx - line_spacing * 0.6, ny - line_spacing * 0.45,
+                                             nx + line_spacing * 0.6, ny + line_spacing * 0.45),
+                                   color=(0, 0, 0), fill=(0, 0, 0))
+
+        label_bbox = None
+        if label_text:
+            baseline = (staff_top + staff_bottom) / 2 + label_fontsize / 3
+            _insert_label(page, (10, baseline), label_text, label_fontsize)
+            label_bbox = _rect(10, baseline - label_fontsize, x0 - 5, baseline + 2)
+
+        part_top, part_bottom = staff_top, staff_bottom
+        chord_bbox = lyric_bbox = None
+
+        if part == 'vocal' and spec.chords:
+            chord_y = staff_top - line_spacing * 1.5
+            for m in range(spec.measures_per_system):
+                page.insert_text((x0 + m * measure_width + 4, chord_y), rng.choice(CHORDS),
+                                 fontsize=max(6.0, line_spacing * 1.6), fontname='helv')
+            chord_bbox = _rect(x0, chord_y - line_spacing * 1.8, x1, chord_y + 1)
+            part_top = chord_bbox[1]
+
+        if part == 'vocal' and spec.lyrics:
+            lyric_y = staff_bottom + line_spacing * 2.2
+            for m in range(spec.measures_per_system):
+                for beat in range(2):
+                    word = rng.choice(lyric_words)
+                    lx = x0 + m * measure_width + 6 + beat * measure_width / 2
+                    _insert_label(page, (lx, lyric_y), word, max(5.0, line_spacing * 1.4))
+            lyric_bbox = _rect(x0, lyric_y - line_spacing * 1.6, x1, lyric_y + 2)
+            part_bottom = lyric_bbox[3]
+
+        staff_info = {
+            'part': part,
+            'label': label_text,
+            'bbox': _rect(x0, staff_top, x1, staff_bottom),
+            'line_ys': [round(y, 2) for y in line_ys],
+            'label_bbox': label_bbox,
+        }
+        if chord_bbox:
+            staff_info['chord_bbox'] = chord_bbox
+        if lyric_bbox:
+            staff_info['lyric_bbox'] = lyric_bbox
+        staves.append(staff_info)
+
+        if is_continuation:
+            parts[-1]['bbox'][3] = round(part_bottom, 2)
+        else:
+            parts.append({'part': part, 'label': label_text, 'bbox': _rect(x0, part_top, x1, part_bottom)})
+
+    # システム左端の縦線（ブラケット）
+    system_top = staves[0]['bbox'][1]
+    system_bottom = staves[-1]['bbox'][3]
+    page.draw_line((x0, system_top), (x0, system_bottom), color=(0, 0, 0), width=1.5)
+
+    return {
+        'bbox': _rect(0, y_top, spec.page_width, y_top + system_height),
+        'staves': staves,
+        'parts': parts,
+        'measures': [
+            [round(x0 + m * measure_width, 2), round(x0 + (m + 1) * measure_width, 2)]
+            for m in range(spec.measures_per_system)
+        ],
+    }
+
+
+def _build_vector_pdf(spec: SyntheticScoreSpec) -> Tuple[fitz.Document, Dict]:
+    rng = random.Random(spec.seed)
+    pdf = fitz.open()
+    truth = {
+        'generator': 'benchmarks.synthetic_scores',
+        'spec': asdict(spec),
+        'variant': 'vector',
+        'pages': [],
+    }
+
+    usable_height = spec.page_height - 2 * spec.margin
+    system_gap = 24
+    system_height = (usable_height - (spec.systems_per_page - 1) * system_gap) / spec.systems_per_page
+
+    for page_index in range(spec.pages):
+        page = pdf.new_page(width=spec.page_width, height=spec.page_height)
+        systems = []
+        for system_idx in range(spec.systems_per_page):
+            y_top = spec.margin + system_idx * (system_height + system_gap)
+            systems.append(_draw_system(page, spec, rng, y_top, system_height))
+
+        truth['pages'].append({
+            'page_index': page_index,
+            'width': spec.page_width,
+            'height': spec.page_height,
+            'systems': systems,
+        })
+
+    return pdf, truth
+
+
+def _transform_bbox(bbox: List[float], matrix, scale: float) -> List[float]:
+    """傾き補正前の座標を画像変換行列で写像し、軸平行bboxに戻す"""
+    import numpy as np
+
+    x0, y0, x1, y1 = bbox
+    corners = np.array([[x0, y0, 1], [x1, y0, 1], [x0, y1, 1], [x1, y1, 1]], dtype=np.float64)
+    corners[:, :2] *= scale
+    mapped = corners @ matrix.T / scale
+    return _rect(mapped[:, 0].min(), mapped[:, 1].min(), mapped[:, 0].max(), mapped[:, 1].max())
+
+
+def _transform_truth(node, matrix, scale: float):
+    if isinstance(node, dict):
+        out = {}
+        for key, value in node.items():
+            if key.endswith('bbox') and value is not None:
+                out[key] = _transform_bbox(value, matrix, scale)
+            elif key == 'line_ys':
+                # 五線のy座標は傾き前の値のまま残す
+                out[key] = value
+            else:
+                out[key] = _transform_truth(value, matrix, scale)
+        return out
+    if isinstance(node, list):
+        return [_transform_truth(item, matrix, scale) for item in node]
+    return node
+
+
+def _rasterize(vector_pdf: fitz.Document, truth: Dict, spec: SyntheticScoreSpec) -> Tuple[fitz.Document, Dict]:
+    """ベクターPDFをスキャン風の画像PDFに変換（ノイズ・傾き付き）"""
+    import cv2
+    import numpy as np
+
+    np_rng = np.random.default_rng(spec.seed)
+    scale = spec.scan_dpi / 72.0
+    scanned = fitz.open()
+    scanned_truth = dict(truth, variant='scan', pages=[])
+
+    for page_index, page in enumerate(vector_pdf):
+        pix = page.get_pixmap(matrix=fitz.Matrix(scale, scale), colorspace=fitz.csGRAY, alpha=False)
+        gray = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width).copy()
+
+        matrix = cv2.getRotationMatrix2D((pix.width / 2, pix.height / 2), spec.skew_deg, 1.0)
+        if spec.skew_deg:
+            gray = cv2.warpAffine(gray, matrix, (pix.width, pix.height),
+                                  flags=cv2.INTER_LINEAR, borderValue=255)
+
+        if spec.noise > 0:
+            noisy = gray.astype(np.float32) + np_rng.normal(0, spec.noise * 255, gray.shape)
+            # ごま塩ノイズ
+            speckle = np_rng.random(gray.shape)
+            noisy[speckle < spec.noise * 0.01] = 0
+            noisy[speckle > 1 - spec.noise * 0.01] = 255
+            gray = np.clip(noisy, 0, 255).astype(np.uint8)
+
+        ok, encoded = cv2.imencode('.png', gray)
+        if not ok:
+            raise RuntimeError('スキャン画像のエンコードに失敗しました')
+
+        out_page = scanned.new_page(width=page.rect.width, height=page.rect.height)
+        out_page.insert_image(out_page.rect, stream=encoded.tobytes())
+
+        scanned_truth['pages'].append(_transform_truth(truth['pages'][page_index], matrix, scale))
+
+    return scanned, scanned_truth
+
+
+def generate_score(output_path: str, spec: SyntheticScoreSpec) -> Dict:
+    """合成スコアPDFと正解JSON（同名の.json）を書き出す"""
+    vector_pdf, truth = _build_vector_pdf(spec)
+
+    try:
+        if spec.scan:
+            output_pdf, truth = _rasterize(vector_pdf, truth, spec)
+            vector_pdf.close()
+        else:
+            output_pdf = vector_pdf
+
+        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+        output_pdf.save(output_path, garbage=3, deflate=True)
+        output_pdf.close()
+    except Exception:
+        vector_pdf.close()
+        raise
+
+    truth_path = os.path.splitext(output_path)[0] + '.json'
+    with open(truth_path, 'w', encoding='utf-8') as f:
+        json.dump(truth, f, ensure_ascii=False, indent=2)
+
+    return truth
+
+
+def corpus_specs(count: int, seed: int = 0, include_scans: bool = True) -> List[Tuple[str, SyntheticScoreSpec]]:
+    """バリエーションを持たせたコーパス用の仕様一覧"""
+    rng = random.Random(seed)
+    orders = [
+        PARTS,
+        ('vocal', 'keyboard', 'guitar', 'bass', 'drums'),
+        ('vocal', 'guitar', 'guitar', 'keyboard', 'bass', 'drums'),
+        ('vocal', 'keyboard', 'bass'),
+    ]
+
+    specs = []
+    for index in range(count):
+        spec = SyntheticScoreSpec(
+            pages=rng.randint(2, 4),
+            systems_per_page=rng.choice([1, 2, 2, 3, 4]),
+            staff_order=rng.choice(orders),
+            label_style=rng.choice(list(LABEL_STYLES)),
+            grand_staff_keyboard=rng.random() < 0.3,
+            measures_per_system=rng.choice([4, 4, 8]),
+            seed=seed * 1000 + index,
+        )
+        # 1ページあたりの五線が多すぎる場合はシステム数を減らす
+        staves = len(spec.staff_order) + int(spec.grand_staff_keyboard)
+        if staves * spec.systems_per_page > 14:
+            spec = replace(spec, systems_per_page=max(1, 14 // staves))
+        specs.append((f"synthetic_{index:03d}", spec))
+
+        if include_scans and index % 2 == 0:
+            scan_spec = replace(spec, scan=True, noise=rng.choice([0.0, 0.03, 0.08]),
+                                skew_deg=rng.choice([0.0, 0.4, -0.8]))
+            specs.append((f"synthetic_{index:03d}_scan", scan_spec))
+
+    return specs
+
+
+def generate_corpus(output_dir: str, count: int, seed: int = 0, include_scans: bool = True) -> List[str]:
+    """コーパスを生成してPDFパスの一覧を返す"""
+    paths = []
+    for name, spec in corpus_specs(count, seed=seed, include_scans=include_scans):
+        path = os.path.join(output_dir, f"{name}.pdf")
+        generate_score(path, spec)
+        paths.append(path)
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='合成バンドスコアPDFの生成')
+    parser.add_argument('--out', required=True, help='出力ディレクトリ')
+    parser.add_argument('--count', type=int, default=8, help='生成するスコア数（スキャン版は別途追加）')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-scans', action='store_true', help='スキャン風の画像PDFを生成しない')
+    args = parser.parse_args(argv)
+
+    paths = generate_corpus(args.out, args.count, seed=args.seed, include_scans=not args.no_scans)
+    print(f"✅ Generated {len(paths)} synthetic scores in {args.out}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -28,10 +28,16 @@ class ProductionConfig:
     # CORS設定（必要に応じてドメインを制限）
     CORS_ORIGINS = os.environ.get('CORS_ORIGINS', '*').split(',')
     
-    # ファイルクリーンアップ設定
-    CLEANUP_INTERVAL = 3600  # 1時間
+    # ファイルクリーンアップ設定（最終利用から FILE_RETENTION_MINUTES 分後に削除）
+    CLEANUP_INTERVAL = int(os.environ.get('CLEANUP_INTERVAL', 300))  # 秒
     FILE_RETENTION_HOURS = 1  # 1時間後に削除
-    FILE_RETENTION_MINUTES = 60  # 60分後に削除
+    FILE_RETENTION_MINUTES = int(os.environ.get('FILE_RETENTION_MINUTES', 60))  # 60分後に削除
+    # 容量上限（MB、0で無効）とディスク空き容量の下限。超えたら最後に使われたのが古い順に削除
+    STORAGE_QUOTA_MB = int(os.environ.get('STORAGE_QUOTA_MB', 0))
+    STORAGE_MIN_FREE_RATIO = float(os.environ.get('STORAGE_MIN_FREE_RATIO', 0.1))
+    STORAGE_EVICT_TARGET_RATIO = float(os.environ.get('STORAGE_EVICT_TARGET_RATIO', 0.8))
+    # アップロード・抽出結果の索引（SQLite、未指定時はアップロードフォルダと同じ階層の storage_index.sqlite3）
+    STORAGE_INDEX_PATH = os.environ.get('STORAGE_INDEX_PATH')
 
     # AIレイアウト解析設定
     AI_API_KEY = os.environ.get('AI_API_KEY')
@@ -41,6 +47,29 @@ class ProductionConfig:
     AI_IMAGE_DPI = int(os.environ.get('AI_IMAGE_DPI', 200))
     AI_MAX_PAGES = int(os.environ.get('AI_MAX_PAGES', 10))
     AI_REQUEST_TIMEOUT = int(os.environ.get('AI_REQUEST_TIMEOUT', 60))
+
+    # セットリスト抽出（/api/setlist）：1リクエストの最大曲数と、並列に抽出する曲数
+    SETLIST_MAX_SCORES = int(os.environ.get('SETLIST_MAX_SCORES', 30))
+    SETLIST_MAX_WORKERS = int(os.environ.get('SETLIST_MAX_WORKERS', 2))
+
+    # OCR結果のキャッシュ（プロセス内LRUの件数と、プロセス間で共有するディスクキャッシュの場所。空ならディスクは使わない）
+    OCR_CACHE_SIZE = int(os.environ.get('OCR_CACHE_SIZE', 1024))
+    OCR_CACHE_DIR = os.environ.get('OCR_CACHE_DIR', 'ocr_cache')
+    # ディスクキャッシュの上限（MB、0は無制限）。超えたら最終利用が古い順に削除
+    OCR_CACHE_DISK_MB = int(os.environ.get('OCR_CACHE_DISK_MB', 256))
+
+    # 適応型エンジン（adaptive）：この信頼度に届かないページをOCR→AIへエスカレーション
+    ROUTER_CONFIDENCE_TARGET = float(os.environ.get('ROUTER_CONFIDENCE_TARGET', 0.75))
+    ROUTER_AI_ESCALATION = os.environ.get('ROUTER_AI_ESCALATION', 'True').lower() == 'true'
+
+    # リクエスト単位のプロファイリング設定（X-Profile: 1 / ?profile=1 / {"profile": true} で要求）
+    PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'False').lower() == 'true'
+    PROFILING_MODE = os.environ.get('PROFILING_MODE', 'cprofile')  # cprofile / sampling
+    PROFILING_SAMPLE_INTERVAL = float(os.environ.get('PROFILING_SAMPLE_INTERVAL', 0.005))
+    PROFILING_HEADER = 'X-Profile'
+
+    # 管理者用エンドポイントのトークン（未設定の場合は管理者APIを無効化）
+    ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
     
     @staticmethod
     def init_app(app):
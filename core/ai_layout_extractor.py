@@ -1,12 +1,18 @@
+from __future__ import annotations
+
 import base64
 import io
 import json
 import os
 from dataclasses import dataclass
-from typing import Dict, List, Tuple
+from typing import TYPE_CHECKING, Dict, List, Tuple
 
 import fitz
-from PIL import Image
+
+from core.output_composer import SAVE_OPTIONS
+
+if TYPE_CHECKING:
+    from PIL import Image
 
 AI_LAYOUT_SCHEMA = {
     "$schema": "https://json-schema.org/draft/2020-12/schema",
@@ -133,7 +139,7 @@ class AILayoutExtractor:
                     self._append_image_page(output_pdf, cropped)
                     total_regions += 1
 
-            output_pdf.save(output_path)
+            output_pdf.save(output_path, **SAVE_OPTIONS)
             output_pdf.close()
 
             return {
@@ -145,6 +151,8 @@ class AILayoutExtractor:
             pdf.close()
 
     def _render_page_image(self, pdf: fitz.Document, page_index: int) -> Image.Image:
+        from PIL import Image
+
         page = pdf[page_index]
         matrix = fitz.Matrix(self.image_dpi / 72, self.image_dpi / 72)
         pix = page.get_pixmap(matrix=matrix, alpha=False)
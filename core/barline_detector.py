@@ -0,0 +1,116 @@
+"""
+小節線検出
+システム分割（core/system_segmenter.py）で作ったページのラスタを使い、
+五線の帯の中で列ごとの黒画素率（列方向の投影）を取り、五線の高さをほぼ貫く列の連続区間
+（ランレングス）を小節線とみなす。1ページ1回のラスタ化で全システムの小節範囲を返す
+
+符頭・符幹は五線の高さ全体を覆わないため、帯の大半を黒く覆う列だけを残せば小節線と区別できる
+"""
+
+from typing import List
+
+import numpy as np
+
+from core.score_model import Measure, StaffGroup
+from core.system_segmenter import PageSegmentation, SystemRegion
+
+
+class BarlineDetector:
+    """列方向の投影とランレングスによる小節線検出"""
+
+    def __init__(self, dark_threshold: int = 128, min_fill: float = 0.85,
+                 merge_spacing: float = 1.5, min_measure_spacing: float = 2.0):
+        self.dark_threshold = dark_threshold
+        # 五線の帯の高さのうち黒く覆われている割合がこれ以上の列を小節線の候補とする
+        self.min_fill = min_fill
+        # 五線の線間隔 × この値より近い小節線はまとめる（複縦線・終止線）
+        self.merge_spacing = merge_spacing
+        # 五線の線間隔 × この値より狭い小節は作らない
+        self.min_measure_spacing = min_measure_spacing
+
+    def detect(self, segmentation: PageSegmentation) -> List[List[Measure]]:
+        """ページ内の全システムの小節（システムの順）"""
+        return [self.detect_system(segmentation, region) for region in segmentation.systems]
+
+    def detect_system(self, segmentation: PageSegmentation, region: SystemRegion) -> List[Measure]:
+        """システム内の小節の横範囲（PDF座標）"""
+        if not region.staves:
+            return []
+
+        scale = segmentation.scale
+        bands = [self._staff_band(segmentation.image, staff, scale) for staff in region.staves]
+
+        spacing = self._line_spacing(region.staves) * scale
+
+        # 五線ごとに小節線候補の列を求め、過半数の五線で候補になった列を残す
+        # （1つの五線だけにある符幹・連桁を除く。スキャンの傾きで五線ごとにずれる分は横に広げて吸収）
+        window = max(1, int(spacing / 2)) | 1
+        candidates = [
+            np.convolve(band.mean(axis=0) >= self.min_fill, np.ones(window), mode='same') > 0
+            for band in bands
+        ]
+        is_bar = np.mean(candidates, axis=0) > 0.5
+        extent = self._staff_extent(bands, region.staves, max(1, int(spacing)))
+        if extent is None:
+            return []
+        staff_left, staff_right = extent
+
+        bars = self._bar_positions(is_bar, spacing * self.merge_spacing)
+
+        # 行頭・行末に小節線がない場合は五線の端を境界とする
+        min_width = spacing * self.min_measure_spacing
+        if not bars or bars[0] - staff_left > min_width:
+            bars.insert(0, float(staff_left))
+        if staff_right - bars[-1] > min_width:
+            bars.append(float(staff_right))
+
+        return [
+            Measure(index + 1, start / scale, end / scale)
+            for index, (start, end) in enumerate(zip(bars, bars[1:]))
+        ]
+
+    def _staff_band(self, image: np.ndarray, staff: StaffGroup, scale: float) -> np.ndarray:
+        """五線の第1線〜最終線の帯（黒画素のマスク）"""
+        top = int(round(staff.lines[0] * scale))
+        bottom = int(round(staff.lines[-1] * scale)) + 1
+        return image[top:bottom] < self.dark_threshold
+
+    def _staff_extent(self, bands: List[np.ndarray], staves: List[StaffGroup], window: int):
+        """五線の左右端（px）：ほぼすべての線が横切る列が最も長く続く区間"""
+        crossed = np.mean([
+            band.sum(axis=0) >= staff.line_count - 1 for band, staff in zip(bands, staves)
+        ], axis=0) >= 0.5
+        # ノイズや音符による途切れは線間隔程度までならす
+        crossed = np.convolve(crossed, np.ones(window), mode='same') >= window / 2
+
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], crossed.astype(np.int8), [0]))))
+        if len(edges) == 0:
+            return None
+        starts, ends = edges[0::2], edges[1::2]
+        longest = int(np.argmax(ends - starts))
+        return int(starts[longest]), int(ends[longest])
+
+    def _line_spacing(self, staves: List[StaffGroup]) -> float:
+        spacings = [
+            (staff.lines[-1] - staff.lines[0]) / (staff.line_count - 1)
+            for staff in staves if staff.line_count > 1
+        ]
+        return float(np.median(spacings)) if spacings else 8.0
+
+    def _bar_positions(self, is_bar: np.ndarray, merge_distance: float) -> List[float]:
+        """小節線候補の列のランを求め、近いランをまとめて中心のx座標（px）を返す"""
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], is_bar.astype(np.int8), [0]))))
+        starts, ends = edges[0::2], edges[1::2]
+
+        bars = []
+        run_start = run_end = None
+        for start, end in zip(starts, ends):
+            if run_end is not None and start - run_end <= merge_distance:
+                run_end = end
+                continue
+            if run_end is not None:
+                bars.append((run_start + run_end) / 2)
+            run_start, run_end = start, end
+        if run_end is not None:
+            bars.append((run_start + run_end) / 2)
+        return bars
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+一括抽出
+ディレクトリやglobで指定した複数の楽譜PDFを、プロセスプールで並列に抽出する
+
+- 入力の内容ハッシュ・エンジン・オプションが前回と同じで出力が残っていればスキップ
+- 1文書終わるごとに出力ディレクトリの batch_manifest.json を更新するため、
+  中断しても再実行すれば続きから処理する
+- 文書ごとの処理時間・ページ数・結果を JSON のサマリーに書き出す
+
+使い方：
+    python -m core.batch_extract "songbook/*.pdf" --engine adaptive --parts vocal,keyboard --output-dir out
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional
+
+import fitz
+
+from core.extractor_registry import EXTRACTORS, RegisteredExtractor, create_extractor, get_spec, resolve_engine
+from core.ocr_cache import configure_ocr_cache
+
+MANIFEST_NAME = 'batch_manifest.json'
+SUMMARY_NAME = 'batch_summary.json'
+
+# ワーカープロセス内で生成した抽出器（同じプロセスの後続の文書で使い回す）
+_extractors: Dict[str, RegisteredExtractor] = {}
+
+
+def find_inputs(patterns: List[str]) -> List[str]:
+    """ディレクトリ（再帰）またはglobからPDFを列挙（重複なし、指定順）"""
+    inputs = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            candidates = sorted(glob.glob(os.path.join(pattern, '**', '*.pdf'), recursive=True))
+        else:
+            candidates = sorted(glob.glob(pattern, recursive=True))
+        inputs.extend(os.path.abspath(path) for path in candidates if path.lower().endswith('.pdf'))
+    return list(dict.fromkeys(inputs))
+
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def output_names(inputs: List[str], engine: str) -> Dict[str, str]:
+    """入力ごとの出力ファイル名（同名の入力はパスのダイジェストで区別）"""
+    stems = [os.path.splitext(os.path.basename(path))[0] for path in inputs]
+    names = {}
+    for path, stem in zip(inputs, stems):
+        if stems.count(stem) > 1:
+            stem = f"{stem}_{hashlib.sha1(path.encode('utf-8')).hexdigest()[:6]}"
+        names[path] = f"{stem}_{engine}.pdf"
+    return names
+
+
+def load_app_config() -> Dict:
+    """抽出器に渡すアプリ設定（環境変数を反映した Config の値）"""
+    from config import Config
+    return {name: getattr(Config, name) for name in dir(Config) if name.isupper()}
+
+
+def _get_extractor(engine: str, config: Dict) -> RegisteredExtractor:
+    extractor = _extractors.get(engine)
+    if extractor is None:
+        configure_ocr_cache(config)
+        extractor = RegisteredExtractor(engine, create_extractor(engine, config))
+        _extractors[engine] = extractor
+    return extractor
+
+
+def failed_record(job: Dict, error: Optional[str] = None) -> Dict:
+    """ジョブの結果の初期値（抽出が完了するまでは失敗扱い）"""
+    return {
+        'input': job['input'],
+        'output': job['output'],
+        'hash': job['hash'],
+        'engine': job['engine'],
+        'pages': None,
+        'wall_time': None,
+        'status': 'failed',
+        'error': error,
+    }
+
+
+def extract_document(job: Dict) -> Dict:
+    """1文書を抽出して結果を返す（ワーカープロセスで実行）"""
+    record = failed_record(job)
+    start = time.perf_counter()
+    try:
+        with fitz.open(job['input']) as pdf:
+            record['pages'] = len(pdf)
+
+        engine = job['engine']
+        if engine == 'auto':
+            from core.extractor_registry import select_engine
+            from core.pdf_type_detector import PDFTypeDetector
+            analysis = PDFTypeDetector().analyze_for_extraction(job['input'])
+            engine = select_engine(analysis, job['options'].get('parts'))
+            record['engine'] = engine
+
+        # 書き込み途中のファイルを完了済みと取り違えないよう、一時名で保存してから置き換える
+        partial_path = job['output'] + '.partial'
+        result = _get_extractor(engine, job['config']).extract(job['input'], job['options'], output_path=partial_path)
+        if not result.output_path or not os.path.exists(result.output_path):
+            raise RuntimeError('抽出結果が作成されませんでした')
+        os.replace(result.output_path, job['output'])
+
+        record['status'] = 'completed'
+        record['parts_extracted'] = result.parts_extracted
+        record['details'] = result.details
+    except Exception as e:
+        record['error'] = f"{type(e).__name__}: {e}"
+    record['wall_time'] = round(time.perf_counter() - start, 4)
+    return record
+
+
+class BatchManifest:
+    """完了した文書の記録（入力パス → 内容ハッシュ・条件・出力）"""
+
+    def __init__(self, output_dir: str):
+        self.path = os.path.join(output_dir, MANIFEST_NAME)
+        self.entries: Dict[str, Dict] = {}
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f).get('documents', {})
+
+    def is_current(self, input_path: str, key: Dict) -> bool:
+        entry = self.entries.get(input_path)
+        return bool(entry) and entry['key'] == key and os.path.exists(entry['output'])
+
+    def record(self, input_path: str, key: Dict, record: Dict):
+        self.entries[input_path] = {'key': key, 'output': record['output'], 'completed_at': time.time()}
+        self.save()
+
+    def save(self):
+        # 中断されても壊れた manifest が残らないよう置き換えで保存
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'documents': self.entries}, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, self.path)
+
+
+def run_batch(inputs: List[str], engine: str, output_dir: str, options: Optional[Dict] = None,
+              workers: Optional[int] = None, force: bool = False, config: Optional[Dict] = None) -> Dict:
+    """全入力を抽出してサマリーを返す"""
+    options = {key: value for key, value in (options or {}).items() if value is not None}
+    config = load_app_config() if config is None else config
+    version = get_spec(engine).version if engine != 'auto' else None
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = BatchManifest(output_dir)
+    names = output_names(inputs, engine)
+
+    records = []
+    jobs = []
+    for input_path in inputs:
+        content_hash = file_hash(input_path)
+        key = {'hash': content_hash, 'engine': engine, 'version': version, 'options': options}
+        output_path = os.path.join(output_dir, names[input_path])
+        if not force and manifest.is_current(input_path, key):
+            records.append({'input': input_path, 'output': manifest.entries[input_path]['output'],
+                            'hash': content_hash, 'engine': engine, 'status': 'skipped'})
+            continue
+        jobs.append(({'input': input_path, 'output': output_path, 'hash': content_hash, 'engine': engine,
+                      'options': options, 'config': config}, key))
+
+    print(f"📚 Batch: {len(inputs)} documents ({len(records)} up to date, {len(jobs)} to extract)")
+    start = time.perf_counter()
+
+    def finish(record, key):
+        records.append(record)
+        if record['status'] == 'completed':
+            manifest.record(record['input'], key, record)
+        status = '✅' if record['status'] == 'completed' else f"❌ {record['error']}"
+        print(f"  {status} {os.path.basename(record['input'])} ({record['wall_time']}s)")
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(jobs) <= 1:
+        for job, key in jobs:
+            finish(extract_document(job), key)
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+            futures = {pool.submit(extract_document, job): (job, key) for job, key in jobs}
+            for future in as_completed(futures):
+                job, key = futures[future]
+                try:
+                    record = future.result()
+                except Exception as e:
+                    # ワーカーの異常終了（BrokenProcessPool）などはその文書の失敗として記録し、残りの結果は保存する
+                    record = failed_record(job, f"{type(e).__name__}: {e}")
+                    record['wall_time'] = 0.0
+                finish(record, key)
+
+    order = {path: index for index, path in enumerate(inputs)}
+    records.sort(key=lambda r: order[r['input']])
+    completed = [r for r in records if r['status'] == 'completed']
+    return {
+        'engine': engine,
+        'options': options,
+        'output_dir': os.path.abspath(output_dir),
+        'wall_time': round(time.perf_counter() - start, 4),
+        'totals': {
+            'documents': len(records),
+            'completed': len(completed),
+            'skipped': sum(1 for r in records if r['status'] == 'skipped'),
+            'failed': sum(1 for r in records if r['status'] == 'failed'),
+            'pages': sum(r['pages'] or 0 for r in completed),
+            'extract_time': round(sum(r['wall_time'] for r in completed), 4),
+        },
+        'documents': records,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='楽譜PDFの一括パート抽出')
+    parser.add_argument('inputs', nargs='+', help='PDFを含むディレクトリまたはglob')
+    parser.add_argument('--engine', default='auto',
+                        help=f"抽出エンジン（'name' または 'name@version'、'auto'で文書ごとに自動選択）: {', '.join(EXTRACTORS)}")
+    parser.add_argument('--parts', help='抽出するパート（カンマ区切り、例: vocal,keyboard）')
+    parser.add_argument('--measures-per-line', type=int, help='1段あたりの小節数（対応エンジンのみ）')
+    parser.add_argument('--output-dir', required=True, help='出力先ディレクトリ')
+    parser.add_argument('--workers', type=int, help='並列プロセス数（既定: CPU数）')
+    parser.add_argument('--summary', help=f"サマリーJSONの出力先（既定: 出力先ディレクトリの {SUMMARY_NAME}）")
+    parser.add_argument('--force', action='store_true', help='出力が最新でも抽出し直す')
+    args = parser.parse_args(argv)
+
+    engine = args.engine
+    if engine != 'auto':
+        try:
+            engine = resolve_engine(engine)
+        except KeyError as e:
+            parser.error(e.args[0])
+
+    inputs = find_inputs(args.inputs)
+    if not inputs:
+        parser.error('PDFが見つかりません')
+
+    options = {
+        'parts': [part.strip() for part in args.parts.split(',') if part.strip()] if args.parts else None,
+        'measures_per_line': args.measures_per_line,
+    }
+    summary = run_batch(inputs, engine, args.output_dir, options, workers=args.workers, force=args.force)
+
+    summary_path = args.summary or os.path.join(args.output_dir, SUMMARY_NAME)
+    with open(summary_path, 'w', encoding='utf-8') as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+
+    totals = summary['totals']
+    print(f"  completed={totals['completed']}, skipped={totals['skipped']}, failed={totals['failed']}, "
+          f"wall={summary['wall_time']}s")
+    print(f"  Summary: {summary_path}")
+    return 1 if totals['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
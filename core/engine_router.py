@@ -0,0 +1,417 @@
+"""
+適応型エンジンルーター
+最も安い経路（テキスト層のラベル + ベクター描画の五線検出）から試し、
+システムごとのマッピング信頼度が目標に届かないページだけを
+OCR（V17）→ AIレイアウトの順にエスカレーションする
+"""
+
+import os
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import fitz
+
+from core import label_classifier
+from core.output_composer import OutputComposer
+
+TARGET_PARTS = ('vocal', 'keyboard')
+
+PART_LABELS = {
+    'vocal': ('Vocal', (0.1, 0.3, 0.8)),
+    'keyboard': ('Key', (0, 0.6, 0.3)),
+}
+
+
+@dataclass
+class VectorStaff:
+    top: float
+    bottom: float
+    x0: float
+    x1: float
+    spacing: float
+
+    @property
+    def center(self) -> float:
+        return (self.top + self.bottom) / 2
+
+    @property
+    def height(self) -> float:
+        return self.bottom - self.top
+
+
+@dataclass
+class SystemPlacement:
+    """1システム分の抽出領域（PDF座標）"""
+    page_num: int
+    parts: List[Tuple[str, fitz.Rect]]
+    confidence: float
+
+
+@dataclass
+class PageRoute:
+    page_num: int
+    path: str
+    confidence: float
+    systems: List[SystemPlacement] = field(default_factory=list)
+    attempts: List[str] = field(default_factory=list)
+
+    def report(self) -> Dict:
+        return {
+            'page': self.page_num,
+            'path': self.path,
+            'confidence': round(self.confidence, 3),
+            'systems': len(self.systems),
+        }
+
+
+def classify_label(text: str) -> Optional[str]:
+    """ラベル文字列を楽器タイプに分類（該当なしはNone）"""
+    return label_classifier.classify_label(text).part
+
+
+class AdaptiveEngineRouter:
+    """信頼度目標を満たす最も安い抽出経路をページ単位で選ぶ"""
+
+    def __init__(self, config=None):
+        config = config or {}
+        self.confidence_target = float(config.get('ROUTER_CONFIDENCE_TARGET', 0.75))
+        self.ai_escalation = bool(config.get('ROUTER_AI_ESCALATION', True)) and bool(config.get('AI_API_KEY'))
+        self.config = config
+
+        self.page_width = 595
+        self.page_height = 842
+        self.margin = 20
+        self.part_gap = 5
+
+        self._ocr_extractor = None
+        self._ai_extractor = None
+
+    def extract_adaptive(self, pdf_path: str, parts=TARGET_PARTS, output_path: Optional[str] = None) -> Dict:
+        """適応型抽出を実行し、出力パスとエスカレーション履歴を返す"""
+        parts = [part for part in parts if part in TARGET_PARTS]
+        src_pdf = fitz.open(pdf_path)
+        try:
+            # OCRの言語は文書ごとに決め直す（前の文書の eng / eng+jpn を引き継がない）
+            if self._ocr_extractor is not None:
+                self._ocr_extractor.ocr_language.reset(src_pdf)
+            routes = [self.route_page(src_pdf[page_num], page_num, parts) for page_num in range(len(src_pdf))]
+
+            systems = [system for route in routes for system in route.systems]
+            if not systems:
+                return {'output_path': None, 'details': self._details(routes)}
+
+            with OutputComposer(src_pdf, self.page_width, self.page_height) as composer:
+                self._compose(composer, systems)
+                if output_path is None:
+                    output_path = os.path.splitext(pdf_path)[0] + '_adaptive.pdf'
+                composer.save(output_path)
+
+            return {'output_path': output_path, 'details': self._details(routes)}
+        finally:
+            if self._ocr_extractor is not None:
+                self._ocr_extractor.page_images.clear()
+            src_pdf.close()
+
+    def route_page(self, page: fitz.Page, page_num: int, parts) -> PageRoute:
+        """ベクター → OCR → AI の順に、信頼度目標を満たした時点で確定"""
+        staves = self.detect_vector_staves(page)
+        if not staves and not page.get_images():
+            # 五線もラスター画像もないページ（表紙・歌詞ページ等）
+            return PageRoute(page_num, 'empty', 1.0)
+
+        best = self.route_vector(page, page_num, staves, parts)
+        attempts = ['vector']
+
+        for path in ('ocr', 'ai'):
+            if best.confidence >= self.confidence_target:
+                break
+            if path == 'ai' and not self.ai_escalation:
+                break
+            candidate = self.route_ocr(page, page_num, parts) if path == 'ocr' else self.route_ai(page, page_num, parts)
+            attempts.append(path)
+            if candidate.confidence > best.confidence:
+                best = candidate
+
+        best.attempts = attempts
+        return best
+
+    # ------------------------------------------------------------
+    # ベクター経路
+    # ------------------------------------------------------------
+
+    def detect_vector_staves(self, page: fitz.Page) -> List[VectorStaff]:
+        """描画命令の水平線から五線を検出"""
+        min_length = page.rect.width * 0.3
+        segments = {}
+
+        drawings = page.get_cdrawings() if hasattr(page, 'get_cdrawings') else page.get_drawings()
+        for drawing in drawings:
+            for item in drawing['items']:
+                if item[0] == 'l':
+                    (x0, y0), (x1, y1) = item[1], item[2]
+                    if abs(y1 - y0) > 0.5:
+                        continue
+                    y = (y0 + y1) / 2
+                elif item[0] == 're':
+                    x0, y0, x1, y1 = item[1][0], item[1][1], item[1][2], item[1][3]
+                    if abs(y1 - y0) > 1.5:
+                        continue
+                    y = (y0 + y1) / 2
+                else:
+                    continue
+
+                if abs(x1 - x0) < min_length:
+                    continue
+                key = round(y, 1)
+                left, right = min(x0, x1), max(x0, x1)
+                if key in segments:
+                    left = min(left, segments[key][0])
+                    right = max(right, segments[key][1])
+                segments[key] = (left, right)
+
+        ys = sorted(segments)
+        staves = []
+        i = 0
+        while i + 4 < len(ys):
+            group = ys[i:i + 5]
+            gaps = [b - a for a, b in zip(group, group[1:])]
+            spacing = sum(gaps) / 4
+            if 2 <= spacing <= 15 and max(gaps) - min(gaps) <= spacing * 0.25:
+                x0 = min(segments[y][0] for y in group)
+                x1 = max(segments[y][1] for y in group)
+                staves.append(VectorStaff(group[0], group[-1], x0, x1, spacing))
+                i += 5
+            else:
+                i += 1
+
+        return staves
+
+    def group_systems(self, staves: List[VectorStaff]) -> List[List[VectorStaff]]:
+        """五線間の間隔が他より大きい箇所でシステムを区切る"""
+        if len(staves) < 2:
+            return [staves] if staves else []
+
+        gaps = [b.top - a.bottom for a, b in zip(staves, staves[1:])]
+        median_gap = sorted(gaps)[len(gaps) // 2]
+
+        systems = [[staves[0]]]
+        for gap, staff in zip(gaps, staves[1:]):
+            if gap > median_gap * 1.4 and gap > staff.height:
+                systems.append([])
+            systems[-1].append(staff)
+        return systems
+
+    def route_vector(self, page: fitz.Page, page_num: int, staves: List[VectorStaff], parts) -> PageRoute:
+        """テキスト層のラベルをベクター五線に割り当て、システムごとの信頼度を算出"""
+        if not staves:
+            return PageRoute(page_num, 'vector', 0.0)
+
+        phrases = self._label_phrases(page)
+        systems = []
+        confidences = []
+
+        groups = self.group_systems(staves)
+        for index, group in enumerate(groups):
+            upper = groups[index - 1][-1].bottom if index > 0 else 0
+            lower = groups[index + 1][0].top if index + 1 < len(groups) else page.rect.height
+            label_zone_x = min(staff.x0 for staff in group)
+            labels = [
+                (text, y) for text, x1, y in phrases
+                if x1 <= label_zone_x + 2 and upper < y < lower
+            ]
+
+            assigned, confidence = self.map_labels(group, labels)
+            confidences.append(confidence)
+
+            clips = self._vector_clips(page, group, assigned, upper, lower, parts)
+            if clips:
+                systems.append(SystemPlacement(page_num, clips, confidence))
+
+        return PageRoute(page_num, 'vector', min(confidences), systems)
+
+    def map_labels(self, staves: List[VectorStaff], labels: List[Tuple[str, float]]) -> Tuple[List[Optional[str]], float]:
+        """ラベルを最も近い五線へ割り当て、(五線ごとのパート, 信頼度) を返す
+
+        信頼度 = ラベルで説明できた五線の割合 × 割り当ての近さの平均
+        """
+        assigned: List[Optional[str]] = [None] * len(staves)
+        qualities = [0.0] * len(staves)
+        conflicts = 0
+
+        for text, y in labels:
+            index = min(range(len(staves)), key=lambda i: abs(staves[i].center - y))
+            staff = staves[index]
+            quality = max(0.0, 1.0 - abs(staff.center - y) / staff.height)
+            if quality <= 0:
+                continue
+            if assigned[index] is not None:
+                conflicts += 1
+                if quality <= qualities[index]:
+                    continue
+            assigned[index] = classify_label(text) or 'other'
+            qualities[index] = quality
+
+        # 大譜表の下段（ラベルなし）はキーボードの続きとみなす
+        for i in range(1, len(staves)):
+            if assigned[i] is None and assigned[i - 1] == 'keyboard' and qualities[i - 1] > 0:
+                if staves[i].top - staves[i - 1].bottom < staves[i].height * 1.5:
+                    assigned[i] = 'keyboard'
+                    qualities[i] = qualities[i - 1]
+
+        labelled = [q for q in qualities if q > 0]
+        if not labelled:
+            return assigned, 0.0
+
+        coverage = len(labelled) / len(staves)
+        confidence = coverage * (sum(labelled) / len(labelled)) * (0.5 ** conflicts)
+        return assigned, confidence
+
+    def _label_phrases(self, page: fitz.Page) -> List[Tuple[str, float, float]]:
+        """テキスト層の単語を行単位にまとめる -> [(text, x1, y_center)]"""
+        lines = {}
+        for x0, y0, x1, y1, word, block_no, line_no, _ in page.get_text('words'):
+            key = (block_no, line_no)
+            if key in lines:
+                text, _, right, top, bottom = lines[key]
+                lines[key] = (f"{text} {word}", None, max(right, x1), min(top, y0), max(bottom, y1))
+            else:
+                lines[key] = (word, None, x1, y0, y1)
+        return [(text, right, (top + bottom) / 2) for text, _, right, top, bottom in lines.values()]
+
+    def _vector_clips(self, page: fitz.Page, staves: List[VectorStaff], assigned: List[Optional[str]],
+                      upper: float, lower: float, parts) -> List[Tuple[str, fitz.Rect]]:
+        """割り当て結果から抽出領域を作成（上下は隣接五線との中間まで：コード・歌詞を含める）"""
+        clips = []
+        for part in parts:
+            indices = [i for i, name in enumerate(assigned) if name == part]
+            if not indices:
+                continue
+            if part == 'vocal':
+                indices = indices[:1]
+
+            first, last = indices[0], indices[-1]
+            above = staves[first - 1].bottom if first > 0 else max(upper, staves[first].top - staves[first].height * 2)
+            below = staves[last + 1].top if last + 1 < len(staves) else min(lower, staves[last].bottom + staves[last].height * 2)
+            top = (above + staves[first].top) / 2
+            bottom = (staves[last].bottom + below) / 2
+            clips.append((part, fitz.Rect(0, top, page.rect.width, bottom)))
+        return clips
+
+    # ------------------------------------------------------------
+    # OCR経路（V17）
+    # ------------------------------------------------------------
+
+    def route_ocr(self, page: fitz.Page, page_num: int, parts) -> PageRoute:
+        """V17の画像処理+OCRでページを再解析"""
+        if self._ocr_extractor is None:
+            from core.final_smart_extractor_v17_accurate import FinalSmartExtractorV17Accurate
+            self._ocr_extractor = FinalSmartExtractorV17Accurate()
+            self._ocr_extractor.debug_mode = False
+            self._ocr_extractor.ocr_language.reset(page.parent)
+
+        systems = []
+        for system in self._ocr_extractor.extract_systems_accurately(page, page_num):
+            clips = []
+            confidences = []
+            for part in parts:
+                mapped = system.assignment(part)
+                if not mapped:
+                    continue
+                staff = mapped.staff
+                # V17の転送時と同じ余白
+                if part == 'vocal':
+                    rect = fitz.Rect(0, staff.y_start - 5, page.rect.width, staff.y_end + 25)
+                else:
+                    rect = fitz.Rect(0, staff.y_start, page.rect.width, staff.y_end + 10)
+                clips.append((part, rect))
+                confidences.append(mapped.confidence)
+            if clips:
+                systems.append(SystemPlacement(page_num, clips, min(confidences)))
+
+        confidence = min(system.confidence for system in systems) if systems else 0.0
+        return PageRoute(page_num, 'ocr', confidence, systems)
+
+    # ------------------------------------------------------------
+    # AI経路
+    # ------------------------------------------------------------
+
+    def route_ai(self, page: fitz.Page, page_num: int, parts) -> PageRoute:
+        """AIレイアウト推定（bboxは画像ピクセル座標のためPDF座標へ変換）"""
+        from core.ai_layout_extractor import AILayoutError
+
+        if self._ai_extractor is None:
+            from core.ai_layout_extractor import AILayoutExtractor
+            self._ai_extractor = AILayoutExtractor(self.config)
+
+        try:
+            result = self._ai_extractor.extract_layout_for_page(page.parent.name, page_num)
+        except AILayoutError:
+            return PageRoute(page_num, 'ai', 0.0)
+
+        layout = result.layout
+        scale_x = page.rect.width / layout['image_width']
+        scale_y = page.rect.height / layout['image_height']
+
+        clips = []
+        for part in layout['parts']:
+            if part['part_name'] not in parts:
+                continue
+            bbox = part['bbox']
+            clips.append((part['part_name'], fitz.Rect(
+                0,
+                bbox['y'] * scale_y,
+                page.rect.width,
+                (bbox['y'] + bbox['height']) * scale_y,
+            )))
+        clips.sort(key=lambda clip: clip[1].y0)
+
+        systems = [SystemPlacement(page_num, clips, layout['confidence'])] if clips else []
+        return PageRoute(page_num, 'ai', layout['confidence'] if clips else 0.0, systems)
+
+    # ------------------------------------------------------------
+    # 出力
+    # ------------------------------------------------------------
+
+    def _compose(self, composer: OutputComposer, systems: List[SystemPlacement]):
+        """システムを上から順に配置（幅を揃えて縦横比は維持）"""
+        dest_width = self.page_width - self.margin * 2
+        current_page = None
+        current_y = self.margin
+
+        for system in systems:
+            heights = [clip.height * dest_width / clip.width for _, clip in system.parts]
+            system_height = sum(heights) + self.part_gap * len(heights)
+
+            if current_page is None or current_y + system_height > self.page_height - self.margin:
+                current_page = composer.new_page()
+                current_y = self.margin
+
+            for (part, clip), height in zip(system.parts, heights):
+                dest = fitz.Rect(self.margin, current_y, self.margin + dest_width, current_y + height)
+                composer.place(current_page, dest, system.page_num, clip=clip)
+                label, color = PART_LABELS[part]
+                self._add_label(current_page, label, current_y + height / 2, color)
+                current_y += height + self.part_gap
+
+            current_y += self.part_gap * 2
+
+    def _add_label(self, page: fitz.Page, label: str, y_pos: float, color):
+        label_rect = fitz.Rect(2, y_pos - 8, 38, y_pos + 8)
+        page.draw_rect(label_rect, color=color, fill=color, width=0)
+        page.insert_text((label_rect.x0 + 3, y_pos + 3), label, fontsize=9, color=(1, 1, 1), fontname='helvetica-bold')
+
+    def _details(self, routes: List[PageRoute]) -> Dict:
+        escalations = [
+            {
+                'page': route.page_num,
+                'attempts': route.attempts,
+                'path': route.path,
+                'confidence': round(route.confidence, 3),
+            }
+            for route in routes if len(route.attempts) > 1
+        ]
+        return {
+            'confidence_target': self.confidence_target,
+            'pages': [route.report() for route in routes],
+            'escalations': escalations,
+        }
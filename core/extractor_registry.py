@@ -0,0 +1,271 @@
+"""
+抽出器レジストリ
+抽出器の実装モジュールは初回利用時にimportする（cv2・pytesseract等の重い依存を
+Webプロセス起動時に読み込まないため）
+
+各抽出器は対応するPDFタイプ・パート・速度区分を宣言し、
+共通インターフェース extract(pdf_path, options) -> ExtractionResult で呼び出す
+"""
+
+import importlib
+import os
+import shutil
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+TARGET_PARTS = ('vocal', 'keyboard')
+
+PDF_TYPES = ('text_based', 'image_based', 'hybrid')
+
+# 速度区分（自動選択では速いものを優先）
+SPEED_TIERS = ('fast', 'standard', 'slow')
+
+# PDFTypeDetector.analyze_for_extraction の recommended_method に対応するエンジン
+RECOMMENDED_ENGINES = {
+    'measure_based': 'measure_based',
+    'image_based': 'v17',
+    'smart': 'adaptive',
+    'standard': 'adaptive',
+}
+
+DEFAULT_ENGINE = 'v17'
+
+
+@dataclass
+class ExtractorSpec:
+    module: str
+    class_name: str
+    method: str
+    kwargs: Dict = field(default_factory=dict)
+    version: str = '1'
+    pdf_types: Tuple[str, ...] = PDF_TYPES
+    parts: Tuple[str, ...] = TARGET_PARTS
+    speed_tier: str = 'standard'
+    # 共通オプション名 -> 実装メソッドの引数名
+    options: Dict[str, str] = field(default_factory=dict)
+    # 自動選択の候補にするか（旧バージョンは明示指定時のみ利用）
+    auto_select: bool = False
+    # コンストラクタにアプリ設定を渡すか
+    needs_config: bool = False
+    # 出力先パスを受け取る実装の引数名（None の抽出器は実装の既定の場所に保存したものを移動する）
+    output_argument: Optional[str] = None
+
+    def supports(self, pdf_type: Optional[str] = None, parts=None) -> bool:
+        """PDFタイプとパートに対応しているか（パートを選べない抽出器は常に全パートを出力する）"""
+        if pdf_type and pdf_type in PDF_TYPES and pdf_type not in self.pdf_types:
+            return False
+        if not parts:
+            return True
+        if 'parts' not in self.options:
+            return set(parts) == set(self.parts)
+        return set(parts) <= set(self.parts)
+
+    def capabilities(self) -> Dict:
+        return {
+            'version': self.version,
+            'pdf_types': list(self.pdf_types),
+            'parts': list(self.parts),
+            'speed_tier': self.speed_tier,
+            'options': sorted(self.options),
+            'auto_select': self.auto_select,
+        }
+
+
+@dataclass
+class ExtractionResult:
+    engine: str
+    version: str
+    output_path: Optional[str]
+    parts_extracted: List[str]
+    details: Dict = field(default_factory=dict)
+
+    @property
+    def succeeded(self) -> bool:
+        return bool(self.output_path)
+
+
+EXTRACTORS: Dict[str, ExtractorSpec] = {
+    'v1': ExtractorSpec('core.final_smart_extractor', 'FinalSmartExtractor', 'extract_smart_final'),
+    'v2': ExtractorSpec('core.final_smart_extractor_v2', 'FinalSmartExtractorV2', 'extract_smart_final'),
+    'v3': ExtractorSpec('core.final_smart_extractor_v3', 'FinalSmartExtractorV3', 'extract_smart_final'),
+    'v4': ExtractorSpec('core.final_smart_extractor_v4', 'FinalSmartExtractorV4', 'extract_smart_final'),
+    'v5': ExtractorSpec('core.final_smart_extractor_v5', 'FinalSmartExtractorV5', 'extract_smart_final'),
+    'v6': ExtractorSpec('core.final_smart_extractor_v6', 'FinalSmartExtractorV6', 'extract_smart_final'),
+    'v7': ExtractorSpec('core.final_smart_extractor_v7_hybrid', 'FinalSmartExtractorV7Hybrid', 'extract_smart_final'),
+    'v8': ExtractorSpec('core.final_smart_extractor_v8_fixed', 'FinalSmartExtractorV8Fixed', 'extract_smart_final'),
+    'v9': ExtractorSpec('core.final_smart_extractor_v9_adaptive', 'FinalSmartExtractorV9Adaptive', 'extract_smart_final'),
+    'v10': ExtractorSpec('core.final_smart_extractor_v10_optimized', 'FinalSmartExtractorV10Optimized', 'extract_smart_final'),
+    'v11': ExtractorSpec('core.final_smart_extractor_v11_precise', 'FinalSmartExtractorV11Precise', 'extract_smart_final'),
+    'v12': ExtractorSpec('core.final_smart_extractor_v12_improved', 'FinalSmartExtractorV12Improved', 'extract_smart_final'),
+    'v13': ExtractorSpec('core.final_smart_extractor_v13_spatial', 'FinalSmartExtractorV13Spatial', 'extract_smart_final'),
+    'v14': ExtractorSpec('core.final_smart_extractor_v14_hybrid', 'FinalSmartExtractorV14Hybrid', 'extract_smart_final'),
+    'v15': ExtractorSpec(
+        'core.final_smart_extractor_v15_true_ocr', 'FinalSmartExtractorV15TrueOCR', 'extract_smart_final',
+        speed_tier='slow'
+    ),
+    'v16': ExtractorSpec('core.final_smart_extractor_v16_complete', 'FinalSmartExtractorV16Complete', 'extract_smart_final'),
+    # ページ画像のOCRでラベルを読むため、スキャンPDFにも対応
+    # （バージョン2から parts を反映。以前の抽出結果はパートを絞っていないため再利用しない）
+    'v17': ExtractorSpec(
+        'core.final_smart_extractor_v17_accurate', 'FinalSmartExtractorV17Accurate', 'extract_smart_final',
+        version='2', speed_tier='slow', options={'parts': 'parts'}, auto_select=True,
+        output_argument='output_path'
+    ),
+    'hybrid': ExtractorSpec('core.final_hybrid_extractor', 'FinalHybridExtractor', 'extract_hybrid_final'),
+    # テキスト層のラベルを優先して使うため、テキストを含むPDF向け
+    'measure_based': ExtractorSpec(
+        'core.measure_based_extractor', 'MeasureBasedExtractor', 'extract_parts',
+        {'selected_parts': list(TARGET_PARTS)},
+        pdf_types=('text_based', 'hybrid'),
+        parts=('vocal', 'keyboard', 'chord'),
+        speed_tier='fast',
+        options={
+            'parts': 'selected_parts',
+            'measures_per_line': 'measures_per_line',
+            'show_lyrics': 'show_lyrics',
+        },
+        auto_select=True,
+        output_argument='output_path'
+    ),
+    # ベクター経路で信頼度が足りないページだけOCR（V17）→AIへエスカレーション
+    'adaptive': ExtractorSpec(
+        'core.engine_router', 'AdaptiveEngineRouter', 'extract_adaptive',
+        speed_tier='fast',
+        options={'parts': 'parts'},
+        auto_select=True,
+        needs_config=True,
+        output_argument='output_path'
+    ),
+}
+
+
+def get_spec(name: str) -> ExtractorSpec:
+    """登録名から抽出器の定義を取得"""
+    if name not in EXTRACTORS:
+        raise KeyError(f"未登録の抽出器です: {name}")
+    return EXTRACTORS[name]
+
+
+def resolve_engine(engine: str) -> str:
+    """'name' または 'name@version' 形式のエンジン指定を登録名に解決"""
+    name, _, version = engine.partition('@')
+    spec = get_spec(name)
+    if version and version != spec.version:
+        raise KeyError(f"{name} のバージョン {version} は利用できません（現在: {spec.version}）")
+    return name
+
+
+def select_engine(analysis: Optional[Dict] = None, parts=None) -> str:
+    """PDFTypeDetectorの解析結果から、対応可能で最も速いエンジンを選択"""
+    pdf_type = None
+    recommended = None
+    if analysis:
+        pdf_type = analysis.get('pdf_type', {}).get('type')
+        recommended = RECOMMENDED_ENGINES.get(analysis.get('extraction_config', {}).get('recommended_method'))
+
+    if recommended and get_spec(recommended).supports(pdf_type, parts):
+        return recommended
+
+    candidates = [
+        name for name, spec in EXTRACTORS.items()
+        if spec.auto_select and spec.supports(pdf_type, parts)
+    ]
+    if not candidates:
+        return DEFAULT_ENGINE
+    return min(candidates, key=lambda name: SPEED_TIERS.index(EXTRACTORS[name].speed_tier))
+
+
+def list_engines() -> Dict[str, Dict]:
+    """登録済みエンジンと対応能力の一覧"""
+    return {name: spec.capabilities() for name, spec in EXTRACTORS.items()}
+
+
+class RegisteredExtractor:
+    """抽出器インスタンスを共通インターフェースで包む"""
+
+    def __init__(self, name: str, instance):
+        self.name = name
+        self.spec = get_spec(name)
+        self.instance = instance
+
+    def extract(self, pdf_path: str, options: Optional[Dict] = None,
+                output_path: Optional[str] = None) -> ExtractionResult:
+        """共通オプション（parts など）を実装の引数に変換して抽出を実行
+
+        output_path を指定した場合は結果をそのパスに保存する
+        """
+        options = options or {}
+        parts = options.get('parts')
+        if parts and not self.spec.supports(parts=parts):
+            unsupported = sorted(set(parts) - set(self.spec.parts))
+            if not unsupported:
+                raise ValueError(
+                    f"{self.name} はパートを選択できません（常に {', '.join(self.spec.parts)} を抽出します）"
+                )
+            raise ValueError(f"{self.name} は次のパートに対応していません: {', '.join(unsupported)}")
+
+        kwargs = dict(self.spec.kwargs)
+        for option, argument in self.spec.options.items():
+            if options.get(option) is not None:
+                kwargs[argument] = options[option]
+        if output_path and self.spec.output_argument:
+            kwargs[self.spec.output_argument] = output_path
+
+        output = getattr(self.instance, self.spec.method)(pdf_path, **kwargs)
+        details = {}
+        if isinstance(output, dict):
+            # {'output_path': ..., 'details': {...}} を返す抽出器（適応型ルーター等）
+            details = output.get('details') or {}
+            output = output.get('output_path')
+
+        if output and output_path and output != output_path and os.path.exists(output):
+            # 出力先を指定できない抽出器：コピーせず移動（同じファイルシステムならリネームのみ）
+            output = shutil.move(output, output_path)
+
+        parts = kwargs.get('selected_parts', kwargs.get('parts', self.spec.parts))
+        return ExtractionResult(
+            engine=self.name,
+            version=self.spec.version,
+            output_path=output,
+            parts_extracted=list(parts),
+            details=details,
+        )
+
+
+def create_extractor(name: str, config: Optional[Dict] = None):
+    """抽出器の実装をimportして新しいインスタンスを生成"""
+    spec = get_spec(name)
+    module = importlib.import_module(spec.module)
+    cls = getattr(module, spec.class_name)
+    return cls(config or {}) if spec.needs_config else cls()
+
+
+def load_extractor(name: str, config: Optional[Dict] = None):
+    """登録名から抽出器のインスタンスと実行メソッド、既定の引数を取得"""
+    spec = get_spec(name)
+    instance = create_extractor(name, config)
+    return instance, getattr(instance, spec.method), spec.kwargs
+
+
+class ExtractorCache:
+    """抽出器を初回利用時に生成して使い回す"""
+
+    def __init__(self, config: Optional[Dict] = None):
+        self.config = config
+        self._instances = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> RegisteredExtractor:
+        extractor = self._instances.get(name)
+        if extractor is None:
+            with self._lock:
+                extractor = self._instances.get(name)
+                if extractor is None:
+                    extractor = RegisteredExtractor(name, create_extractor(name, self.config))
+                    self._instances[name] = extractor
+        return extractor
+
+    def loaded(self):
+        """生成済みの抽出器名"""
+        return list(self._instances)
@@ -13,45 +13,41 @@
 import fitz
 import os
 from datetime import datetime
-import numpy as np
-import cv2
-import pytesseract
-from PIL import Image
-import io
-import re
 from typing import List, Tuple, Dict, Optional
 
+from core.label_assignment import assign_labels
+from core.label_classifier import classify_label
+from core.ocr_language import OCRLanguageSelector
+from core.ocr_mosaic import MosaicLine, OCRMosaic
+from core.ocr_preprocess import preprocess_for_ocr
+from core.output_composer import OutputComposer
+from core.page_image import PageImageSource
+from core.score_model import InstrumentLabel, PartAssignment, StaffGroup, System
+from core.system_segmenter import PageSegmentation, SystemRegion, SystemSegmenter
+
 class FinalSmartExtractorV17Accurate:
+    # 抽出できるパート（parts で一部だけを指定できる）
+    supported_parts = ('vocal', 'keyboard')
+    
     def __init__(self):
         self.page_width = 595  
         self.page_height = 842
         self.margin = 20
         
-        # V17改善：楽器パターンを厳密化
-        self.instrument_patterns = {
-            'vocal': [
-                r'Vocal', r'Vo\.?(?!cal)', r'Voice', r'Melody', r'Chorus', r'Cho\.?',
-                r'Lead', r'Sing', r'ボーカル', r'ヴォーカル', r'メロディ', r'歌'
-            ],
-            'keyboard': [
-                r'Keyboard', r'Key\.?(?!tar)', r'Keyb\.?', r'Piano', r'Pf\.?', r'Synth',
-                r'Organ', r'キーボード', r'ピアノ', r'シンセ', r'鍵盤'
-            ],
-            'guitar': [
-                r'Guitar', r'Gt\.?', r'Gtr\.?', r'E\.G', r'ギター'
-            ],
-            'bass': [
-                r'Bass', r'Ba\.?', r'Bs\.?', r'E\.B', r'ベース'
-            ],
-            'drums': [
-                r'Drums?', r'Dr\.?', r'Drs\.?', r'Percussion', r'ドラム'
-            ]
-        }
+        # ページごとのシステム分割（1ページ1回のラスタ化。ページ画像は文書の処理中だけ保持する）
+        self.segmenter = SystemSegmenter()
+        self.page_images = PageImageSource()
+        
+        # ラベルOCRの言語（文書ごとに eng / eng+jpn を決める）
+        self.ocr_language = OCRLanguageSelector()
         
         self.debug_mode = True
+        self.parts = self.supported_parts
         
-    def extract_smart_final(self, pdf_path: str) -> Optional[str]:
-        """V17正確版抽出"""
+    def extract_smart_final(self, pdf_path: str, output_path: Optional[str] = None,
+                            parts: Optional[List[str]] = None) -> Optional[str]:
+        """V17正確版抽出（output_path 未指定時は入力PDFと同じ場所に保存、parts 未指定時はボーカル+キーボード）"""
+        self.parts = tuple(part for part in self.supported_parts if not parts or part in parts)
         print("\n🎯 Final Smart Extraction V17 Accurate")
         print("  - Input:", os.path.basename(pdf_path))
         print("  - Features: Precise instrument mapping")
@@ -59,6 +55,7 @@ class FinalSmartExtractorV17Accurate:
         
         try:
             src_pdf = fitz.open(pdf_path)
+            self.ocr_language.reset(src_pdf)
             
             # スコア開始検出
             score_start_page = self.detect_score_start(src_pdf)
@@ -69,7 +66,7 @@ class FinalSmartExtractorV17Accurate:
             print(f"PDF type: {pdf_type['type']} (confidence: {pdf_type['confidence']:.1f})")
             
             # 出力PDF作成
-            output_pdf = fitz.open()
+            composer = OutputComposer(src_pdf, self.page_width, self.page_height)
             
             # 出力設定
             current_page = None
@@ -88,16 +85,13 @@ class FinalSmartExtractorV17Accurate:
                 for system in systems:
                     # 新ページ判定
                     if current_page is None or current_y + 250 > self.page_height - self.margin:
-                        current_page = output_pdf.new_page(
-                            width=self.page_width,
-                            height=self.page_height
-                        )
+                        current_page = composer.new_page()
                         current_y = self.margin
                         output_page_count += 1
                     
                     # コンテンツ転送
                     self.transfer_system_content_v17(
-                        current_page, src_pdf, system, current_y
+                        current_page, composer, system, current_y
                     )
                     
                     current_y += 130
@@ -107,10 +101,10 @@ class FinalSmartExtractorV17Accurate:
                         print(f"    ✅ Processed {total_systems} systems")
             
             # 保存
-            output_path = self.save_output_v17(output_pdf, pdf_path, total_systems)
+            output_path = self.save_output_v17(composer, pdf_path, total_systems, output_path)
             
+            composer.close()
             src_pdf.close()
-            output_pdf.close()
             
             return output_path
             
@@ -119,6 +113,9 @@ class FinalSmartExtractorV17Accurate:
             import traceback
             traceback.print_exc()
             return None
+        finally:
+            self.page_images.clear()
+            self.parts = self.supported_parts
     
     def detect_score_start(self, pdf: fitz.Document) -> int:
         """スコア開始検出"""
@@ -161,285 +158,151 @@ class FinalSmartExtractorV17Accurate:
         else:
             return {'type': 'hybrid', 'confidence': 0.7}
     
-    def extract_systems_accurately(self, page: fitz.Page, page_num: int) -> List[Dict]:
-        """V17：より正確な楽器検出"""
+    def extract_systems_accurately(self, page: fitz.Page, page_num: int) -> List[System]:
+        """V17：より正確な楽器検出（検出したシステムのみ処理）"""
         systems = []
         
-        # 2システム/ページ
-        for system_idx in [0, 1]:
-            # 五線譜検出
-            staff_groups = self.detect_staff_lines_v17(page, system_idx)
+        segmentation = self.segment_systems(page)
+        
+        # 全システムのラベル列をまとめて1回でOCR
+        page_lines = self.ocr_label_lines(segmentation, segmentation.systems)
+        
+        for region in segmentation.systems:
+            system_idx = region.index
+            
+            # 五線譜はシステム分割時に検出済み
+            staff_groups = region.staves
             
             # 楽器ラベル検出（改善版）
-            all_labels = self.detect_all_instrument_labels_v17(page, system_idx)
+            all_labels = self.detect_all_instrument_labels_v17(
+                segmentation, region, ocr_lines=page_lines.get(region.index, [])
+            )
             
             if self.debug_mode and system_idx == 0:
-                print(f"    System {system_idx + 1}: {len(staff_groups)} staves")
+                print(f"    System {system_idx + 1}/{len(segmentation.systems)}: {len(staff_groups)} staves")
                 if all_labels:
-                    print(f"      All detected labels: {[(l['type'], l['text'][:20]) for l in all_labels]}")
+                    print(f"      All detected labels: {[(l.part, l.text[:20]) for l in all_labels]}")
             
             # V17核心：正確な楽器マッピング
             instruments = self.map_instruments_accurately_v17(staff_groups, all_labels)
             
-            # システム情報保存
-            if instruments['vocal'] or instruments['keyboard']:
-                system_rect = self.calculate_system_rect(page, system_idx)
-                
-                systems.append({
-                    'page_num': page_num,
-                    'system_idx': system_idx,
-                    'rect': system_rect,
-                    'instruments': instruments,
-                    'all_labels': all_labels  # デバッグ用
-                })
+            # システム情報保存（対象パートが見つかったシステムのみ）
+            if any(part in instruments for part in self.parts):
+                systems.append(System(
+                    page_num=page_num,
+                    index=system_idx,
+                    rect=region.rect,
+                    instruments=all_labels,  # デバッグ用
+                    assignments=instruments
+                ))
                 
                 if self.debug_mode:
                     parts = []
-                    if instruments['vocal']:
-                        parts.append(f"Vocal(pos:{instruments['vocal']['position']})")
-                    if instruments['keyboard']:
-                        parts.append(f"Keyboard(pos:{instruments['keyboard']['position']})")
+                    if 'vocal' in instruments:
+                        parts.append(f"Vocal(pos:{instruments['vocal'].position})")
+                    if 'keyboard' in instruments:
+                        parts.append(f"Keyboard(pos:{instruments['keyboard'].position})")
                     print(f"      ✅ Mapped: {', '.join(parts)}")
         
         return systems
     
-    def detect_staff_lines_v17(self, page: fitz.Page, system_idx: int) -> List[Dict]:
-        """V17五線譜検出"""
-        try:
-            mat = fitz.Matrix(2, 2)
-            pix = page.get_pixmap(matrix=mat)
-            
-            img_data = pix.samples
-            img_array = np.frombuffer(img_data, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
-            
-            if pix.n == 4:
-                gray = cv2.cvtColor(img_array, cv2.COLOR_RGBA2GRAY)
-            else:
-                gray = cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
-            
-            height = gray.shape[0]
-            system_height = height // 2
-            y_start = system_idx * system_height
-            y_end = (system_idx + 1) * system_height
-            system_gray = gray[y_start:y_end, :]
-            
-            # 水平線検出
-            edges = cv2.Canny(system_gray, 50, 150, apertureSize=3)
-            lines = cv2.HoughLinesP(edges, 1, np.pi/180, 100, minLineLength=200, maxLineGap=10)
-            
-            if lines is None:
-                return []
-            
-            horizontal_lines = []
-            for line in lines:
-                x1, y1, x2, y2 = line[0]
-                if abs(y2 - y1) < 3:
-                    actual_y = (y1 + y_start) / 2
-                    horizontal_lines.append(actual_y)
-            
-            horizontal_lines = sorted(list(set(horizontal_lines)))
-            
-            # 五線譜グループ化
-            staff_groups = []
-            i = 0
-            while i < len(horizontal_lines):
-                group = [horizontal_lines[i]]
-                j = i + 1
-                
-                while j < len(horizontal_lines) and horizontal_lines[j] - group[-1] < 20:
-                    if horizontal_lines[j] - group[-1] > 2:
-                        group.append(horizontal_lines[j])
-                    j += 1
-                
-                if len(group) >= 3:
-                    staff_groups.append({
-                        'lines': group,
-                        'y_start': group[0] - 10,
-                        'y_end': group[-1] + 10,
-                        'y_center': (group[0] + group[-1]) / 2,
-                        'line_count': len(group),
-                        'position': len(staff_groups)  # 上から何番目か
-                    })
-                
-                i = j if j > i + 1 else i + 1
-            
-            return staff_groups
-            
-        except Exception as e:
-            return []
+    def segment_systems(self, page: fitz.Page) -> PageSegmentation:
+        """五線の投影プロファイルとブラケットからシステムを検出"""
+        return self.segmenter.segment(page, self.page_images)
     
-    def detect_all_instrument_labels_v17(self, page: fitz.Page, system_idx: int) -> List[Dict]:
-        """V17：全楽器ラベル検出（改善版）"""
+    def ocr_label_lines(self, segmentation: PageSegmentation,
+                        regions: List[SystemRegion]) -> Dict[int, List[MosaicLine]]:
+        """各システムの左端（ページ幅の1/4）をモザイクにまとめてOCR -> システム番号ごとの行"""
         try:
-            mat = fitz.Matrix(2, 2)
-            pix = page.get_pixmap(matrix=mat)
-            img_data = pix.tobytes("png")
-            img = Image.open(io.BytesIO(img_data))
-            
-            width, height = img.size
-            system_height = height // 2
-            y_start = system_idx * system_height
-            y_end = (system_idx + 1) * system_height
-            
-            # 左端領域
-            left_region = img.crop((0, y_start, width // 4, y_end))
-            
-            # OCR実行
-            ocr_text = pytesseract.image_to_string(left_region, lang='eng+jpn')
-            
-            # 全楽器ラベル収集
-            all_labels = []
-            lines = ocr_text.split('\n')
-            
-            for line_idx, line in enumerate(lines):
-                line_text = line.strip()
-                if not line_text:
+            mosaic = OCRMosaic()
+            for region in regions:
+                # 二値化・五線除去・インクへの切り詰め・文字の高さの正規化
+                crop = preprocess_for_ocr(segmentation.crop(region, 0, region.rect[2] / 4))
+                if crop.empty:
                     continue
-                
-                # 各楽器タイプをチェック
-                for inst_type, patterns in self.instrument_patterns.items():
-                    for pattern in patterns:
-                        if re.search(pattern, line_text, re.IGNORECASE):
-                            y_ratio = (line_idx / len(lines)) if lines else 0.5
-                            y_pos = y_start + (y_ratio * system_height)
-                            
-                            all_labels.append({
-                                'type': inst_type,
-                                'text': line_text,
-                                'y_pos': y_pos / 2,
-                                'line_idx': line_idx,
-                                'confidence': 0.8
-                            })
-                            break
-            
-            # Y座標でソート
-            all_labels.sort(key=lambda x: x['y_pos'])
-            
-            return all_labels
-            
+                x0, y0 = crop.to_source(0, 0)
+                mosaic.add(
+                    region.index,
+                    crop.image,
+                    origin=(x0 / segmentation.scale, region.top + y0 / segmentation.scale),
+                    scale=segmentation.scale * crop.scale
+                )
+            return self.ocr_language.recognize_lines(mosaic, self.is_instrument_label)
         except Exception as e:
-            return []
+            if self.debug_mode:
+                print(f"    OCRエラー: {e}")
+            return {}
     
-    def map_instruments_accurately_v17(self, staff_groups: List[Dict], all_labels: List[Dict]) -> Dict:
-        """V17核心：正確な楽器マッピング"""
-        instruments = {
-            'vocal': None,
-            'keyboard': None
-        }
-        
-        if not staff_groups or not all_labels:
-            return instruments
+    def is_instrument_label(self, text: str) -> bool:
+        """いずれかの楽器名を含む行か"""
+        return classify_label(text).part is not None
+    
+    def detect_all_instrument_labels_v17(self, segmentation: PageSegmentation, region: SystemRegion,
+                                         ocr_lines: Optional[List[MosaicLine]] = None) -> List[InstrumentLabel]:
+        """V17：全楽器ラベル検出（改善版）
+
+        ocr_lines を省略したときはこのシステムだけをOCRする
+        """
+        if ocr_lines is None:
+            ocr_lines = self.ocr_label_lines(segmentation, [region]).get(region.index, [])
         
-        # ターゲット楽器のみ抽出
-        vocal_labels = [l for l in all_labels if l['type'] == 'vocal']
-        keyboard_labels = [l for l in all_labels if l['type'] == 'keyboard']
+        # 全楽器ラベル収集
+        all_labels = []
+        for line in ocr_lines:
+            # 行に含まれる全楽器タイプ（スコアを信頼度に使う）
+            x0, y0, x1, y1 = line.rect
+            for inst_type, score in classify_label(line.text).scores:
+                all_labels.append(InstrumentLabel(
+                    text=line.text,
+                    x=x0,
+                    y=y0,
+                    height=y1 - y0,
+                    part=inst_type,
+                    confidence=score,
+                    width=x1 - x0
+                ))
         
-        # 除外楽器の位置も把握（キーボードとの混同を防ぐ）
-        guitar_labels = [l for l in all_labels if l['type'] == 'guitar']
-        bass_labels = [l for l in all_labels if l['type'] == 'bass']
+        # Y座標でソート
+        all_labels.sort(key=lambda x: x.y_center)
         
-        # ボーカルマッピング（通常最上位）
-        if vocal_labels and staff_groups:
-            # 最初のボーカルラベル
-            vocal_label = vocal_labels[0]
-            
-            # 最も近いスタッフを検索（ただし最上位優先）
-            best_staff = None
-            min_distance = float('inf')
-            
-            for staff in staff_groups[:2]:  # 上位2つのみ検討
-                distance = abs(staff['y_center'] - vocal_label['y_pos'])
-                if distance < min_distance and distance < 50:  # 50pt以内
-                    min_distance = distance
-                    best_staff = staff
-            
-            if best_staff:
-                instruments['vocal'] = {
-                    'staff': best_staff,
-                    'label': vocal_label,
-                    'confidence': vocal_label['confidence'],
-                    'position': best_staff['position']
-                }
-        
-        # キーボードマッピング（V17改善：ギターとの混同を防ぐ）
-        if keyboard_labels and staff_groups:
-            keyboard_label = keyboard_labels[0]
-            
-            # ギターの位置を特定
-            guitar_positions = []
-            for g_label in guitar_labels:
-                for staff in staff_groups:
-                    if abs(staff['y_center'] - g_label['y_pos']) < 50:
-                        guitar_positions.append(staff['position'])
-            
-            # キーボードに最適なスタッフを検索
-            best_staff = None
-            min_distance = float('inf')
-            
-            for staff in staff_groups:
-                # ギターの位置は除外
-                if staff['position'] in guitar_positions:
-                    continue
-                
-                # ボーカルの位置も除外
-                if instruments['vocal'] and staff['position'] == instruments['vocal']['position']:
-                    continue
-                
-                distance = abs(staff['y_center'] - keyboard_label['y_pos'])
-                
-                # キーボードは通常中位〜下位
-                position_score = 0
-                if staff['position'] >= 1:  # 2番目以降を優先
-                    position_score = 10
-                
-                total_score = distance - position_score
-                
-                if total_score < min_distance and distance < 100:
-                    min_distance = total_score
-                    best_staff = staff
-            
-            if best_staff:
-                instruments['keyboard'] = {
-                    'staff': best_staff,
-                    'label': keyboard_label,
-                    'confidence': keyboard_label['confidence'],
-                    'position': best_staff['position']
-                }
-                
-                if self.debug_mode:
-                    print(f"        🎹 Keyboard mapped to position {best_staff['position']} (avoided guitar at {guitar_positions})")
-        
-        return instruments
+        return all_labels
     
-    def calculate_system_rect(self, page: fitz.Page, system_idx: int) -> fitz.Rect:
-        """システム矩形計算"""
-        page_height = page.rect.height
-        system_height = page_height / 2
+    def map_instruments_accurately_v17(self, staff_groups: List[StaffGroup],
+                                       all_labels: List[InstrumentLabel]) -> Dict[str, PartAssignment]:
+        """V17核心：正確な楽器マッピング（見つかったパートのみ返す）
+
+        ギター・ベース等の除外楽器も含めて全ラベルを一括で割り当てるため、
+        キーボードが他楽器の五線に割り当てられることはない
+        """
+        instruments = assign_labels(staff_groups, all_labels)
         
-        y_start = system_idx * system_height
-        y_end = (system_idx + 1) * system_height
+        if self.debug_mode and 'keyboard' in instruments:
+            others = {part: a.position for part, a in instruments.items() if part not in ('vocal', 'keyboard')}
+            print(f"        🎹 Keyboard mapped to position {instruments['keyboard'].position} (others: {others})")
         
-        return fitz.Rect(0, y_start, page.rect.width, y_end)
+        return instruments
     
-    def transfer_system_content_v17(self, target_page: fitz.Page, src_pdf: fitz.Document, 
-                                   system: Dict, current_y: float):
+    def transfer_system_content_v17(self, target_page: fitz.Page, composer: OutputComposer, 
+                                   system: System, current_y: float):
         """V17コンテンツ転送（UI改善含む）"""
         
-        page_num = system['page_num']
-        instruments = system['instruments']
+        page_num = system.page_num
+        source_width = composer.src_pdf[page_num].rect.width
+        vocal = system.assignment('vocal') if 'vocal' in self.parts else None
+        keyboard = system.assignment('keyboard') if 'keyboard' in self.parts else None
         
         # ボーカルパート
-        if instruments['vocal']:
+        if vocal:
             try:
-                staff = instruments['vocal']['staff']
+                staff = vocal.staff
                 
-                vocal_y_start = staff['y_start'] - 5
-                vocal_y_end = staff['y_end'] + 25
+                vocal_y_start = staff.y_start - 5
+                vocal_y_end = staff.y_end + 25
                 
                 vocal_clip = fitz.Rect(
                     0,
                     vocal_y_start,
-                    src_pdf[page_num].rect.width,
+                    source_width,
                     vocal_y_end
                 )
                 
@@ -451,10 +314,10 @@ class FinalSmartExtractorV17Accurate:
                 )
                 
                 # 楽譜転送
-                target_page.show_pdf_page(
-                    vocal_dest, 
-                    src_pdf, 
-                    page_num, 
+                composer.place(
+                    target_page,
+                    vocal_dest,
+                    page_num,
                     clip=vocal_clip,
                     keep_proportion=False
                 )
@@ -466,19 +329,19 @@ class FinalSmartExtractorV17Accurate:
                 print(f"      ❌ Vocal transfer error: {e}")
         
         # キーボードパート
-        if instruments['keyboard']:
+        if keyboard:
             try:
-                staff = instruments['keyboard']['staff']
+                staff = keyboard.staff
                 
-                keyboard_y_start = staff['y_start']
-                keyboard_y_end = staff['y_end'] + 10
+                keyboard_y_start = staff.y_start
+                keyboard_y_end = staff.y_end + 10
                 
-                keyboard_y_offset = 65 if instruments['vocal'] else 0
+                keyboard_y_offset = 65 if vocal else 0
                 
                 keyboard_clip = fitz.Rect(
                     0,
                     keyboard_y_start,
-                    src_pdf[page_num].rect.width,
+                    source_width,
                     keyboard_y_end
                 )
                 
@@ -490,9 +353,9 @@ class FinalSmartExtractorV17Accurate:
                 )
                 
                 # 楽譜転送
-                target_page.show_pdf_page(
+                composer.place(
+                    target_page,
                     keyboard_dest,
-                    src_pdf,
                     page_num,
                     clip=keyboard_clip,
                     keep_proportion=False
@@ -521,19 +384,18 @@ class FinalSmartExtractorV17Accurate:
             fontname="helvetica-bold"
         )
     
-    def save_output_v17(self, output_pdf: fitz.Document, original_path: str, total_systems: int) -> str:
+    def save_output_v17(self, composer: OutputComposer, original_path: str, total_systems: int,
+                        output_path: Optional[str] = None) -> str:
         """V17出力保存"""
-        base_name = os.path.splitext(os.path.basename(original_path))[0]
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        output_dir = "/Users/Yodai/band_part_key_app/outputs/extracted_scores"
-        os.makedirs(output_dir, exist_ok=True)
-        output_path = os.path.join(output_dir, f"{base_name}_final_v17_accurate_{timestamp}.pdf")
+        if output_path is None:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            output_path = f"{os.path.splitext(original_path)[0]}_final_v17_accurate_{timestamp}.pdf"
         
-        output_pdf.save(output_path)
+        composer.save(output_path)
         
         print(f"\n✅ V17 Accurate Extraction Success!")
         print(f"  Output: {output_path}")
-        print(f"  Pages: {len(output_pdf)}")
+        print(f"  Pages: {composer.page_count}")
         print(f"  Systems: {total_systems}")
         print(f"  Fix: Keyboard correctly extracts Keyboard (not Guitar)")
         
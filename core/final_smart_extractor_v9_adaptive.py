@@ -11,10 +11,12 @@ import os
 from datetime import datetime
 import numpy as np
 import cv2
-import pytesseract
 from PIL import Image
 import io
-import re
+
+from core.label_classifier import classify_label
+from core.ocr_cache import get_ocr_cache
+from core.ocr_preprocess import preprocess_for_ocr
 
 class FinalSmartExtractorV9Adaptive:
     """最終スマート抽出器 V9 - 適応型楽器検出"""
@@ -24,27 +26,6 @@ class FinalSmartExtractorV9Adaptive:
         self.page_width = 595  # A4
         self.page_height = 842
         self.margin = 20
-        
-        # 楽器名パターン（複数言語対応）
-        self.instrument_patterns = {
-            'vocal': [
-                r'Vocal', r'Vo\.?', r'Voice', r'Melody', r'Chorus', r'Cho\.?',
-                r'Lead', r'Sing', r'ボーカル', r'ヴォーカル', r'メロディ', r'歌'
-            ],
-            'keyboard': [
-                r'Keyboard', r'Key\.?', r'Keyb\.?', r'Piano', r'Pf\.?', r'Synth',
-                r'Organ', r'キーボード', r'ピアノ', r'シンセ', r'鍵盤'
-            ],
-            'guitar': [
-                r'Guitar', r'Gt\.?', r'Gtr\.?', r'ギター', r'G\.'
-            ],
-            'bass': [
-                r'Bass', r'Ba\.?', r'Bs\.?', r'ベース', r'B\.'
-            ],
-            'drums': [
-                r'Drums?', r'Dr\.?', r'Percussion', r'ドラム', r'D\.'
-            ]
-        }
     
     def detect_staff_lines(self, page, system_idx=0):
         """五線譜の位置を検出してグループ化"""
@@ -136,10 +117,14 @@ class FinalSmartExtractorV9Adaptive:
             y_end = (system_idx + 1) * system_height
             
             # 左端の領域のみOCR（楽器名は通常左側）
-            left_region = img.crop((0, y_start, width // 4, y_end))
+            left_region = preprocess_for_ocr(img.crop((0, y_start, width // 4, y_end)))
+            if left_region.empty:
+                return {}
             
-            # OCR実行
-            ocr_text = pytesseract.image_to_string(left_region, lang='eng+jpn')
+            # OCR実行（切り詰めた範囲の中で行の位置を推定する）
+            ocr_text = get_ocr_cache().image_to_string(left_region.image, lang='eng+jpn')
+            y_start += left_region.offset[1]
+            system_height = left_region.image.shape[0] / left_region.scale
             
             # 楽器名を検出
             found_instruments = {}
@@ -150,23 +135,20 @@ class FinalSmartExtractorV9Adaptive:
                 if not line_text:
                     continue
                 
-                # 各楽器パターンをチェック
-                for inst_type, patterns in self.instrument_patterns.items():
-                    for pattern in patterns:
-                        if re.search(pattern, line_text, re.IGNORECASE):
-                            # Y座標を推定
-                            y_ratio = (line_idx / len(lines)) if lines else 0.5
-                            y_pos = y_start + (y_ratio * system_height)
-                            
-                            if inst_type not in found_instruments:
-                                found_instruments[inst_type] = []
-                            
-                            found_instruments[inst_type].append({
-                                'text': line_text,
-                                'y_pos': y_pos / 2,  # 元のスケールに戻す
-                                'confidence': 0.8  # OCR信頼度（仮）
-                            })
-                            break
+                # 行に含まれる全楽器タイプ
+                for inst_type, score in classify_label(line_text).scores:
+                    # Y座標を推定
+                    y_ratio = (line_idx / len(lines)) if lines else 0.5
+                    y_pos = y_start + (y_ratio * system_height)
+                    
+                    if inst_type not in found_instruments:
+                        found_instruments[inst_type] = []
+                    
+                    found_instruments[inst_type].append({
+                        'text': line_text,
+                        'y_pos': y_pos / 2,  # 元のスケールに戻す
+                        'confidence': score  # ラベル分類のスコア
+                    })
             
             return found_instruments
             
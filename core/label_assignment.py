@@ -0,0 +1,124 @@
+"""
+楽器ラベル→五線の割り当て
+全ラベル×全五線のコスト行列（縦方向の距離 + パートごとの位置の事前コスト）をNumPyで作り、
+上下の並び順を保つ一対一対応を動的計画法で解く
+
+ラベルと五線はどちらも上から順に並ぶため、ハンガリアン法の代わりに
+順序制約付きDP（O(ラベル数×五線数)）で全パートの最適な割り当てを一度に求められる。
+一対一対応なので、キーボードとギターが同じ五線を取り合うことはない。
+"""
+
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from core.score_model import InstrumentLabel, PartAssignment, StaffGroup
+
+# これより離れたラベルと五線は対応させない（pt）
+MAX_DISTANCE = 100.0
+PART_MAX_DISTANCE = {
+    'vocal': 50.0,
+}
+
+# ラベルを割り当てずに捨てるコスト（距離コストは0〜1に正規化されるため、
+# 並び順の矛盾を解消する場合にだけ選ばれる）
+SKIP_LABEL_COST = 2.0
+
+# システム内の位置（上から0始まり）に応じた事前コスト
+# ボーカルは通常最上位、キーボードは2番目以降
+POSITION_PRIORS = {
+    'vocal': lambda positions: np.where(positions <= 1, 0.0, 0.5),
+    'keyboard': lambda positions: np.where(positions >= 1, 0.0, 0.1),
+}
+
+
+def build_cost_matrix(staff_groups: Sequence[StaffGroup], labels: Sequence[InstrumentLabel]) -> np.ndarray:
+    """コスト行列（行: ラベル、列: 五線）を作成。対応不可の組み合わせは inf"""
+    staff_centers = np.array([staff.y_center for staff in staff_groups], dtype=float)
+    positions = np.array([staff.position for staff in staff_groups])
+    label_centers = np.array([label.y_center for label in labels], dtype=float)
+    limits = np.array([PART_MAX_DISTANCE.get(label.part, MAX_DISTANCE) for label in labels], dtype=float)
+
+    distance = np.abs(label_centers[:, None] - staff_centers[None, :])
+    cost = distance / limits[:, None]
+
+    for row, label in enumerate(labels):
+        prior = POSITION_PRIORS.get(label.part)
+        if prior is not None:
+            cost[row] += prior(positions)
+
+    cost[distance > limits[:, None]] = np.inf
+    return cost
+
+
+def solve_ordered_assignment(cost: np.ndarray, skip_cost: float = SKIP_LABEL_COST) -> List[Optional[int]]:
+    """行（ラベル）→列（五線）の最小コスト対応。行 i < k の対応先は列の順序も保つ
+
+    各行の対応先の列番号（対応なしは None）を返す
+    """
+    n_labels, n_staves = cost.shape
+    # dp[i, j]: 上からi個のラベルとj個の五線までを使った最小コスト
+    dp = np.full((n_labels + 1, n_staves + 1), np.inf)
+    dp[0, :] = 0.0
+    matched = np.zeros((n_labels + 1, n_staves + 1), dtype=bool)
+    from_left = np.zeros((n_labels + 1, n_staves + 1), dtype=bool)
+
+    for i in range(1, n_labels + 1):
+        skip = dp[i - 1] + skip_cost
+        match = np.full(n_staves + 1, np.inf)
+        match[1:] = dp[i - 1, :-1] + cost[i - 1]
+
+        best = np.minimum(skip, match)
+        matched[i] = match < skip
+        # 五線を使わずに右へ進む遷移は行内の累積最小値で一括計算
+        dp[i] = np.minimum.accumulate(best)
+        from_left[i] = dp[i] < best
+
+    assignment: List[Optional[int]] = [None] * n_labels
+    i, j = n_labels, n_staves
+    while i > 0:
+        if from_left[i, j]:
+            j -= 1
+        elif matched[i, j]:
+            assignment[i - 1] = j - 1
+            i -= 1
+            j -= 1
+        else:
+            i -= 1
+    return assignment
+
+
+def assign_labels(staff_groups: Sequence[StaffGroup],
+                  labels: Sequence[InstrumentLabel]) -> Dict[str, PartAssignment]:
+    """全ラベルを五線へ一括で割り当て、パートごとの対応を返す
+
+    信頼度 = ラベル自体の信頼度 × (1 - 距離 / 許容距離)。
+    同じパートのラベルが複数対応した場合は信頼度の高いものを採用する。
+    """
+    if not staff_groups or not labels:
+        return {}
+
+    staff_order = sorted(range(len(staff_groups)), key=lambda k: staff_groups[k].y_center)
+    label_order = sorted(range(len(labels)), key=lambda k: labels[k].y_center)
+    staves = [staff_groups[k] for k in staff_order]
+    ordered_labels = [labels[k] for k in label_order if labels[k].part]
+
+    if not ordered_labels:
+        return {}
+
+    cost = build_cost_matrix(staves, ordered_labels)
+    assignments: Dict[str, PartAssignment] = {}
+
+    for label, column in zip(ordered_labels, solve_ordered_assignment(cost)):
+        if column is None:
+            continue
+        staff = staves[column]
+        limit = PART_MAX_DISTANCE.get(label.part, MAX_DISTANCE)
+        closeness = max(0.0, 1.0 - abs(staff.y_center - label.y_center) / limit)
+        confidence = label.confidence * closeness
+
+        current = assignments.get(label.part)
+        if current is None or confidence > current.confidence:
+            assignments[label.part] = PartAssignment(label.part, staff, label, confidence)
+
+    return assignments
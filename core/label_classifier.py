@@ -0,0 +1,140 @@
+"""
+楽器ラベルの分類
+V9・V17・measure_based・adaptive（engine_router）がそれぞれ持っていた楽器名のパターン・
+除外リスト・OCR誤認識の置換表を1か所にまとめ、1つの正規表現にコンパイルして使う
+
+1. OCR誤認識の置換（Vocai → Vocal など、置換表を1つの選択の正規表現で一括置換）
+2. 楽器名と紛らわしい単語（Echo / Choir など）を伏せる
+3. 全パートのパターンを名前付きグループの選択にした正規表現で、行内の全パートを1回の走査で拾う
+
+除外対象（ギター・ベース・ドラム）とコードのラベルを含む行は、ボーカル・キーボードより優先する
+"""
+
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from core.score_model import slotted_dataclass
+
+# パートごとのパターン（並び順が優先順位）
+# 除外パートの略記は前後に英字が続かないものに限る（Bach・Basic・Drive などを除外しないため。Gt1 のような番号は可）
+PART_PATTERNS: Dict[str, List[str]] = {
+    'guitar': [r'Guitar', r'(?<![a-z])Gtr(?![a-z])\.?', r'(?<![a-z])Gt(?![a-z])\.?', r'E\.G', r'^G\.$', r'ギター'],
+    'bass': [r'Bass', r'(?<![a-z])Ba(?![a-z])\.?', r'(?<![a-z])Bs(?![a-z])\.?', r'E\.B', r'^B\.$', r'ベース'],
+    'drums': [r'Drums?', r'(?<![a-z])Drs(?![a-z])\.?', r'(?<![a-z])Dr(?![a-z])\.?', r'Percussion', r'^D\.$',
+              r'ドラム'],
+    # コード譜のラベル（略記は大文字・小文字を区別し、Cho.（コーラス）と区別する）
+    'chord': [r'^(?:Ch\.?|(?-i:CHO\.?)|(?-i:C\.))(?=\s|$)', r'Chords?', r'コード'],
+    'keyboard': [
+        r'Keyboard', r'Keyb\.?', r'Keys', r'Key\.?(?!tar)', r'Kbd\.?', r'Kb', r'Piano', r'E\.P\.', r'^Ep$',
+        r'P\.f\.', r'Pf\.?', r'Pno\.?', r'Synth', r'Syn\.?', r'Organ',
+        r'キーボード', r'ピアノ', r'シンセ', r'鍵盤',
+    ],
+    'vocal': [
+        r'Vocal', r'Voc', r'Vcl', r'Vo\.?', r'^V\.$', r'Voice', r'Melody', r'Chorus', r'Cho\.?', r'Lead', r'Sing',
+        r'ボーカル', r'ヴォーカル', r'メロディ', r'歌',
+    ],
+}
+
+# 抽出しないパート
+EXCLUDED_PARTS = ('guitar', 'bass', 'drums')
+
+# OCRで誤認識されやすい綴り（大文字・小文字を区別しない）
+OCR_CORRECTIONS = {
+    'Vora': 'Vocal',
+    'Vocai': 'Vocal',
+    'Ke/.': 'Key.',
+    'Ke/': 'Key',
+    'P/ano': 'Piano',
+    'Synfh': 'Synth',
+    'Keyl': 'Key.1',
+    'Key1': 'Key.1',
+    'Key2': 'Key.2',
+    'Key3': 'Key.3',
+}
+
+# パターンの一部を含むが楽器名ではない単語
+FALSE_FRIENDS = ['Chime', 'Choice', 'Echo', 'Pitch', 'Choir', 'Channel', 'Check']
+
+
+@slotted_dataclass(frozen=True)
+class LabelClass:
+    """ラベルの分類結果（scores はパートごとのスコア 0〜1、優先順）"""
+    text: str
+    part: Optional[str] = None
+    score: float = 0.0
+    scores: Tuple[Tuple[str, float], ...] = ()
+    corrected: bool = False
+
+    @property
+    def parts(self) -> List[str]:
+        """行に含まれる全パート（優先順）"""
+        return [part for part, _ in self.scores]
+
+    @property
+    def excluded(self) -> bool:
+        return self.part in EXCLUDED_PARTS
+
+    def score_for(self, part: str) -> float:
+        return dict(self.scores).get(part, 0.0)
+
+
+class LabelClassifier:
+    """パターンを1つの正規表現にコンパイルした楽器ラベル分類器"""
+
+    def __init__(self, patterns: Dict[str, List[str]] = PART_PATTERNS,
+                 corrections: Dict[str, str] = OCR_CORRECTIONS,
+                 false_friends: List[str] = FALSE_FRIENDS):
+        self.priority = list(patterns)
+        # 各位置で先頭一致するパートを先読みで調べ、重なり合う一致も拾う
+        alternatives = '|'.join(
+            f"(?P<{part}>{'|'.join(part_patterns)})" for part, part_patterns in patterns.items()
+        )
+        self._pattern = re.compile(f'(?=(?:{alternatives}))', re.IGNORECASE)
+
+        self._corrections = {wrong.lower(): correct for wrong, correct in corrections.items()}
+        self._correction_pattern = re.compile(
+            '|'.join(re.escape(wrong) for wrong in sorted(corrections, key=len, reverse=True)), re.IGNORECASE
+        ) if corrections else None
+        self._false_friend_pattern = re.compile('|'.join(false_friends), re.IGNORECASE) if false_friends else None
+
+    def normalize(self, text: str) -> str:
+        """前後の空白を除き、OCR誤認識を置換"""
+        text = text.strip()
+        if self._correction_pattern is not None:
+            text = self._correction_pattern.sub(lambda m: self._corrections[m.group(0).lower()], text)
+        return text
+
+    def classify(self, text: str) -> LabelClass:
+        normalized = self.normalize(text)
+        searchable = normalized
+        if self._false_friend_pattern is not None:
+            searchable = self._false_friend_pattern.sub(lambda m: ' ' * len(m.group(0)), searchable)
+
+        covered: Dict[str, set] = {}
+        for match in self._pattern.finditer(searchable):
+            part = match.lastgroup
+            start, end = match.span(part)
+            covered.setdefault(part, set()).update(range(start, end))
+        if not covered:
+            return LabelClass(normalized, corrected=normalized != text.strip())
+
+        # 行の（空白を除く）文字のうちパートの名前が占める割合でスコアを付ける
+        length = sum(1 for c in normalized if not c.isspace()) or 1
+        corrected = normalized != text.strip()
+        penalty = 0.9 if corrected else 1.0
+        scores = tuple(
+            (part, round((0.6 + 0.4 * min(1.0, len(covered[part]) / length)) * penalty, 3))
+            for part in self.priority if part in covered
+        )
+        part, score = scores[0]
+        return LabelClass(normalized, part, score, scores, corrected)
+
+
+_default_classifier = LabelClassifier()
+
+
+@lru_cache(maxsize=4096)
+def classify_label(text: str) -> LabelClass:
+    """既定のパターンでラベルを分類（同じ文字列の結果は使い回す）"""
+    return _default_classifier.classify(text)
@@ -1,38 +1,51 @@
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Tuple
+
 import fitz
-import cv2
-import numpy as np
-from PIL import Image
-import io
-import pytesseract
+
+from core.barline_detector import BarlineDetector
+from core.label_classifier import FALSE_FRIENDS, LabelClassifier
+from core.output_composer import OutputComposer
+from core.page_image import PageImageSource
+from core.page_tokens import PageTokenIndex
+from core.score_model import InstrumentLabel, Measure, System
+from core.system_segmenter import SystemSegmenter
+
+# 左端の「Chorus」は曲のセクション名のことが多いため、measure_based では楽器ラベルにしない
+_label_classifier = LabelClassifier(false_friends=FALSE_FRIENDS + ['Chorus'])
+
+
+@lru_cache(maxsize=4096)
+def classify_label(text: str):
+    """measure_based 用のパターンでラベルを分類"""
+    return _label_classifier.classify(text)
+
+
+@dataclass
+class SystemTemplate:
+    """通常処理のページから学習したシステムのレイアウト（y座標は先頭の五線の上端からの相対値）"""
+    staff_offsets: Tuple[float, ...]
+    instruments: Tuple[InstrumentLabel, ...]
+    source_page: int
+
+    def fits(self, region, tolerance: float) -> bool:
+        """検出したシステムの五線の数と位置がテンプレートと一致するか"""
+        if len(region.staves) != len(self.staff_offsets):
+            return False
+        anchor = region.staves[0].y_start
+        return all(
+            abs((staff.y_start - anchor) - offset) <= tolerance
+            for staff, offset in zip(region.staves, self.staff_offsets)
+        )
+
 
 class MeasureBasedExtractor:
     """小節ベースの高精度抽出 - 8小節単位で整理"""
     
     def __init__(self):
-        # 抽出対象の楽器定義
-        self.target_instruments = {
-            'vocal': ['Vo.', 'Vocal', 'Vo', 'VOC', 'ボーカル', 'Vo.&Cho.', 'VOCAL', 'Voc', 'V.', 'Vcl', 'Lead', 'Vora'],
-            'chord': [],  # コードは実際のコード記号で検出する
-            'keyboard': ['Keyb.', 'Keyb', 'Key.', 'Key', 'Piano', 'Pf.', 'Pf', 'Synth', 
-                        'Organ', 'キーボード', 'P.f.', 'KEYBOARD', 'PIANO', 'E.Piano', 
-                        'E.P.', 'Pno', 'Kb', 'Kbd.', 'Syn.', 'Syn', 'Keys', 'Pno.', 'Ep', 'Key.1', 'Key.2', 'Key.3']
-        }
-        
-        # OCRで誤認識されやすいパターン
-        self.ocr_corrections = {
-            'Vora': 'Vocal',
-            'Vocai': 'Vocal',
-            'Ke/': 'Key',
-            'Ke/.': 'Key.',
-            'P/ano': 'Piano',
-            'Synfh': 'Synth',
-            'Key2': 'Key.2',
-            'Key1': 'Key.1',
-            'Key3': 'Key.3',
-            'Keyl': 'Key.1',
-            'Key2': 'Key.2',
-            'Key3': 'Key.3'
-        }
+        # ラベルから検出するパート（コードはラベルではなく実際のコード記号で検出する）
+        self.label_parts = ('vocal', 'keyboard')
         
         # コード記号のパターン
         import re
@@ -44,10 +57,6 @@ class MeasureBasedExtractor:
         # 日本語コード名パターン
         self.jp_chord_pattern = re.compile(r'^[イロハニホヘト][#b]?')  # イロハニホヘト = CDEFGAB
         
-        # 除外する楽器
-        self.exclude_exact = ['Ba.', 'Bass', 'E.B.', 'E.Ba.', 'E.Ba', 'B.', 'Gt.', 'Gt', 'Dr.', 'Dr']
-        self.exclude_partial = ['ベース', 'bass', 'Guitar', 'ギター', 'Drum', 'Drums', 'ドラム']
-        
         # A4縦のサイズ
         self.page_width = 595
         self.page_height = 842
@@ -61,15 +70,21 @@ class MeasureBasedExtractor:
         self.measures_per_line = 8  # 1行あたり8小節（デフォルト）
         self.measures_per_line_options = [4, 8]  # 利用可能なオプション
         
-        # デフォルトの楽器レイアウト（フォールバック用）
-        self.default_layouts = [
-            {'type': 'vocal', 'y_ratio': 0.15, 'height_ratio': 0.10, 'label': 'Vocal'},
-            {'type': 'chord', 'y_ratio': 0.25, 'height_ratio': 0.05, 'label': 'Chord'},
-            {'type': 'keyboard', 'y_ratio': 0.30, 'height_ratio': 0.15, 'label': 'Keyboard'}
-        ]
+        # 小節線検出（1ページ1回のラスタ化で全システムの小節を求める）
+        self.segmenter = SystemSegmenter()
+        self.page_images = PageImageSource()
+        self.barline_detector = BarlineDetector()
+        
+        # 高速モード：テンプレートと五線の位置がこの範囲（pt）でずれていれば通常処理に戻す
+        self.template_tolerance = 10
         
-    def extract_parts(self, pdf_path, selected_parts, pages_to_extract=None, progress_callback=None, measures_per_line=None, show_lyrics=False):
-        """選択したパートを小節単位で抽出"""
+        # ページ単位のOCRトークン索引（ラベル・コード・歌詞で共有、ページ番号 -> PageTokenIndex）
+        self.ocr_dpi = 300
+        self._page_tokens = {}
+        
+    def extract_parts(self, pdf_path, selected_parts, pages_to_extract=None, progress_callback=None, measures_per_line=None, show_lyrics=False,
+                      output_path=None):
+        """選択したパートを小節単位で抽出（output_path 未指定時は入力PDFと同じ場所に保存）"""
         try:
             # 小節数の設定
             if measures_per_line and measures_per_line in self.measures_per_line_options:
@@ -77,16 +92,19 @@ class MeasureBasedExtractor:
             
             # 歌詞表示オプションを保存
             self.show_lyrics = show_lyrics
+            self._page_tokens = {}
             
             src_pdf = fitz.open(pdf_path)
-            output_pdf = fitz.open()
+            composer = OutputComposer(src_pdf, self.page_width, self.page_height)
             
             all_systems = []
             total_pages = len(src_pdf)
             processed_pages = 0
             
-            # 高速モードフラグ（最初の3ページのみOCRを試行）
+            # 高速モードフラグ（最初の3ページで学習したレイアウトを以降のページに使う）
             use_fast_mode = total_pages > 3
+            template = None
+            fallback_pages = []
             
             for page_num in range(total_pages):
                 if pages_to_extract and page_num not in pages_to_extract:
@@ -99,31 +117,44 @@ class MeasureBasedExtractor:
                 if progress_callback:
                     progress_callback(page_num + 1, total_pages)
                 
+                # 五線・小節線の検出（ページ1回のラスタ化。テンプレートの照合にも使う）
+                page_measures = self._detect_page_measures(page)
+                
                 # 高速モードの判定
-                if use_fast_mode and page_num >= 3:
-                    # 3ページ目以降は高速処理
+                page_systems = None
+                if use_fast_mode and page_num >= 3 and template:
+                    # 4ページ目以降は学習したテンプレートで高速処理
                     page_systems = self._extract_systems_fast(
-                        page, page_num, selected_parts
+                        page, page_num, selected_parts, template, page_measures
                     )
-                else:
-                    # 最初の3ページは通常のOCR処理
+                    if page_systems is None:
+                        print(f"  テンプレート不一致のため通常処理に戻します")
+                        fallback_pages.append(page_num)
+                
+                if page_systems is None:
+                    # 最初の3ページとテンプレートが合わないページは通常のOCR処理
                     page_systems = self._extract_systems_from_page(
-                        page, page_num, selected_parts
+                        page, page_num, selected_parts, page_measures
                     )
+                    template = self._learn_template(page_systems, page_measures) or template
                 
                 all_systems.extend(page_systems)
                 processed_pages += 1
             
+            if fallback_pages:
+                print(f"\n通常処理に戻したページ: {[p + 1 for p in fallback_pages]}")
+            
             # A4縦に配置
             if all_systems:
-                self._create_output_pdf(output_pdf, all_systems, src_pdf)
+                self._create_output_pdf(composer, all_systems)
             
             # 保存
-            output_path = pdf_path.replace('.pdf', f'_measure_based_{self.measures_per_line}m.pdf')
-            output_pdf.save(output_path)
+            if output_path is None:
+                output_path = pdf_path.replace('.pdf', f'_measure_based_{self.measures_per_line}m.pdf')
+            composer.save(output_path)
             
+            composer.close()
             src_pdf.close()
-            output_pdf.close()
             
             print(f"\n抽出完了: {output_path}")
             return output_path
@@ -133,8 +164,10 @@ class MeasureBasedExtractor:
             import traceback
             traceback.print_exc()
             return None
+        finally:
+            self.page_images.clear()
     
-    def _extract_systems_from_page(self, page, page_num, selected_parts):
+    def _extract_systems_from_page(self, page, page_num, selected_parts, page_measures=None):
         """ページからシステムを抽出"""
         # 楽器ラベルを検出
         instrument_labels = self._find_instrument_labels(page)
@@ -142,6 +175,10 @@ class MeasureBasedExtractor:
         # システムにグループ化
         systems = self._group_into_systems(instrument_labels)
         
+        # ページ内の全システムの小節
+        if page_measures is None:
+            page_measures = self._detect_page_measures(page) if systems else []
+        
         page_systems = []
         
         for sys_idx, system in enumerate(systems):
@@ -152,58 +189,37 @@ class MeasureBasedExtractor:
             
             for inst in system:
                 # 除外チェック
-                if self._should_exclude(inst['label']):
-                    print(f"    除外: {inst['label']}")
+                if self._should_exclude(inst.text):
+                    print(f"    除外: {inst.text}")
                     continue
                 
                 # 選択されたパートかチェック
-                part_type = self._identify_part_type(inst['label'], selected_parts)
+                part_type = self._identify_part_type(inst.text, selected_parts)
                 if part_type:
-                    inst['type'] = part_type
+                    inst.part = part_type
                     selected_in_system.append(inst)
-                    print(f"    {part_type}: {inst['label']}")
+                    print(f"    {part_type}: {inst.text}")
             
             # システムに何も選択されていない場合、全て自動追加
             if len(selected_in_system) == 0 and system:
-                base_y = system[0]['y']
+                base_y = system[0].y
                 
                 # ボーカルを追加
                 if 'vocal' in selected_parts:
-                    selected_in_system.append({
-                        'type': 'vocal',
-                        'label': 'Vocal (auto)',
-                        'x': 10,
-                        'y': base_y - 60,
-                        'bbox': [10, base_y - 60, 60, base_y - 35],
-                        'height': 25
-                    })
+                    selected_in_system.append(InstrumentLabel('Vocal (auto)', 10, base_y - 60, 25, part='vocal'))
                     print(f"    vocal: ボーカルラインを自動追加")
                 
                 # キーボードを追加
                 if 'keyboard' in selected_parts:
-                    selected_in_system.append({
-                        'type': 'keyboard',
-                        'label': 'Keyboard (auto)',
-                        'x': 10,
-                        'y': base_y,
-                        'bbox': [10, base_y, 60, base_y + 25],
-                        'height': 25
-                    })
+                    selected_in_system.append(InstrumentLabel('Keyboard (auto)', 10, base_y, 25, part='keyboard'))
                     print(f"    keyboard: キーボードラインを自動追加")
             else:
                 # ボーカルパートが選択されているが検出されていない場合、デフォルトで追加
-                if 'vocal' in selected_parts and not any(inst['type'] == 'vocal' for inst in selected_in_system):
+                if 'vocal' in selected_parts and not any(inst.part == 'vocal' for inst in selected_in_system):
                     # システムの上部にボーカルラインがあると仮定
                     if system:
-                        vocal_y = min(inst['y'] for inst in system) - 30
-                        selected_in_system.append({
-                            'type': 'vocal',
-                            'label': 'Vocal (auto)',
-                            'x': 10,
-                            'y': vocal_y,
-                            'bbox': [10, vocal_y, 60, vocal_y + 25],
-                            'height': 25
-                        })
+                        vocal_y = min(inst.y for inst in system) - 30
+                        selected_in_system.append(InstrumentLabel('Vocal (auto)', 10, vocal_y, 25, part='vocal'))
                         print(f"    vocal: ボーカルラインを自動追加 at y={vocal_y:.1f}")
             
             # コードパートが選択されている場合、コード記号を検出
@@ -213,89 +229,109 @@ class MeasureBasedExtractor:
                     chord_lines = self._detect_chord_lines(page, system)
                     if chord_lines:
                         # 最も上にあるコードラインを選択（通常はボーカルの上）
-                        chord_lines.sort(key=lambda x: x['y'])
+                        chord_lines.sort(key=lambda x: x.y)
                         best_chord_line = chord_lines[0]
                         
-                        best_chord_line['type'] = 'chord'
-                        best_chord_line['label'] = 'Chord Line'
+                        best_chord_line.part = 'chord'
+                        best_chord_line.text = 'Chord Line'
                         selected_in_system.append(best_chord_line)
-                        print(f"    chord: コードライン検出 at y={best_chord_line['y']:.1f}")
+                        print(f"    chord: コードライン検出 at y={best_chord_line.y:.1f}")
                     else:
                         # コードが検出されなかった場合、デフォルトで追加
                         if system:
-                            chord_y = min(inst['y'] for inst in system) - 60
-                            selected_in_system.append({
-                                'type': 'chord',
-                                'label': 'Chord (auto)',
-                                'x': 10,
-                                'y': chord_y,
-                                'bbox': [10, chord_y, 60, chord_y + 20],
-                                'height': 20
-                            })
+                            chord_y = min(inst.y for inst in system) - 60
+                            selected_in_system.append(InstrumentLabel('Chord (auto)', 10, chord_y, 20, part='chord'))
                             print(f"    chord: コードラインを自動追加 at y={chord_y:.1f}")
                 except Exception as e:
                     print(f"    コード検出エラー: {str(e)}")
             
             if selected_in_system:
                 # システムの小節を検出
-                measures = self._detect_measures(page, system)
+                measures = self._detect_measures(page, system, page_measures)
+                
+                bounds = self._calculate_system_bounds(system)
                 
-                page_systems.append({
-                    'page_num': page_num,
-                    'system_idx': sys_idx,
-                    'instruments': selected_in_system,
-                    'measures': measures,
-                    'system_bounds': self._calculate_system_bounds(system),
-                    'lyrics': self._extract_lyrics(page, system) if any(inst['type'] == 'vocal' for inst in selected_in_system) else None
-                })
+                page_systems.append(System(
+                    page_num=page_num,
+                    index=sys_idx,
+                    rect=(0, bounds['top'], page.rect.width, bounds['bottom']),
+                    instruments=selected_in_system,
+                    measures=measures,
+                    lyrics=self._extract_lyrics(page, system) if any(inst.part == 'vocal' for inst in selected_in_system) else None
+                ))
         
         return page_systems
     
-    def _extract_systems_fast(self, page, page_num, selected_parts):
-        """高速なシステム抽出（OCRを省略）"""
+    def _extract_systems_fast(self, page, page_num, selected_parts, template, page_measures=None):
+        """高速なシステム抽出（OCRを省略し、学習したテンプレートを検出した各システムに当てはめる）
+
+        五線の数・位置がテンプレートと合わないシステムがあれば None を返す（通常処理に戻す）
+        """
+        if page_measures is None:
+            page_measures = self._detect_page_measures(page)
+        
+        if not page_measures:
+            return None
+        
+        if not all(template.fits(region, self.template_tolerance) for region, _ in page_measures):
+            return None
+        
         systems = []
-        page_rect = page.rect
-        
-        # デフォルトレイアウトを使用
-        system_instruments = []
-        for layout in self.default_layouts:
-            if layout['type'] in selected_parts:
-                system_instruments.append({
-                    'type': layout['type'],
-                    'label': layout['label'],
-                    'y': page_rect.height * layout['y_ratio'],
-                    'height': page_rect.height * layout['height_ratio']
-                })
-        
-        if system_instruments:
-            # ページの小節数を推定（通常8小節）
-            measures_per_page = 8
-            measure_width = page_rect.width / measures_per_page
+        chords = self._extract_chords_simple(page)
+        
+        for sys_idx, (region, measures) in enumerate(page_measures):
+            anchor = region.staves[0].y_start
+            system_instruments = [
+                InstrumentLabel(inst.text, inst.x, anchor + inst.y, inst.height, part=inst.part)
+                for inst in template.instruments
+                if inst.part in selected_parts
+            ]
+            # このシステムの領域からはみ出す楽器（隣のシステムやページ外）は配置しない
+            system_instruments = [inst for inst in system_instruments if self._in_region(inst, region)]
+            if not system_instruments:
+                continue
             
-            # 小節情報を生成
-            measures = []
-            for i in range(measures_per_page):
-                measures.append({
-                    'number': i + 1,
-                    'x_start': i * measure_width,
-                    'x_end': (i + 1) * measure_width,
-                    'y_start': 0,
-                    'y_end': page_rect.height,
-                    'width': measure_width
-                })
+            systems.append(System(
+                page_num=page_num,
+                index=sys_idx,
+                rect=region.rect,
+                instruments=system_instruments,
+                measures=measures,
+                # コード情報はページ単位で簡易的に抽出
+                chords=chords if sys_idx == 0 else None
+            ))
+        
+        return systems
+    
+    def _learn_template(self, page_systems, page_measures):
+        """通常処理の結果から、検出した五線を基準にした楽器の相対位置を学習"""
+        for system in page_systems:
+            match = self._match_region(system.instruments, page_measures)
+            if match is None:
+                continue
             
-            # コード情報を簡易的に抽出
-            chords = self._extract_chords_simple(page)
+            region = match[0]
+            # ラベルのまとまりが複数のシステムにまたがる場合があるため、対応したシステム内の楽器だけを学習する
+            instruments = [inst for inst in system.instruments if self._in_region(inst, region)]
+            if not instruments:
+                continue
             
-            systems.append({
-                'page_num': page_num,
-                'instruments': system_instruments,
-                'measures': measures,
-                'chords': chords,
-                'has_all_selected': True
-            })
+            anchor = region.staves[0].y_start
+            return SystemTemplate(
+                staff_offsets=tuple(staff.y_start - anchor for staff in region.staves),
+                instruments=tuple(
+                    InstrumentLabel(inst.text, inst.x, inst.y - anchor, inst.height, part=inst.part)
+                    for inst in instruments
+                ),
+                source_page=system.page_num
+            )
         
-        return systems
+        return None
+    
+    @staticmethod
+    def _in_region(inst, region):
+        """楽器ラベルの縦の中心がシステム領域の中にあるか"""
+        return region.top <= inst.y_center <= region.bottom
     
     def _extract_chords_simple(self, page):
         """簡易的なコード抽出"""
@@ -331,18 +367,10 @@ class MeasureBasedExtractor:
                         
                         # 左端のテキスト
                         if bbox[0] < 100 and text and len(text) < 20:
-                            instrument_keywords = ['Vo', 'Gt', 'Ba', 'Dr', 'Key', 'Pf', 'Piano', 'Synth', 'Ch', 'Chord', 'コード']
-                            # 除外パターンのチェック
-                            exclude_patterns = ['Chime', 'Choice', 'Chorus', 'Echo', 'Pitch', 'Choir', 'Channel']
-                            if not any(exc.lower() in text.lower() for exc in exclude_patterns):
-                                if any(kw in text for kw in instrument_keywords):
-                                    labels.append({
-                                        'label': text,
-                                        'x': bbox[0],
-                                        'y': bbox[1],
-                                        'bbox': bbox,
-                                        'height': bbox[3] - bbox[1]
-                                    })
+                            if classify_label(text).part is not None:
+                                labels.append(InstrumentLabel(
+                                    text, bbox[0], bbox[1], bbox[3] - bbox[1], width=bbox[2] - bbox[0]
+                                ))
         
         # テキストがない場合はOCR
         if not has_text or len(labels) == 0:
@@ -356,143 +384,86 @@ class MeasureBasedExtractor:
             # ページの中央付近にデフォルトのシステムを追加
             page_height = page.rect.height
             default_labels = [
-                {
-                    'label': 'System',
-                    'x': 10,
-                    'y': page_height * 0.3,
-                    'bbox': [10, page_height * 0.3, 60, page_height * 0.3 + 25],
-                    'height': 25
-                },
-                {
-                    'label': 'System',
-                    'x': 10,
-                    'y': page_height * 0.6,
-                    'bbox': [10, page_height * 0.6, 60, page_height * 0.6 + 25],
-                    'height': 25
-                }
+                InstrumentLabel('System', 10, page_height * 0.3, 25),
+                InstrumentLabel('System', 10, page_height * 0.6, 25),
             ]
             labels.extend(default_labels)
         
         return labels
     
-    def _detect_measures(self, page, system):
-        """システム内の小節を検出"""
+    def _detect_page_measures(self, page):
+        """ページを1回ラスタ化し、検出した全システムの (システム領域, 小節) を返す"""
+        segmentation = self.segmenter.segment(page, self.page_images)
+        return [
+            (region, measures)
+            for region, measures in zip(segmentation.systems, self.barline_detector.detect(segmentation))
+            if measures
+        ]
+    
+    def _match_region(self, system, page_measures):
+        """楽器ラベルの縦範囲と最も重なる検出済みシステム -> (システム領域, 小節) または None"""
         if not system:
-            return []
-        
-        # システムの垂直範囲を取得
-        min_y = min(inst['y'] for inst in system)
-        max_y = max(inst['y'] + inst.get('height', 30) for inst in system)
-        
-        # ページを画像として取得
-        mat = fitz.Matrix(200/72.0, 200/72.0)  # 高解像度
-        pix = page.get_pixmap(matrix=mat)
-        img_data = pix.tobytes("png")
-        
-        img = Image.open(io.BytesIO(img_data))
-        img_array = np.array(img)
+            return None
         
-        # グレースケール変換
-        if len(img_array.shape) == 3:
-            gray = cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
-        else:
-            gray = img_array
+        min_y = min(inst.y for inst in system)
+        max_y = max(inst.y + inst.height for inst in system)
+        
+        best_match = None
+        best_overlap = 0
+        for region, measures in page_measures:
+            overlap = min(region.bottom, max_y) - max(region.top, min_y)
+            if overlap > best_overlap:
+                best_overlap = overlap
+                best_match = (region, measures)
+        return best_match
+    
+    def _detect_measures(self, page, system, page_measures):
+        """システム内の小節を検出（縦方向に最も重なる検出済みシステムの小節線を使う）"""
+        if not system:
+            return []
         
-        # システム領域のみを処理
-        y_start = int(min_y * 200/72)
-        y_end = int(max_y * 200/72)
-        system_img = gray[y_start:y_end, :]
+        match = self._match_region(system, page_measures)
+        best_measures = match[1] if match else None
         
-        # システム全体の幅を取得
-        width = system_img.shape[1]
+        if best_measures:
+            print(f"    小節数: {len(best_measures)} 小節（小節線検出）")
+            return best_measures
         
-        # 常にシステム全体を指定の小節数に分割
-        # 楽器ラベルの右端からページの右端までを使用
-        label_right_edge = 80  # 楽器ラベルの右端の推定位置（ピクセル）
-        page_right_edge = width - 20  # 右端に少し余白
+        # 小節線が見つからない場合は、楽器ラベルの右端からページの右端までを8等分
+        label_right_edge = 80 * 72/200  # 楽器ラベルの右端の推定位置
+        page_right_edge = page.rect.width - 20 * 72/200  # 右端に少し余白
         effective_width = page_right_edge - label_right_edge
         
-        # 実際の小節数を決定（通常、8小節がシステムに含まれる）
         actual_measures = 8  # デフォルトで8小節
         
-        measure_bounds = []
-        for i in range(actual_measures):
-            x_start = label_right_edge + (effective_width * i / actual_measures)
-            x_end = label_right_edge + (effective_width * (i + 1) / actual_measures)
-            
-            measure_bounds.append({
-                'x_start': x_start * 72/200,
-                'x_end': x_end * 72/200,
-                'width': (x_end - x_start) * 72/200,
-                'index': i + 1
-            })
+        measure_bounds = [
+            Measure(
+                i + 1,
+                label_right_edge + effective_width * i / actual_measures,
+                label_right_edge + effective_width * (i + 1) / actual_measures
+            )
+            for i in range(actual_measures)
+        ]
         
         # デバッグ情報
-        print(f"    小節数: {len(measure_bounds)} 小節")
+        print(f"    小節数: {len(measure_bounds)} 小節（等分割）")
         
         return measure_bounds
     
-    def _detect_vertical_lines(self, img, measures_per_line=8):
-        """縦線（小節線）を検出"""
-        # エッジ検出
-        edges = cv2.Canny(img, 30, 100)  # 闾値を調整
-        
-        # 縦線を検出
-        lines = cv2.HoughLinesP(edges, 1, np.pi/2, 
-                               threshold=40,  # 闾値を下げてより多く検出
-                               minLineLength=img.shape[0]*0.3,  # 最小長さを短く
-                               maxLineGap=10)  # ギャップを大きく
-        
-        vertical_lines = []
-        if lines is not None:
-            for line in lines:
-                x1, y1, x2, y2 = line[0]
-                # ほぼ垂直な線（許容度を少し大きく）
-                if abs(x2 - x1) < 8:
-                    vertical_lines.append(x1)
-        
-        # 近い線をマージ（同じ小節線が複数検出される場合への対処）
-        merged_lines = []
-        if vertical_lines:
-            vertical_lines = sorted(vertical_lines)
-            merged_lines = [vertical_lines[0]]
-            for x in vertical_lines[1:]:
-                if x - merged_lines[-1] > 20:  # 20ピクセル以上離れていれば別の線
-                    merged_lines.append(x)
-        
-        vertical_lines = merged_lines
-        
-        # 楽器ラベルの右側から始まるように調整
-        if vertical_lines and vertical_lines[0] < 80:
-            # 最初の線が左端に近すぎる場合、適切な位置を追加
-            vertical_lines = [80] + [x for x in vertical_lines if x > 80]
-        elif not vertical_lines:
-            # 線が見つからない場合はデフォルトを設定
-            vertical_lines = [80]
-        
-        # 最後の線を追加（右端近く）
-        if vertical_lines[-1] < img.shape[1] - 50:
-            vertical_lines.append(img.shape[1] - 20)
-        
-        # デバッグ情報
-        print(f"      検出された縦線: {len(vertical_lines)}本")
-        
-        return vertical_lines
-    
     def _group_into_systems(self, labels):
         """楽器をシステムにグループ化"""
         if not labels:
             return []
         
         # Y座標でソート
-        sorted_labels = sorted(labels, key=lambda x: x['y'])
+        sorted_labels = sorted(labels, key=lambda x: x.y)
         
         systems = []
         current_system = [sorted_labels[0]]
         
         for label in sorted_labels[1:]:
             # 大きなギャップがあれば新しいシステム
-            if label['y'] - current_system[-1]['y'] > 200:
+            if label.y - current_system[-1].y > 200:
                 systems.append(current_system)
                 current_system = [label]
             else:
@@ -508,8 +479,8 @@ class MeasureBasedExtractor:
         if not system:
             return None
         
-        min_y = min(inst['y'] for inst in system) - 10
-        max_y = max(inst['y'] + inst.get('height', 30) for inst in system) + 10
+        min_y = min(inst.y for inst in system) - 10
+        max_y = max(inst.y + inst.height for inst in system) + 10
         
         return {
             'top': min_y,
@@ -518,70 +489,19 @@ class MeasureBasedExtractor:
         }
     
     def _should_exclude(self, label):
-        """除外すべき楽器かチェック"""
-        label_clean = label.strip()
-        
-        # 完全一致チェック
-        if label_clean in self.exclude_exact:
-            return True
-        
-        # 部分一致チェック
-        for exclude in self.exclude_partial:
-            if exclude.lower() in label_clean.lower():
-                return True
-        
-        # 特殊ケース
-        if 'bass' in label_clean.lower():
-            return True
-        
-        if label_clean.startswith('Gt.'):
-            return True
-        
-        return False
+        """除外すべき楽器（ギター・ベース・ドラム）かチェック"""
+        return classify_label(label).excluded
     
     def _identify_part_type(self, label, selected_parts):
         """楽器ラベルからパートタイプを識別"""
-        label_clean = label.strip()
-        
-        # 誤検出を防ぐための除外パターン（コードパート以外）
-        if 'chord' not in selected_parts:
-            exclude_patterns = ['Chime', 'Choice', 'Chorus', 'Echo', 'Pitch', 'Choir', 'Channel', 'Check']
-            for pattern in exclude_patterns:
-                if pattern.lower() in label_clean.lower():
-                    return None
-        
-        for part_type in selected_parts:
-            if part_type not in self.target_instruments:
-                continue
-            
-            for keyword in self.target_instruments[part_type]:
-                # 完全一致を優先
-                if keyword == label_clean:
-                    return part_type
-                
-                # コードパートの場合、特別な処理
-                if part_type == 'chord':
-                    # 完全一致または先頭一致をチェック
-                    chord_exact_patterns = ['Ch', 'Ch.', 'CHO', 'CHO.', 'C.', 'Chord', 'Chords', 'コード']
-                    for pattern in chord_exact_patterns:
-                        if label_clean == pattern or label_clean.startswith(pattern + ' '):
-                            return part_type
-                        # ピリオドがないバージョンもチェック
-                        if pattern.endswith('.') and label_clean == pattern[:-1]:
-                            return part_type
-                    # 部分一致もチェック
-                    if keyword.lower() in label_clean.lower():
-                        return part_type
-                else:
-                    # その他のパートは通常の部分一致
-                    if keyword.lower() in label_clean.lower():
-                        return part_type
-        
+        part = classify_label(label).part
+        if part in self.label_parts and part in selected_parts:
+            return part
         return None
     
-    def _create_output_pdf(self, output_pdf, all_systems, src_pdf):
+    def _create_output_pdf(self, composer, all_systems):
         """出力PDFを作成 - 指定された小節単位で配置"""
-        current_page = output_pdf.new_page(width=self.page_width, height=self.page_height)
+        current_page = composer.new_page()
         current_y = self.margin
         
         # タイトル
@@ -597,9 +517,9 @@ class MeasureBasedExtractor:
         group_number = 1
         
         for system in all_systems:
-            page_num = system['page_num']
-            instruments = system['instruments']
-            measures = system['measures']
+            page_num = system.page_num
+            instruments = system.instruments
+            measures = system.measures
             
             # 8小節モードの場合、4小節ずつに分割して横に並べる
             if self.measures_per_line == 8:
@@ -610,7 +530,7 @@ class MeasureBasedExtractor:
                 for i in range(0, len(measure_groups), 2):
                     group_pair = measure_groups[i:i+2]
                     self._render_measure_groups_8mode(current_page, current_y, group_pair, instruments, 
-                                                     page_num, src_pdf, system)
+                                                     page_num, composer, system)
                     
                     # 高さを計算
                     part_height = self.part_height_8measures
@@ -619,10 +539,7 @@ class MeasureBasedExtractor:
                     
                     # 新しいページが必要か
                     if current_y + required_height > self.page_height - self.margin:
-                        current_page = output_pdf.new_page(
-                            width=self.page_width,
-                            height=self.page_height
-                        )
+                        current_page = composer.new_page()
                         current_y = self.margin
             else:
                 # 4小節モード
@@ -635,10 +552,7 @@ class MeasureBasedExtractor:
                     
                     # 新しいページが必要か
                     if current_y + required_height > self.page_height - self.margin:
-                        current_page = output_pdf.new_page(
-                            width=self.page_width,
-                            height=self.page_height
-                        )
+                        current_page = composer.new_page()
                         current_y = self.margin
                     
                     # グループヘッダーを表示
@@ -655,8 +569,8 @@ class MeasureBasedExtractor:
                     actual_measure_count = len(group)
                     if group:
                         # 実際の小節番号をグループから取得
-                        measure_start = group[0].get('index', group_idx * self.measures_per_line + 1)
-                        measure_end = group[-1].get('index', measure_start + actual_measure_count - 1)
+                        measure_start = group[0].index
+                        measure_end = group[-1].index
                     else:
                         measure_start = group_idx * self.measures_per_line + 1
                         measure_end = measure_start
@@ -673,8 +587,8 @@ class MeasureBasedExtractor:
                     for inst in instruments:
                         # 小節の範囲を計算
                         if group:
-                            x_start = group[0]['x_start']
-                            x_end = group[-1]['x_end']
+                            x_start = group[0].x_start
+                            x_end = group[-1].x_end
                             
                             # ソース領域（最初の小節を含むように調整）
                             # ソース領域の調整
@@ -685,9 +599,9 @@ class MeasureBasedExtractor:
                         # 音符が切れないように、少し余裕を持たせる
                         clip_rect = fitz.Rect(
                             adjusted_x_start - 5,  # 左に少し余裕
-                            inst['y'] - 10,  # 上に余裕
+                            inst.y - 10,  # 上に余裕
                             x_end + 10,  # 右に余裕（音符の尻切れ防止）
-                            inst['y'] + inst.get('height', 30) + 10  # 下に余裕
+                            inst.y + inst.height + 10  # 下に余裕
                         )
                         
                         # 出力サイズを計算（拡大縮小してフィット）
@@ -696,7 +610,7 @@ class MeasureBasedExtractor:
                         dest_height = 30  # 固定高さ
                         
                         # ソース領域の高さ
-                        source_height = inst.get('height', 30) + 20
+                        source_height = inst.height + 20
                         
                         # 小節数に応じた高さを設定
                         dest_height = self.part_height_4measures if self.measures_per_line == 4 else self.part_height_8measures
@@ -711,12 +625,21 @@ class MeasureBasedExtractor:
                         
                         # パートを配置
                         try:
-                            current_page.show_pdf_page(
-                                dest_rect, src_pdf, page_num, clip=clip_rect
-                            )
+                            # コードパートは背景を先に塗ってから楽譜を1回だけ配置する
+                            if inst.part == 'chord':
+                                # コードラインの背景を明るい黄色に
+                                chord_bg = fitz.Rect(
+                                    dest_rect.x0 - 2,
+                                    dest_rect.y0 - 2,
+                                    dest_rect.x1 + 2,
+                                    dest_rect.y1 + 2
+                                )
+                                current_page.draw_rect(chord_bg, color=(1, 1, 0.85), fill=(1, 1, 0.85))
+                            
+                            composer.place(current_page, dest_rect, page_num, clip=clip_rect)
                             
                             # ラベル
-                            label_text = inst.get('type', '').upper()[:3]
+                            label_text = (inst.part or '').upper()[:3]
                             current_page.insert_text(
                                 (self.margin - 5, current_y + 15),
                                 label_text,
@@ -725,28 +648,14 @@ class MeasureBasedExtractor:
                             )
                             
                             # ボーカルパートの歌詞を表示（オプションが有効の場合）
-                            if self.show_lyrics and inst.get('type') == 'vocal' and system.get('lyrics'):
+                            if self.show_lyrics and inst.part == 'vocal' and system.lyrics:
                                 # グループ内の歌詞のみを抽出
-                                group_lyrics = self._filter_lyrics_for_group(system['lyrics'], group)
+                                group_lyrics = self._filter_lyrics_for_group(system.lyrics, group)
                                 if group_lyrics:
                                     self._render_lyrics(current_page, group_lyrics, current_y, dest_rect, clip_rect)
                             
                             # コードパートの強調表示
-                            if inst.get('type') == 'chord':
-                                # コードラインの背景を明るい黄色に
-                                chord_bg = fitz.Rect(
-                                    dest_rect.x0 - 2,
-                                    dest_rect.y0 - 2,
-                                    dest_rect.x1 + 2,
-                                    dest_rect.y1 + 2
-                                )
-                                current_page.draw_rect(chord_bg, color=(1, 1, 0.85), fill=(1, 1, 0.85))
-                                
-                                # コンテンツを再描画
-                                current_page.show_pdf_page(
-                                    dest_rect, src_pdf, page_num, clip=clip_rect
-                                )
-                                
+                            if inst.part == 'chord':
                                 # コード記号を目立たせるための太いフレーム
                                 chord_frame = fitz.Rect(
                                     dest_rect.x0 - 1,
@@ -821,8 +730,8 @@ class MeasureBasedExtractor:
         if not lyrics or not group:
             return None
         
-        x_start = group[0]['x_start']
-        x_end = group[-1]['x_end']
+        x_start = group[0].x_start
+        x_end = group[-1].x_end
         
         filtered_lyrics = []
         for lyric in lyrics:
@@ -832,7 +741,7 @@ class MeasureBasedExtractor:
         
         return filtered_lyrics if filtered_lyrics else None
     
-    def _render_measure_groups_8mode(self, current_page, start_y, group_pair, instruments, page_num, src_pdf, system):
+    def _render_measure_groups_8mode(self, current_page, start_y, group_pair, instruments, page_num, composer, system):
         """「8小節モード」で4小節×2を横に並べて表示"""
         # 横幅を半分に
         half_width = (self.page_width - 2 * self.margin - 20) / 2
@@ -854,8 +763,8 @@ class MeasureBasedExtractor:
             first_group = group_pair[0]
             last_group = group_pair[-1] if len(group_pair) > 1 else first_group
             
-            measure_start = first_group[0].get('index', 1) if first_group else 1
-            measure_end = last_group[-1].get('index', 8) if last_group else 8
+            measure_start = first_group[0].index if first_group else 1
+            measure_end = last_group[-1].index if last_group else 8
             
             current_page.insert_text(
                 (self.margin, start_y),
@@ -869,7 +778,7 @@ class MeasureBasedExtractor:
         # 各パートを表示
         for inst in instruments:
             # ラベル
-            label_text = inst.get('type', '').upper()[:3]
+            label_text = (inst.part or '').upper()[:3]
             current_page.insert_text(
                 (self.margin - 5, current_y + 15),
                 label_text,
@@ -879,35 +788,35 @@ class MeasureBasedExtractor:
             
             # 左側の4小節
             if len(group_pair) > 0 and group_pair[0]:
-                self._render_single_group(current_page, group_pair[0], inst, page_num, src_pdf,
+                self._render_single_group(current_page, group_pair[0], inst, page_num, composer,
                                         self.margin + 30, current_y, half_width - 15, part_height)
             
             # 右側の4小節
             if len(group_pair) > 1 and group_pair[1]:
-                self._render_single_group(current_page, group_pair[1], inst, page_num, src_pdf,
+                self._render_single_group(current_page, group_pair[1], inst, page_num, composer,
                                         self.margin + 30 + half_width + 10, current_y, half_width - 15, part_height)
             
             current_y += part_height + 5
     
-    def _render_single_group(self, current_page, group, inst, page_num, src_pdf, dest_x, dest_y, dest_width, dest_height):
+    def _render_single_group(self, current_page, group, inst, page_num, composer, dest_x, dest_y, dest_width, dest_height):
         """単一の小節グループをレンダリング"""
         if not group:
             return
         
-        x_start = group[0]['x_start']
-        x_end = group[-1]['x_end']
+        x_start = group[0].x_start
+        x_end = group[-1].x_end
         
         # 最初のグループの場合、楽器ラベルを避ける
         adjusted_x_start = x_start
-        if group[0].get('index', 1) == 1 and x_start < 80:
+        if group[0].index == 1 and x_start < 80:
             adjusted_x_start = 60
         
         # クリップ領域
         clip_rect = fitz.Rect(
             adjusted_x_start - 5,
-            inst['y'] - 10,
+            inst.y - 10,
             x_end + 10,
-            inst['y'] + inst.get('height', 30) + 10
+            inst.y + inst.height + 10
         )
         
         # 出力領域
@@ -920,7 +829,7 @@ class MeasureBasedExtractor:
         
         try:
             # コードパートの強調表示
-            if inst.get('type') == 'chord':
+            if inst.part == 'chord':
                 # 背景を明るい黄色に
                 chord_bg = fitz.Rect(
                     dest_rect.x0 - 2,
@@ -930,12 +839,10 @@ class MeasureBasedExtractor:
                 )
                 current_page.draw_rect(chord_bg, color=(1, 1, 0.85), fill=(1, 1, 0.85))
             
-            current_page.show_pdf_page(
-                dest_rect, src_pdf, page_num, clip=clip_rect
-            )
+            composer.place(current_page, dest_rect, page_num, clip=clip_rect)
             
             # コードパートのフレーム
-            if inst.get('type') == 'chord':
+            if inst.part == 'chord':
                 chord_frame = fitz.Rect(
                     dest_rect.x0 - 1,
                     dest_rect.y0 - 1,
@@ -947,96 +854,36 @@ class MeasureBasedExtractor:
         except Exception as e:
             print(f"    配置エラー: {str(e)}")
     
+    def _page_token_index(self, page):
+        """ページのOCRトークン索引（ページごとに1回だけOCR）"""
+        index = self._page_tokens.get(page.number)
+        if index is None:
+            index = PageTokenIndex.from_page(page, dpi=self.ocr_dpi, images=self.page_images)
+            self._page_tokens[page.number] = index
+        return index
+    
     def _ocr_extract_labels(self, page):
-        """ページからOCRで楽器ラベルを抽出"""
+        """ページからOCRで楽器ラベルを抽出（左端15%のトークン）"""
         labels = []
         
         try:
-            # 高解像度でスキャン
-            mat = fitz.Matrix(300/72.0, 300/72.0)  # 300 DPI
-            pix = page.get_pixmap(matrix=mat)
-            img_data = pix.tobytes("png")
-            
-            img = Image.open(io.BytesIO(img_data))
-            img_array = np.array(img)
-            
-            # グレースケール変換
-            if len(img_array.shape) == 3:
-                gray = cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
-            else:
-                gray = img_array
-            
-            # コントラスト強化
-            gray = cv2.convertScaleAbs(gray, alpha=1.2, beta=10)
-            
-            # ノイズ除去
-            gray = cv2.medianBlur(gray, 3)
-            
-            # 左端領域のみ処理
-            height, width = gray.shape[:2]
-            left_region = gray[:, :int(width * 0.15)]
-            
-            # OCR設定の最適化
-            custom_config = r'--oem 3 --psm 11'
-            
-            # OCR実行
-            ocr_data = pytesseract.image_to_data(
-                left_region, 
-                output_type=pytesseract.Output.DICT,
-                config=custom_config,
-                lang='eng'  # 英語のみで精度向上
+            page_rect = page.rect
+            tokens = self._page_token_index(page).query(
+                x1=page_rect.x0 + page_rect.width * 0.15, min_confidence=20  # 信頼度闾値を下げる
             )
             
-            for i in range(len(ocr_data['text'])):
-                text = ocr_data['text'][i].strip()
-                if text and ocr_data['conf'][i] > 20:  # 信頼度闾値を下げる
-                    # OCR誤認識の修正
-                    corrected_text = text
-                    for wrong, correct in self.ocr_corrections.items():
-                        if wrong.lower() in text.lower():
-                            corrected_text = text.replace(wrong, correct)
-                            break
-                    # コードパートの特別チェック
-                    chord_patterns = ['Ch', 'Ch.', 'CHO', 'CHO.', 'Chord', 'Chords', 'C.', 'コード']
-                    is_chord = any(pattern == text or text.startswith(pattern + ' ') for pattern in chord_patterns)
-                    
-                    if is_chord:
-                        x = ocr_data['left'][i] * 72/200
-                        y = ocr_data['top'][i] * 72/200
-                        height = ocr_data['height'][i] * 72/200
-                        
-                        labels.append({
-                            'label': text,
-                            'x': x,
-                            'y': y,
-                            'bbox': [x, y, x + 50, y + height],
-                            'height': height
-                        })
-                        print(f"      OCR検出 (コード): '{text}' at y={y:.1f}")
-                        continue
-                    
-                    # その他の楽器
-                    instrument_keywords = ['Vo', 'Pf', 'Key', 'Ba', 'Dr', 'Gt', 'Piano', 'Keyboard', 'Organ', 'Synth', 'Voc', 'Lead']
-                    # 柔軟なマッチング（部分一致、大文字小文字を無視）
-                    if any(kw.lower() in corrected_text.lower() for kw in instrument_keywords):
-                        # Ba. や Bass は除外
-                        if 'ba' in corrected_text.lower() and 'key' not in corrected_text.lower():
-                            continue
-                            x = ocr_data['left'][i] * 72/200
-                            y = ocr_data['top'][i] * 72/200
-                            height = ocr_data['height'][i] * 72/200
-                            
-                            labels.append({
-                                'label': corrected_text,
-                                'x': x,
-                                'y': y,
-                                'bbox': [x, y, x + 50, y + height],
-                                'height': height
-                            })
-                            if corrected_text != text:
-                                print(f"      OCR検出: '{corrected_text}' at y={y:.1f} (元: '{text}')")
-                            else:
-                                print(f"      OCR検出: '{corrected_text}' at y={y:.1f}")
+            for token in tokens:
+                # OCR誤認識を直してから分類
+                label = classify_label(token.text)
+                # Ba. や Bass は除外
+                if label.part is None or label.part == 'bass':
+                    continue
+                
+                labels.append(InstrumentLabel(label.text, token.x, token.y, token.height))
+                if label.corrected:
+                    print(f"      OCR検出 ({label.part}): '{label.text}' at y={token.y:.1f} (元: '{token.text}')")
+                else:
+                    print(f"      OCR検出 ({label.part}): '{label.text}' at y={token.y:.1f}")
             
         except Exception as e:
             print(f"      OCRエラー: {str(e)}")
@@ -1052,8 +899,8 @@ class MeasureBasedExtractor:
             if not system:
                 return chord_lines
             
-            min_y = min(inst['y'] for inst in system)
-            max_y = max(inst['y'] + inst.get('height', 30) for inst in system)
+            min_y = min(inst.y for inst in system)
+            max_y = max(inst.y + inst.height for inst in system)
             
             # テキストを取得
             blocks = page.get_text("dict")
@@ -1100,13 +947,7 @@ class MeasureBasedExtractor:
                     min_x = min(c['x'] for c in chords)
                     max_x = max(c['x'] + c['bbox'][2] - c['bbox'][0] for c in chords)
                     
-                    chord_lines.append({
-                        'y': avg_y,
-                        'x': min_x,
-                        'bbox': [min_x, avg_y - 10, max_x, avg_y + 20],
-                        'height': 30,
-                        'chords': chords
-                    })
+                    chord_lines.append(InstrumentLabel('', min_x, avg_y, 30, width=max_x - min_x))
                     
                     chord_text = [c['text'] for c in chords[:5]]
                     if len(chords) > 5:
@@ -1179,68 +1020,38 @@ class MeasureBasedExtractor:
         
         try:
             # システムの範囲
-            min_y = min(inst['y'] for inst in system)
-            max_y = max(inst['y'] + inst.get('height', 30) for inst in system)
-            
-            # 高解像度でページをスキャン
-            mat = fitz.Matrix(300/72.0, 300/72.0)
-            pix = page.get_pixmap(matrix=mat)
-            img_data = pix.tobytes("png")
-            
-            img = Image.open(io.BytesIO(img_data))
-            img_array = np.array(img)
-            
-            # グレースケール変換
-            if len(img_array.shape) == 3:
-                gray = cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
-            else:
-                gray = img_array
-            
-            # システム領域を切り抜き
-            y_start = int(min_y * 300/72)
-            y_end = int(max_y * 300/72)
-            system_img = gray[y_start:y_end, :]
-            
-            # コードがありそうな領域（上部20%）をスキャン
-            chord_region = system_img[:int(system_img.shape[0] * 0.3), :]
-            
-            # コントラスト強化
-            chord_region = cv2.convertScaleAbs(chord_region, alpha=1.5, beta=20)
+            min_y = min(inst.y for inst in system)
+            max_y = max(inst.y + inst.height for inst in system)
             
-            # OCR実行
-            custom_config = r'--oem 3 --psm 8 -c tessedit_char_whitelist=ABCDEFGabcdefgm#b0123456789M7majindsugo-/() '
-            ocr_result = pytesseract.image_to_string(chord_region, config=custom_config, lang='eng')
+            # コードがありそうな領域（システム上部30%）のトークン
+            tokens = self._page_token_index(page).query(y0=min_y, y1=min_y + (max_y - min_y) * 0.3)
             
             # コード記号を抽出
-            if ocr_result:
-                words = ocr_result.split()
-                y_coord = min_y + 10  # 推定位置
-                chord_by_y[round(y_coord)] = []
+            for token in tokens:
+                word = token.text
+                # コード記号の修正（OCR誤認識対応）
+                corrected_word = word
+                # 一般的なOCR誤認識の修正
+                corrections = {
+                    '0': 'D',  # 0 -> D
+                    'l': '/',  # l -> /
+                    'I': '/',  # I -> /
+                    '6': 'G',  # 6 -> G
+                }
+                for wrong, correct in corrections.items():
+                    if wrong in word and len(word) <= 4:
+                        corrected_word = word.replace(wrong, correct)
                 
-                for i, word in enumerate(words):
-                    # コード記号の修正（OCR誤認識対応）
-                    corrected_word = word
-                    # 一般的なOCR誤認識の修正
-                    corrections = {
-                        '0': 'D',  # 0 -> D
-                        'l': '/',  # l -> /
-                        'I': '/',  # I -> /
-                        '6': 'G',  # 6 -> G
-                    }
-                    for wrong, correct in corrections.items():
-                        if wrong in word and len(word) <= 4:
-                            corrected_word = word.replace(wrong, correct)
-                    
-                    if self._is_chord_symbol(corrected_word):
-                        chord_by_y[round(y_coord)].append({
-                            'text': corrected_word,
-                            'x': 100 + i * 50,  # 推定位置
-                            'y': y_coord,
-                            'bbox': [100 + i * 50, y_coord, 100 + i * 50 + 40, y_coord + 20]
-                        })
-                        
-                if chord_by_y.get(round(y_coord)):
-                    print(f"      OMRコード検出: {[c['text'] for c in chord_by_y[round(y_coord)]]}")
+                if self._is_chord_symbol(corrected_word):
+                    chord_by_y.setdefault(round(token.y), []).append({
+                        'text': corrected_word,
+                        'x': token.x,
+                        'y': token.y,
+                        'bbox': list(token.rect)
+                    })
+            
+            if chord_by_y:
+                print(f"      OMRコード検出: {[c['text'] for chords in chord_by_y.values() for c in chords]}")
             
         except Exception as e:
             print(f"      OMRコード検出エラー: {str(e)}")
@@ -1256,52 +1067,24 @@ class MeasureBasedExtractor:
             if not system:
                 return chord_labels
             
-            min_y = min(inst['y'] for inst in system)
-            max_y = max(inst['y'] + inst.get('height', 30) for inst in system)
+            min_y = min(inst.y for inst in system)
+            max_y = max(inst.y + inst.height for inst in system)
             
-            # ページを画像として取得
-            mat = fitz.Matrix(200/72.0, 200/72.0)
-            pix = page.get_pixmap(matrix=mat)
-            img_data = pix.tobytes("png")
-            
-            img = Image.open(io.BytesIO(img_data))
-            img_array = np.array(img)
-            
-            # システム領域の左端部分のみをOCR
-            height, width = img_array.shape[:2]
-            y_start = int(min_y * 200/72)
-            y_end = int(max_y * 200/72)
-            left_region = img_array[y_start:y_end, :int(width * 0.2)]
-            
-            # OCR実行
-            ocr_data = pytesseract.image_to_data(
-                left_region, 
-                output_type=pytesseract.Output.DICT,
-                lang='eng',  # 英語のみでChやChordを検索
-                config='--psm 6'  # 均一なブロックを想定
+            # システム領域の左端部分のトークン
+            page_rect = page.rect
+            tokens = self._page_token_index(page).query(
+                x1=page_rect.x0 + page_rect.width * 0.2, y0=min_y, y1=max_y, min_confidence=40
             )
             
             # コード関連のキーワードを検索
             chord_keywords = ['Ch.', 'Ch', 'Chord', 'CHO', 'CHORD']
             
-            for i in range(len(ocr_data['text'])):
-                text = ocr_data['text'][i].strip()
-                if text and ocr_data['conf'][i] > 40:
-                    # コードキーワードの完全一致をチェック
-                    if text in chord_keywords:
-                        x = ocr_data['left'][i] * 72/200
-                        y = y_start * 72/200 + ocr_data['top'][i] * 72/200
-                        height = ocr_data['height'][i] * 72/200
-                        
-                        chord_labels.append({
-                            'label': text,
-                            'x': x,
-                            'y': y,
-                            'bbox': [x, y, x + 50, y + height],
-                            'height': height
-                        })
-                        print(f"      コードOCR検出: '{text}' at y={y:.1f}")
-                        break  # 1つ見つかったら終了
+            for token in tokens:
+                # コードキーワードの完全一致をチェック
+                if token.text in chord_keywords:
+                    chord_labels.append(InstrumentLabel(token.text, token.x, token.y, token.height))
+                    print(f"      コードOCR検出: '{token.text}' at y={token.y:.1f}")
+                    break  # 1つ見つかったら終了
             
         except Exception as e:
             print(f"      コードOCRエラー: {str(e)}")
@@ -1316,7 +1099,7 @@ class MeasureBasedExtractor:
             # ボーカルパートを特定
             vocal_part = None
             for inst in system:
-                if self._identify_part_type(inst['label'], ['vocal']) == 'vocal':
+                if self._identify_part_type(inst.text, ['vocal']) == 'vocal':
                     vocal_part = inst
                     break
             
@@ -1325,38 +1108,43 @@ class MeasureBasedExtractor:
             
             # ボーカルライン周辺のテキストを抽出
             blocks = page.get_text("dict")
+            words = [
+                (span.get("text", "").strip(), span.get("bbox"))
+                for block in blocks.get("blocks", []) if block.get("type") == 0
+                for line in block.get("lines", [])
+                for span in line.get("spans", [])
+            ]
+            
+            # テキスト層がないページはOCRトークン索引から取る
+            if not any(text for text, _ in words):
+                tokens = self._page_token_index(page).query(y0=vocal_part.y - 30, y1=vocal_part.y + 30)
+                words = [(token.text, token.rect) for token in tokens]
             
             # 歌詞の候補を収集
             lyric_candidates = []
             
-            for block in blocks.get("blocks", []):
-                if block.get("type") == 0:
-                    for line in block.get("lines", []):
-                        for span in line.get("spans", []):
-                            text = span.get("text", "").strip()
-                            bbox = span.get("bbox")
+            for text, bbox in words:
+                if bbox and text:
+                    # ボーカルラインの上下20ピクセル以内
+                    y_distance = abs(bbox[1] - vocal_part.y)
+                    if y_distance < 20:
+                        # X座標が楽器名より右
+                        if bbox[0] > 80:
+                            # 楽器名ではない
+                            is_instrument = any(kw in text for kw in ['Vo', 'Gt', 'Ba', 'Dr', 'Key', 'Pf', 'Kb'])
+                            # 数字だけではない
+                            is_number_only = text.isdigit()
+                            # 記号だけではない
+                            is_symbol_only = all(c in '.,!?-_()[]{}' for c in text)
                             
-                            if bbox and text:
-                                # ボーカルラインの上下20ピクセル以内
-                                y_distance = abs(bbox[1] - vocal_part['y'])
-                                if y_distance < 20:
-                                    # X座標が楽器名より右
-                                    if bbox[0] > 80:
-                                        # 楽器名ではない
-                                        is_instrument = any(kw in text for kw in ['Vo', 'Gt', 'Ba', 'Dr', 'Key', 'Pf', 'Kb'])
-                                        # 数字だけではない
-                                        is_number_only = text.isdigit()
-                                        # 記号だけではない
-                                        is_symbol_only = all(c in '.,!?-_()[]{}' for c in text)
-                                        
-                                        if not is_instrument and not is_number_only and not is_symbol_only:
-                                            lyric_candidates.append({
-                                                'text': text,
-                                                'x': bbox[0],
-                                                'y': bbox[1],
-                                                'width': bbox[2] - bbox[0],
-                                                'y_distance': y_distance
-                                            })
+                            if not is_instrument and not is_number_only and not is_symbol_only:
+                                lyric_candidates.append({
+                                    'text': text,
+                                    'x': bbox[0],
+                                    'y': bbox[1],
+                                    'width': bbox[2] - bbox[0],
+                                    'y_distance': y_distance
+                                })
             
             # Y距離が最も近いものを優先して選択
             lyric_candidates.sort(key=lambda x: x['y_distance'])
@@ -0,0 +1,208 @@
+"""
+OCR結果のキャッシュ
+楽器ラベルの列は同じ楽譜のシステム間や再アップロード間でほぼ同じ画像になるため、
+切り抜いた画像を二値化したハッシュとOCR設定をキーにして、Tesseractの結果を再利用する
+
+- 1段目：プロセス内のLRU
+- 2段目：ディスク（OCR_CACHE_DIR、プロセス・再起動をまたいで共有。OCR_CACHE_DISK_MB を超えたら最終利用が古い順に削除）
+
+二値化してからハッシュを取るため、圧縮やレンダリングによるわずかな濃淡の差はキーに影響しない
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+# 二値化の閾値（0〜255）
+BINARIZE_THRESHOLD = 128
+
+
+def crop_key(image, function: str, lang: str = '', config: str = '') -> str:
+    """二値化した画像とOCRの種類・設定からキャッシュキーを作る"""
+    # numpyはWebプロセスの起動時に読み込まないよう、OCRを実行するときにimportする
+    import numpy as np
+
+    if hasattr(image, 'convert'):
+        gray = np.asarray(image.convert('L'))
+    else:
+        gray = np.asarray(image)
+        if gray.ndim == 3:
+            gray = gray[..., :3].mean(axis=2)
+    binary = np.packbits(gray < BINARIZE_THRESHOLD, axis=None)
+
+    digest = hashlib.sha1()
+    digest.update(f"{function}|{lang}|{config}|{gray.shape[0]}x{gray.shape[1]}|".encode('utf-8'))
+    digest.update(binary.tobytes())
+    return digest.hexdigest()
+
+
+class OCRCache:
+    """プロセス内LRU＋ディスクの2段キャッシュ付きでpytesseractを呼ぶ"""
+
+    def __init__(self, max_entries: int = 1024, cache_dir: Optional[str] = None, max_disk_bytes: int = 0):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        # ディスクキャッシュの上限（0は無制限）と、このプロセスが把握している使用量（初回の書き込み時に数える）
+        self.max_disk_bytes = max_disk_bytes
+        self._disk_bytes: Optional[int] = None
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0}
+
+    def image_to_string(self, image, lang: str = 'eng', config: str = '') -> str:
+        import pytesseract
+        return self._cached(
+            'image_to_string', image, lang, config,
+            lambda: pytesseract.image_to_string(image, lang=lang, config=config)
+        )
+
+    def image_to_data(self, image, lang: str = 'eng', config: str = '') -> Dict:
+        """pytesseract.image_to_data（output_type=DICT）"""
+        import pytesseract
+        return self._cached(
+            'image_to_data', image, lang, config,
+            lambda: pytesseract.image_to_data(image, lang=lang, config=config, output_type=pytesseract.Output.DICT)
+        )
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['memory_hits'] + stats['disk_hits']) / lookups, 4) if lookups else None
+        stats['disk'] = bool(self.cache_dir)
+        return stats
+
+    def clear(self):
+        """プロセス内のキャッシュと統計を消す（ディスクは残す）"""
+        with self._lock:
+            self._entries.clear()
+            self._stats = dict.fromkeys(self._stats, 0)
+
+    def _cached(self, function, image, lang, config, run):
+        key = crop_key(image, function, lang, config)
+
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self._stats['memory_hits'] += 1
+                return self._entries[key]
+
+        value = self._read_disk(key)
+        if value is not None:
+            self._remember(key, value, 'disk_hits')
+            return value
+
+        value = run()
+        self._remember(key, value, 'misses')
+        self._write_disk(key, value)
+        return value
+
+    def _remember(self, key, value, stat):
+        with self._lock:
+            self._stats[stat] += 1
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _read_disk(self, key):
+        if not self.cache_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                value = json.load(f)['value']
+        except (OSError, ValueError, KeyError):
+            return None
+        # 最終利用時刻を更新（上限を超えたときの削除順）
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return value
+
+    def _write_disk(self, key, value):
+        if not self.cache_dir:
+            return
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # 他のプロセスが途中のファイルを読まないよう置き換えで保存
+            temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({'value': value}, f, ensure_ascii=False, default=str)
+            os.replace(temp_path, path)
+            size = os.path.getsize(path)
+        except OSError:
+            return
+        if self.max_disk_bytes:
+            self._track_disk(size)
+
+    def _disk_files(self):
+        """ディスクキャッシュのファイル -> [(最終利用時刻, サイズ, パス)]"""
+        files = []
+        for root, _, names in os.walk(self.cache_dir):
+            for name in names:
+                if not name.endswith('.json'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+        return files
+
+    def _track_disk(self, added: int):
+        """書き込んだ分を足し、上限を超えたら古い順に上限の8割まで削除"""
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(size for _, size, _ in self._disk_files())
+            else:
+                self._disk_bytes += added
+            if self._disk_bytes <= self.max_disk_bytes:
+                return
+
+            # 他のプロセスも書き込むため、削除の前に実際の使用量を数え直す
+            files = sorted(self._disk_files())
+            total = sum(size for _, size, _ in files)
+            target = self.max_disk_bytes * 0.8
+            for _, size, path in files:
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+            self._disk_bytes = total
+
+
+_shared_cache = OCRCache(
+    cache_dir=os.environ.get('OCR_CACHE_DIR') or None,
+    max_disk_bytes=int(os.environ.get('OCR_CACHE_DISK_MB', 256)) * 1024 * 1024
+)
+
+
+def configure_ocr_cache(config) -> OCRCache:
+    """アプリ設定（OCR_CACHE_DIR / OCR_CACHE_SIZE / OCR_CACHE_DISK_MB）で共有キャッシュを作り直す"""
+    global _shared_cache
+    cache_dir = config.get('OCR_CACHE_DIR') or None
+    max_entries = int(config.get('OCR_CACHE_SIZE', 1024))
+    max_disk_bytes = int(config.get('OCR_CACHE_DISK_MB', 256)) * 1024 * 1024
+    if (cache_dir, max_entries, max_disk_bytes) != (
+            _shared_cache.cache_dir, _shared_cache.max_entries, _shared_cache.max_disk_bytes):
+        _shared_cache = OCRCache(max_entries=max_entries, cache_dir=cache_dir, max_disk_bytes=max_disk_bytes)
+    return _shared_cache
+
+
+def get_ocr_cache() -> OCRCache:
+    """抽出器が共有するOCRキャッシュ"""
+    return _shared_cache
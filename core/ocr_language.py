@@ -0,0 +1,89 @@
+"""
+OCR言語の自動選択
+楽器ラベルの多くはラテン文字の略記（Vo. / Key. / Gt.）で、eng+jpn はeng単体の約2倍の時間がかかる
+まず文字を制限したengで認識し、信頼度が低いかラベルが見つからないときだけjpnを加えて認識し直す
+
+言語は文書ごとに1回決めて以降のページで使い回す
+テキスト層の左端に日本語のラベルがある文書や、カタログの /Lang が日本語の文書は最初から eng+jpn にする
+"""
+
+import re
+from typing import Callable, Dict, Hashable, List, Optional
+
+import fitz
+
+from core.ocr_mosaic import MosaicLine, OCRMosaic
+
+ENG = 'eng'
+ENG_JPN = 'eng+jpn'
+
+# ラテン文字の楽器ラベルに使う文字（engパスでは他の文字を候補にしない）
+LATIN_LABEL_CHARS = 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789.&/-()'
+
+# ひらがな・カタカナ・漢字・半角カナ
+JAPANESE_CHARS = re.compile(r'[\u3040-\u30ff\u3400-\u9fff\uff66-\uff9f]')
+
+
+def ocr_config(lang: str) -> str:
+    """言語ごとのTesseract設定（engは文字を制限）"""
+    if lang == ENG:
+        return f'-c tessedit_char_whitelist={LATIN_LABEL_CHARS}'
+    return ''
+
+
+def document_language_hint(pdf: fitz.Document, pages: int = 3) -> Optional[str]:
+    """テキスト層・メタデータから日本語ラベルの文書と分かれば eng+jpn（分からなければ None）"""
+    try:
+        kind, value = pdf.xref_get_key(pdf.pdf_catalog(), 'Lang')
+        if kind == 'string' and value.lower().startswith('ja'):
+            return ENG_JPN
+    except Exception:
+        pass
+
+    for page in pdf.pages(0, min(pages, len(pdf))):
+        label_edge = page.rect.x0 + page.rect.width / 4
+        for word in page.get_text('words'):
+            if word[0] < label_edge and JAPANESE_CHARS.search(word[4]):
+                return ENG_JPN
+    return None
+
+
+class OCRLanguageSelector:
+    """文書ごとのOCR言語の決定（eng → 必要なときだけ eng+jpn）"""
+
+    def __init__(self, min_confidence: float = 60.0):
+        # engの結果を採用するラベル行の平均信頼度
+        self.min_confidence = min_confidence
+        self.lang: Optional[str] = None
+        self.escalations = 0
+
+    def reset(self, pdf: Optional[fitz.Document] = None):
+        """新しい文書の処理開始時に呼ぶ（pdf を渡すとテキスト層・メタデータから初期値を決める）"""
+        self.lang = document_language_hint(pdf) if pdf is not None else None
+        self.escalations = 0
+
+    def recognize_lines(self, mosaic: OCRMosaic,
+                        is_label: Callable[[str], bool]) -> Dict[Hashable, List[MosaicLine]]:
+        """決定済みの言語で認識（未決定ならengで試し、必要なら eng+jpn に切り替えて言語を決める）"""
+        if self.lang is not None:
+            return mosaic.recognize_lines(lang=self.lang, config=ocr_config(self.lang))
+
+        lines = mosaic.recognize_lines(lang=ENG, config=ocr_config(ENG))
+        labels = self._label_lines(lines, is_label)
+        if labels and sum(line.confidence for line in labels) / len(labels) >= self.min_confidence:
+            self.lang = ENG
+            return lines
+
+        self.escalations += 1
+        jpn_lines = mosaic.recognize_lines(lang=ENG_JPN, config=ocr_config(ENG_JPN))
+        if len(self._label_lines(jpn_lines, is_label)) > len(labels):
+            self.lang = ENG_JPN
+            return jpn_lines
+        if labels:
+            self.lang = ENG
+        # どちらでもラベルが見つからないページ（表紙など）では決めずに次のページで試す
+        return lines
+
+    @staticmethod
+    def _label_lines(lines: Dict[Hashable, List[MosaicLine]], is_label: Callable[[str], bool]) -> List[MosaicLine]:
+        return [line for tile_lines in lines.values() for line in tile_lines if is_label(line.text)]
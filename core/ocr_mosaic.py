@@ -0,0 +1,151 @@
+"""
+OCRモザイク
+ページ内の各システムの楽器ラベル列（左端の切り抜き）を白い区切り帯をはさんで縦に並べた
+1枚の画像にまとめ、Tesseractの呼び出しをページあたり1回にする
+
+Tesseractは呼び出しごとの起動・モデル読み込みの固定費が大きく、小さな切り抜きを
+システムごとに認識するとその固定費がシステム数だけかかる
+認識した単語はモザイク上のy位置から元の切り抜きに振り分け、PDF座標に戻して返す
+"""
+
+from typing import Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+from core.ocr_cache import get_ocr_cache
+from core.score_model import slotted_dataclass
+
+
+@slotted_dataclass(eq=False)
+class MosaicTile:
+    """モザイクに並べた切り抜き（origin は切り抜き左上のPDF座標、scale は px/pt）"""
+    key: Hashable
+    image: np.ndarray
+    origin: Tuple[float, float]
+    scale: float
+    offset: int = 0
+
+    @property
+    def height(self) -> int:
+        return self.image.shape[0]
+
+    @property
+    def width(self) -> int:
+        return self.image.shape[1]
+
+
+@slotted_dataclass
+class MosaicWord:
+    """認識した単語（rect はPDF座標）"""
+    text: str
+    confidence: float
+    rect: Tuple[float, float, float, float]
+    line: Tuple[int, int, int]
+
+
+@slotted_dataclass
+class MosaicLine:
+    """同じ行の単語をまとめたもの（rect はPDF座標）"""
+    text: str
+    confidence: float
+    rect: Tuple[float, float, float, float]
+
+
+class OCRMosaic:
+    """複数の切り抜きを1回のimage_to_dataで認識する"""
+
+    def __init__(self, separator: int = 32, padding: int = 8, background: int = 255):
+        # 切り抜きの間の白帯（px）。Tesseractが隣の切り抜きと同じ行にまとめない高さにする
+        self.separator = separator
+        self.padding = padding
+        self.background = background
+        self.tiles: List[MosaicTile] = []
+
+    def add(self, key: Hashable, image, origin: Tuple[float, float] = (0.0, 0.0), scale: float = 1.0):
+        """グレースケールの切り抜きを追加（空の切り抜きは無視）"""
+        gray = self._to_gray(image)
+        if gray.size == 0:
+            return
+        self.tiles.append(MosaicTile(key, gray, origin, scale))
+
+    def compose(self) -> Optional[np.ndarray]:
+        """切り抜きを縦に並べた画像（各切り抜きの offset を設定）"""
+        if not self.tiles:
+            return None
+        width = max(tile.width for tile in self.tiles) + 2 * self.padding
+        height = sum(tile.height for tile in self.tiles) + self.separator * (len(self.tiles) - 1) + 2 * self.padding
+        mosaic = np.full((height, width), self.background, dtype=np.uint8)
+
+        y = self.padding
+        for tile in self.tiles:
+            tile.offset = y
+            mosaic[y:y + tile.height, self.padding:self.padding + tile.width] = tile.image
+            y += tile.height + self.separator
+        return mosaic
+
+    def recognize(self, lang: str = 'eng', config: str = '') -> Dict[Hashable, List[MosaicWord]]:
+        """モザイクを1回OCRして切り抜きごとの単語を返す"""
+        words = {tile.key: [] for tile in self.tiles}
+        mosaic = self.compose()
+        if mosaic is None:
+            return words
+
+        data = get_ocr_cache().image_to_data(mosaic, lang=lang, config=config)
+        for i, raw_text in enumerate(data['text']):
+            text = str(raw_text).strip()
+            if not text:
+                continue
+            left, top = data['left'][i] - self.padding, data['top'][i]
+            width, height = data['width'][i], data['height'][i]
+            tile = self._tile_at(top + height / 2)
+            if tile is None:
+                continue
+
+            x0 = tile.origin[0] + left / tile.scale
+            y0 = tile.origin[1] + (top - tile.offset) / tile.scale
+            line = (data['block_num'][i], data['par_num'][i], data['line_num'][i])
+            words[tile.key].append(MosaicWord(
+                text, float(data['conf'][i]), (x0, y0, x0 + width / tile.scale, y0 + height / tile.scale), line
+            ))
+        return words
+
+    def recognize_lines(self, lang: str = 'eng', config: str = '') -> Dict[Hashable, List[MosaicLine]]:
+        """切り抜きごとに単語を行にまとめて上から順に返す"""
+        return {key: group_lines(words) for key, words in self.recognize(lang, config).items()}
+
+    def _tile_at(self, y: float) -> Optional[MosaicTile]:
+        """モザイク上のyを含む切り抜き（区切り帯の上なら None）"""
+        for tile in self.tiles:
+            if tile.offset <= y < tile.offset + tile.height:
+                return tile
+        return None
+
+    @staticmethod
+    def _to_gray(image) -> np.ndarray:
+        if hasattr(image, 'convert'):
+            return np.asarray(image.convert('L'), dtype=np.uint8)
+        gray = np.asarray(image)
+        if gray.ndim == 3:
+            gray = gray[..., :3].mean(axis=2)
+        return gray.astype(np.uint8, copy=False)
+
+
+def group_lines(words: List[MosaicWord]) -> List[MosaicLine]:
+    """Tesseractの (block, par, line) ごとに単語をつなげて行にする"""
+    grouped: Dict[Tuple[int, int, int], List[MosaicWord]] = {}
+    for word in words:
+        grouped.setdefault(word.line, []).append(word)
+
+    lines = []
+    for line_words in grouped.values():
+        line_words.sort(key=lambda w: w.rect[0])
+        rect = (
+            min(w.rect[0] for w in line_words),
+            min(w.rect[1] for w in line_words),
+            max(w.rect[2] for w in line_words),
+            max(w.rect[3] for w in line_words),
+        )
+        confidence = sum(w.confidence for w in line_words) / len(line_words)
+        lines.append(MosaicLine(' '.join(w.text for w in line_words), confidence, rect))
+    lines.sort(key=lambda line: line.rect[1])
+    return lines
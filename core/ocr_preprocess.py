@@ -0,0 +1,142 @@
+"""
+OCR入力の前処理
+ラベル列などの切り抜きをTesseractに渡す前に、NumPy/OpenCVでまとめて整える
+
+1. 適応的二値化（アンチエイリアスやスキャンのムラを白黒に）
+2. 五線の除去（横に長く続く黒画素の並びを消す。ラベル列に五線の左端がかかるため）
+3. インクの外接矩形への切り詰め
+4. 文字の高さをTesseractが得意な大きさ（既定30px）にそろえる拡大・縮小
+
+出力は白背景・黒文字の uint8（0/255）で、`packed()` でビット詰めの配列にもできる
+切り詰めと拡大・縮小の量を `offset`・`scale` に残すので、認識した座標は元の画像へ戻せる
+"""
+
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+from core.score_model import slotted_dataclass
+
+
+@slotted_dataclass(eq=False)
+class PreprocessedImage:
+    """前処理した画像（元画像の座標 = offset + 画像の座標 / scale）"""
+    image: np.ndarray
+    offset: Tuple[int, int] = (0, 0)
+    scale: float = 1.0
+
+    @property
+    def empty(self) -> bool:
+        return self.image.size == 0
+
+    def to_source(self, x: float, y: float) -> Tuple[float, float]:
+        """前処理後の座標 -> 元画像の座標"""
+        return (self.offset[0] + x / self.scale, self.offset[1] + y / self.scale)
+
+    def packed(self) -> np.ndarray:
+        """黒画素を1としたビット詰めの配列（行ごと）"""
+        return np.packbits(self.image < 128, axis=1)
+
+
+def to_gray(image) -> np.ndarray:
+    """PIL画像・RGB(A)・グレースケールの配列を uint8 のグレースケールに"""
+    if hasattr(image, 'convert'):
+        return np.asarray(image.convert('L'), dtype=np.uint8)
+    array = np.asarray(image)
+    if array.ndim == 3:
+        return cv2.cvtColor(np.ascontiguousarray(array[..., :3], dtype=np.uint8), cv2.COLOR_RGB2GRAY)
+    return array.astype(np.uint8, copy=False)
+
+
+def binarize(gray: np.ndarray, block_size: int = 31, offset: int = 15) -> np.ndarray:
+    """適応的二値化（白背景255・黒文字0）"""
+    if gray.size == 0:
+        return gray
+    block_size = max(3, min(block_size, (min(gray.shape) // 2) * 2 + 1))
+    return cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY, block_size, offset)
+
+
+def remove_staff_lines(binary: np.ndarray, min_length_ratio: float = 0.3, line_gap: int = 5) -> np.ndarray:
+    """画像幅の min_length_ratio 以上続く横線（五線・小節の区切り線）を消す（line_gap は線の太さの上限+1 px）"""
+    if binary.size == 0:
+        return binary
+    ink = (binary < 128).astype(np.uint8)
+    length = max(2, int(binary.shape[1] * min_length_ratio))
+
+    # 黒画素数が length 以上の行だけ、連続する黒画素の区間（ランレングス）を調べる
+    lines = np.zeros_like(ink)
+    for row in np.flatnonzero(ink.sum(axis=1) >= length):
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], ink[row], [0]))))
+        for start, end in zip(edges[::2], edges[1::2]):
+            if end - start >= length:
+                lines[row, start:end] = 1
+    if not lines.any():
+        return binary
+
+    cleaned = binary.copy()
+    cleaned[lines > 0] = 255
+    # 線と重なっていた文字の縦画は、線の上下の文字の画素を縦に閉じてつなぎ直す
+    text = ink.copy()
+    text[lines > 0] = 0
+    bridged = cv2.morphologyEx(text, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (1, line_gap)))
+    cleaned[(lines > 0) & (bridged > 0)] = 0
+    return cleaned
+
+
+def ink_bounds(binary: np.ndarray, margin: int = 4) -> Optional[Tuple[int, int, int, int]]:
+    """黒画素の外接矩形（x0, y0, x1, y1、margin 付き）。黒画素がなければ None"""
+    ink = binary < 128
+    rows = np.flatnonzero(ink.any(axis=1))
+    if rows.size == 0:
+        return None
+    cols = np.flatnonzero(ink.any(axis=0))
+    height, width = binary.shape
+    return (max(0, cols[0] - margin), max(0, rows[0] - margin),
+            min(width, cols[-1] + 1 + margin), min(height, rows[-1] + 1 + margin))
+
+
+def text_height(binary: np.ndarray, min_area: int = 6) -> Optional[float]:
+    """連結成分の高さの中央値（文字の高さの推定）"""
+    count, _, stats, _ = cv2.connectedComponentsWithStats((binary < 128).astype(np.uint8), connectivity=8)
+    heights = [
+        stats[i, cv2.CC_STAT_HEIGHT] for i in range(1, count)
+        if stats[i, cv2.CC_STAT_AREA] >= min_area and stats[i, cv2.CC_STAT_HEIGHT] >= 3
+    ]
+    return float(np.median(heights)) if heights else None
+
+
+def normalize_height(binary: np.ndarray, target: float = 30.0,
+                     min_scale: float = 0.25, max_scale: float = 4.0) -> Tuple[np.ndarray, float]:
+    """文字の高さが target px になるよう拡大・縮小して再二値化 -> (画像, 倍率)"""
+    height = text_height(binary)
+    if not height:
+        return binary, 1.0
+    scale = float(np.clip(target / height, min_scale, max_scale))
+    if abs(scale - 1.0) < 0.1:
+        return binary, 1.0
+    size = (max(1, int(round(binary.shape[1] * scale))), max(1, int(round(binary.shape[0] * scale))))
+    resized = cv2.resize(binary, size, interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_CUBIC)
+    return np.where(resized < 128, 0, 255).astype(np.uint8), scale
+
+
+def preprocess_for_ocr(image, remove_lines: bool = True, trim: bool = True,
+                       target_height: Optional[float] = 30.0) -> PreprocessedImage:
+    """二値化 → 五線除去 → インクへの切り詰め → 文字の高さの正規化"""
+    binary = binarize(to_gray(image))
+    if remove_lines:
+        binary = remove_staff_lines(binary)
+
+    offset = (0, 0)
+    if trim:
+        bounds = ink_bounds(binary)
+        if bounds is None:
+            return PreprocessedImage(binary[:0, :0], offset, 1.0)
+        x0, y0, x1, y1 = bounds
+        binary = binary[y0:y1, x0:x1]
+        offset = (int(x0), int(y0))
+
+    scale = 1.0
+    if target_height:
+        binary, scale = normalize_height(binary, target_height)
+    return PreprocessedImage(np.ascontiguousarray(binary), offset, scale)
@@ -0,0 +1,83 @@
+"""
+抽出結果PDFの組版
+元PDFのページを切り抜いて出力ページへ配置する処理をまとめる
+
+- 元ページは出力PDFにForm XObjectとして1回だけ取り込まれ、各切り抜きはそれを参照して配置される
+  （PyMuPDFは同じ元Documentの同じページを出力Documentごとに再利用するため、
+  常に同じ元Documentから配置する）
+- 同じ出力ページ・同じ位置・同じ切り抜きの配置は1回にまとめる
+- 保存時は重複オブジェクトの統合（garbage=4）とストリーム圧縮（deflate）を行う
+"""
+
+from typing import Dict, Tuple
+
+import fitz
+
+# 出力PDFの保存オプション（重複オブジェクトの統合と圧縮）
+SAVE_OPTIONS = {'garbage': 4, 'deflate': True}
+
+
+def _rect_key(rect) -> Tuple[float, float, float, float]:
+    rect = fitz.Rect(rect)
+    return (round(rect.x0, 2), round(rect.y0, 2), round(rect.x1, 2), round(rect.y1, 2))
+
+
+class OutputComposer:
+    """元PDFの切り抜きを出力PDFへ配置する"""
+
+    def __init__(self, src_pdf: fitz.Document, page_width: float = 595, page_height: float = 842):
+        self.src_pdf = src_pdf
+        self.page_width = page_width
+        self.page_height = page_height
+        self.output = fitz.open()
+        self._placed = set()
+        self.stats: Dict[str, int] = {'placements': 0, 'duplicates': 0}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def page_count(self) -> int:
+        return len(self.output)
+
+    @property
+    def source_pages(self) -> int:
+        """出力に取り込まれた元ページの数"""
+        return len({key[1] for key in self._placed})
+
+    def new_page(self) -> fitz.Page:
+        return self.output.new_page(width=self.page_width, height=self.page_height)
+
+    def place(self, target_page: fitz.Page, dest_rect, page_num: int, clip=None,
+              keep_proportion: bool = True) -> bool:
+        """元PDFの page_num ページ（clip範囲）を target_page の dest_rect に配置
+
+        同じ配置が既にあれば何もしない（Falseを返す）
+        """
+        key = (
+            target_page.number,
+            page_num,
+            _rect_key(dest_rect),
+            _rect_key(clip) if clip is not None else None,
+            keep_proportion,
+        )
+        if key in self._placed:
+            self.stats['duplicates'] += 1
+            return False
+
+        target_page.show_pdf_page(dest_rect, self.src_pdf, page_num, clip=clip, keep_proportion=keep_proportion)
+        self._placed.add(key)
+        self.stats['placements'] += 1
+        return True
+
+    def save(self, output_path: str) -> str:
+        self.output.save(output_path, **SAVE_OPTIONS)
+        return output_path
+
+    def close(self):
+        """出力PDFを閉じる（元PDFは呼び出し側が閉じる）"""
+        if not self.output.is_closed:
+            self.output.close()
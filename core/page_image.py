@@ -0,0 +1,166 @@
+"""
+ページのグレースケール画像
+スキャン譜面（image_based のPDF）のページは、たいていページ全体を覆う1枚の埋め込み画像
+（JPEG・JBIG2・CCITTなど）でできている。これを検出器ごとに get_pixmap で任意の倍率に
+描き直すと、同じページを何度も復号・リサンプリングすることになる
+
+ここでは、ページ全体を覆う画像が1枚だけのページは埋め込み画像を元の解像度のまま1回だけ
+グレースケールに復号し、画像の画素とページ座標の対応（scale px/pt）と一緒に返す。
+それ以外のページ（ベクターの譜面・文字を重ねたページ・回転・傾いた配置など）は従来どおり get_pixmap で描く
+
+画像は常にページ全体（左上がページの原点）に合わせるので、ページ座標 = 画素座標 / scale になる
+"""
+
+import threading
+import weakref
+from typing import Dict, Optional, Tuple
+
+import fitz
+import numpy as np
+
+from core.score_model import slotted_dataclass
+
+
+@slotted_dataclass(eq=False)
+class PageImage:
+    """ページ全体のグレースケール画像（xref は埋め込み画像を直接使ったときの画像、描き直したときは0）"""
+    gray: np.ndarray
+    scale: float
+    xref: int = 0
+
+    @property
+    def embedded(self) -> bool:
+        return self.xref > 0
+
+    @property
+    def dpi(self) -> float:
+        return self.scale * 72.0
+
+    @property
+    def transform(self) -> fitz.Matrix:
+        """画素座標 -> ページ座標"""
+        return fitz.Matrix(1.0 / self.scale, 1.0 / self.scale)
+
+    def to_page(self, x: float, y: float) -> Tuple[float, float]:
+        return (x / self.scale, y / self.scale)
+
+    def crop(self, rect) -> Tuple[np.ndarray, Tuple[int, int]]:
+        """ページ座標の矩形の画素 -> (切り出した画像, 左上の画素座標)"""
+        x0, y0, x1, y1 = fitz.Rect(rect)
+        height, width = self.gray.shape
+        left, top = max(0, int(x0 * self.scale)), max(0, int(y0 * self.scale))
+        right, bottom = min(width, int(round(x1 * self.scale))), min(height, int(round(y1 * self.scale)))
+        return self.gray[top:bottom, left:right], (left, top)
+
+
+def _gray_samples(pix: fitz.Pixmap) -> np.ndarray:
+    return np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.stride)[:, :pix.width]
+
+
+def render_page_image(page: fitz.Page, zoom: float) -> PageImage:
+    """ページを zoom 倍でグレースケールに描く"""
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csGRAY, alpha=False)
+    return PageImage(_gray_samples(pix), zoom)
+
+
+def _has_visible_text(page: fitz.Page) -> bool:
+    """描画される文字があるか（OCR済みスキャンの透明なテキスト層＝描画モード3は数えない）"""
+    return any(span['type'] != 3 and span['opacity'] > 0 for span in page.get_texttrace())
+
+
+def _weak_document(page: fitz.Page):
+    """ページの文書への弱参照（PyMuPDF の page.parent は既に weakref.proxy）"""
+    parent = page.parent
+    return parent if isinstance(parent, weakref.ProxyType) else weakref.proxy(parent)
+
+
+def embedded_page_image(page: fitz.Page, min_coverage: float = 0.9,
+                        max_aspect_error: float = 0.02) -> Optional[PageImage]:
+    """ページ全体を覆う埋め込み画像を元の解像度で復号（使えないページは None）"""
+    if page.rotation or page.parent is None or not page.parent.is_pdf:
+        return None
+    infos = page.get_image_info(xrefs=True)
+    # 画像が1枚だけで、線や塗りの描画・見える文字がないページに限る（他の要素を描き落とさないため）
+    if len(infos) != 1 or not infos[0].get('xref') or page.get_cdrawings() or _has_visible_text(page):
+        return None
+
+    info = infos[0]
+    a, b, c, d, _, _ = info['transform']
+    # 回転・傾き・反転のない配置だけ（画素の並びがそのままページの向きになる）
+    if abs(b) > 1e-3 or abs(c) > 1e-3 or a <= 0 or d <= 0:
+        return None
+    bbox = fitz.Rect(info['bbox'])
+    page_rect = page.rect
+    if (bbox & page_rect).get_area() < page_rect.get_area() * min_coverage:
+        return None
+
+    try:
+        pix = fitz.Pixmap(page.parent, info['xref'])
+        if pix.alpha:
+            pix = fitz.Pixmap(pix, 0)
+        if pix.n != 1:
+            pix = fitz.Pixmap(fitz.csGRAY, pix)
+    except RuntimeError:
+        return None
+
+    scale_x, scale_y = pix.width / bbox.width, pix.height / bbox.height
+    # 縦横の解像度が違う画像はリサンプリングが要るため描き直しに任せる
+    if abs(scale_x - scale_y) > scale_x * max_aspect_error:
+        return None
+    scale = (scale_x + scale_y) / 2
+    gray = _gray_samples(pix)
+
+    # 画像がページからずれている・余白がある場合は、白いページ大の画像に貼る（画素はそのまま）
+    width, height = int(round(page_rect.width * scale)), int(round(page_rect.height * scale))
+    left, top = int(round((bbox.x0 - page_rect.x0) * scale)), int(round((bbox.y0 - page_rect.y0) * scale))
+    if (left, top) != (0, 0) or gray.shape != (height, width):
+        canvas = np.full((height, width), 255, dtype=np.uint8)
+        src_x, src_y = max(0, -left), max(0, -top)
+        dst_x, dst_y = max(0, left), max(0, top)
+        w = min(gray.shape[1] - src_x, width - dst_x)
+        h = min(gray.shape[0] - src_y, height - dst_y)
+        canvas[dst_y:dst_y + h, dst_x:dst_x + w] = gray[src_y:src_y + h, src_x:src_x + w]
+        gray = canvas
+    return PageImage(gray, scale, info['xref'])
+
+
+class PageImageSource:
+    """
+    1文書の抽出中に使うページ画像の取得元（同じページの画像を使い回し、埋め込み画像の復号はページごとに1回）
+    抽出器が持ち、文書の処理の終わりに clear() する。文書は弱参照（weakref.proxy）で持つため
+    閉じた文書を生かし続けず、直前のページの画像だけを残す
+    """
+
+    def __init__(self, use_embedded: bool = True):
+        self.use_embedded = use_embedded
+        self._document = None
+        self._page_number: Optional[int] = None
+        self._images: Dict = {}
+        self._lock = threading.Lock()
+
+    def get(self, page: fitz.Page, zoom: float, min_scale: Optional[float] = None) -> PageImage:
+        """埋め込み画像（min_scale px/pt 以上のもの）があればそれを、なければ zoom 倍で描いた画像"""
+        with self._lock:
+            document = _weak_document(page)
+            if self._document is not document or self._page_number != page.number:
+                self._document = document
+                self._page_number = page.number
+                self._images = {}
+
+            if self.use_embedded:
+                if 'embedded' not in self._images:
+                    self._images['embedded'] = embedded_page_image(page)
+                image = self._images['embedded']
+                if image is not None and (min_scale is None or image.scale >= min_scale):
+                    return image
+
+            image = self._images.get(zoom)
+            if image is None:
+                image = self._images[zoom] = render_page_image(page, zoom)
+            return image
+
+    def clear(self):
+        with self._lock:
+            self._document = None
+            self._page_number = None
+            self._images = {}
@@ -0,0 +1,109 @@
+"""
+ページ単位のOCRトークン索引
+ページを1つのDPIで1回だけラスタ化・OCRし、単語（テキスト・PDF座標のbbox・信頼度）を
+y順の索引にする。楽器ラベル・コード記号・歌詞の判定は同じ索引を範囲で問い合わせて使うため、
+1システムでラベル用・コード用に別々のDPIでページを描き直してOCRし直す必要がない
+
+スキャン譜面で埋め込み画像の解像度が十分（既定200 DPI以上）なら、描き直さずにその画像をOCRする
+"""
+
+from bisect import bisect_left, bisect_right
+from typing import List, Optional, Tuple
+
+import fitz
+
+from core.ocr_cache import get_ocr_cache
+from core.ocr_preprocess import preprocess_for_ocr
+from core.page_image import PageImageSource
+from core.score_model import slotted_dataclass
+
+# 埋め込み画像をそのままOCRに使う最低解像度（これ未満のスキャンは dpi で描き直す）
+MIN_EMBEDDED_DPI = 200
+
+
+@slotted_dataclass
+class OCRToken:
+    """OCRで認識した単語（rect はPDF座標）"""
+    text: str
+    rect: Tuple[float, float, float, float]
+    confidence: float
+
+    @property
+    def x(self) -> float:
+        return self.rect[0]
+
+    @property
+    def y(self) -> float:
+        return self.rect[1]
+
+    @property
+    def width(self) -> float:
+        return self.rect[2] - self.rect[0]
+
+    @property
+    def height(self) -> float:
+        return self.rect[3] - self.rect[1]
+
+    @property
+    def center(self) -> Tuple[float, float]:
+        return ((self.rect[0] + self.rect[2]) / 2, (self.rect[1] + self.rect[3]) / 2)
+
+
+class PageTokenIndex:
+    """ページ内のOCRトークンを中心のy順に並べ、矩形で問い合わせる"""
+
+    def __init__(self, tokens: List[OCRToken]):
+        self.tokens = sorted(tokens, key=lambda token: token.center[1])
+        self._centers = [token.center[1] for token in self.tokens]
+
+    def __len__(self) -> int:
+        return len(self.tokens)
+
+    def query(self, x0: float = float('-inf'), y0: float = float('-inf'),
+              x1: float = float('inf'), y1: float = float('inf'),
+              min_confidence: float = -1) -> List[OCRToken]:
+        """中心が矩形（PDF座標）に入るトークン（上から順）"""
+        start = bisect_left(self._centers, y0)
+        end = bisect_right(self._centers, y1)
+        return [
+            token for token in self.tokens[start:end]
+            if x0 <= token.center[0] <= x1 and token.confidence > min_confidence
+        ]
+
+    @classmethod
+    def from_ocr_data(cls, data, scale: float, origin: Tuple[float, float] = (0.0, 0.0)) -> 'PageTokenIndex':
+        """image_to_data（DICT）の結果から作る（scale は px/pt）"""
+        tokens = []
+        for i, raw_text in enumerate(data['text']):
+            text = str(raw_text).strip()
+            if not text:
+                continue
+            x0 = origin[0] + data['left'][i] / scale
+            y0 = origin[1] + data['top'][i] / scale
+            tokens.append(OCRToken(
+                text,
+                (x0, y0, x0 + data['width'][i] / scale, y0 + data['height'][i] / scale),
+                float(data['conf'][i])
+            ))
+        return cls(tokens)
+
+    @classmethod
+    def from_page(cls, page: fitz.Page, dpi: int = 300, lang: str = 'eng',
+                  config: str = r'--oem 3 --psm 11', clip: Optional[fitz.Rect] = None,
+                  images: Optional[PageImageSource] = None) -> 'PageTokenIndex':
+        """ページ（または clip の範囲）の画像を1回だけOCR（images は抽出器が文書ごとに持つ画像の取得元）"""
+        images = images if images is not None else PageImageSource()
+        page_image = images.get(page, dpi / 72.0, min_scale=MIN_EMBEDDED_DPI / 72.0)
+        area = fitz.Rect(clip) if clip is not None else page.rect
+        gray, (left, top) = page_image.crop(area)
+
+        # 二値化・五線除去・インクへの切り詰め（ラベル・コード・歌詞で文字の大きさが違うため拡大・縮小はしない）
+        image = preprocess_for_ocr(gray, target_height=None)
+        if image.empty:
+            return cls([])
+
+        # 疎なテキスト（psm 11）として認識し、ページ上のどこにある単語も拾う
+        data = get_ocr_cache().image_to_data(image.image, lang=lang, config=config)
+        x0, y0 = image.to_source(0, 0)
+        x0, y0 = page_image.to_page(left + x0, top + y0)
+        return cls.from_ocr_data(data, page_image.scale * image.scale, (x0, y0))
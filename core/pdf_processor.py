@@ -1,14 +1,13 @@
 import fitz  # PyMuPDF
 import os
-from PIL import Image
-import io
-import numpy as np
+
+from core.output_composer import SAVE_OPTIONS
 
 class PDFProcessor:
     """PDF処理のコアクラス"""
     
-    def __init__(self):
-        self.temp_dir = 'temp'
+    def __init__(self, temp_dir='temp'):
+        self.temp_dir = temp_dir
         os.makedirs(self.temp_dir, exist_ok=True)
     
     def get_page_count(self, pdf_path):
@@ -61,14 +60,10 @@ class PDFProcessor:
             mat = fitz.Matrix(dpi/72.0, dpi/72.0)
             pix = page.get_pixmap(matrix=mat)
             
-            # PIL Imageに変換
-            img_data = pix.tobytes("png")
-            img = Image.open(io.BytesIO(img_data))
-            
-            # プレビュー画像を保存
+            # プレビュー画像を保存（PILを経由せずPyMuPDFで直接PNG出力）
             preview_prefix = file_id or "preview"
             preview_path = os.path.join(self.temp_dir, f"{preview_prefix}_preview_p{page_num}.png")
-            img.save(preview_path, "PNG")
+            pix.save(preview_path)
             
             pdf_document.close()
             return preview_path
@@ -89,18 +84,24 @@ class PDFProcessor:
         except Exception as e:
             raise Exception(f"ページサイズの取得に失敗しました: {str(e)}")
     
-    def merge_pdfs(self, pdf_paths, output_path):
-        """複数のPDFを結合"""
+    def merge_pdfs(self, pdf_paths, output_path, titles=None):
+        """複数のPDFを結合（titles を指定すると各PDFの先頭ページにしおりを付ける）"""
         try:
             output_pdf = fitz.open()
+            toc = []
             
-            for pdf_path in pdf_paths:
+            for index, pdf_path in enumerate(pdf_paths):
                 input_pdf = fitz.open(pdf_path)
+                if titles:
+                    toc.append([1, titles[index], len(output_pdf) + 1])
                 output_pdf.insert_pdf(input_pdf)
                 input_pdf.close()
             
-            output_pdf.save(output_path)
+            if toc:
+                output_pdf.set_toc(toc)
+            output_pdf.save(output_path, **SAVE_OPTIONS)
             output_pdf.close()
+            return output_path
             
         except Exception as e:
             raise Exception(f"PDF結合に失敗しました: {str(e)}")
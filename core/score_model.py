@@ -0,0 +1,171 @@
+"""
+楽譜解析のデータモデル
+五線・楽器ラベル・小節・システムを __slots__ 付きのdataclassで表す
+（dictよりメモリが小さく、to_tuple/from_tuple でプロセス間転送やキャッシュ用に軽量に直列化できる）
+"""
+
+from dataclasses import dataclass, field, fields
+from typing import Dict, List, Optional, Tuple
+
+
+def slotted_dataclass(cls=None, **kwargs):
+    """__slots__ 付きdataclass（Python 3.10 の dataclass(slots=True) 相当を3.8でも使えるように）"""
+    def wrap(cls):
+        cls = dataclass(cls, **kwargs)
+        field_names = tuple(f.name for f in fields(cls))
+
+        cls_dict = dict(cls.__dict__)
+        cls_dict['__slots__'] = field_names
+        for name in field_names:
+            # 既定値はdataclassの__init__が保持しているためクラス属性は不要
+            cls_dict.pop(name, None)
+        cls_dict.pop('__dict__', None)
+        cls_dict.pop('__weakref__', None)
+
+        slotted = type(cls)(cls.__name__, cls.__bases__, cls_dict)
+        slotted.__qualname__ = cls.__qualname__
+        return slotted
+
+    return wrap if cls is None else wrap(cls)
+
+
+@slotted_dataclass
+class StaffGroup:
+    """五線（PDF座標）"""
+    lines: Tuple[float, ...]
+    y_start: float
+    y_end: float
+    position: int = 0  # システム内で上から何番目か
+
+    @classmethod
+    def from_lines(cls, lines, position: int = 0, padding: float = 10) -> 'StaffGroup':
+        lines = tuple(lines)
+        return cls(lines, lines[0] - padding, lines[-1] + padding, position)
+
+    @property
+    def y_center(self) -> float:
+        return (self.lines[0] + self.lines[-1]) / 2
+
+    @property
+    def line_count(self) -> int:
+        return len(self.lines)
+
+    def to_tuple(self) -> tuple:
+        return (self.lines, self.y_start, self.y_end, self.position)
+
+    @classmethod
+    def from_tuple(cls, data) -> 'StaffGroup':
+        lines, y_start, y_end, position = data
+        return cls(tuple(lines), y_start, y_end, position)
+
+
+@slotted_dataclass
+class InstrumentLabel:
+    """楽器ラベル（yは上端、PDF座標）"""
+    text: str
+    x: float
+    y: float
+    height: float = 30
+    part: Optional[str] = None
+    confidence: float = 1.0
+    width: float = 50
+
+    @property
+    def y_center(self) -> float:
+        return self.y + self.height / 2
+
+    @property
+    def bbox(self) -> Tuple[float, float, float, float]:
+        return (self.x, self.y, self.x + self.width, self.y + self.height)
+
+    def to_tuple(self) -> tuple:
+        return (self.text, self.x, self.y, self.height, self.part, self.confidence, self.width)
+
+    @classmethod
+    def from_tuple(cls, data) -> 'InstrumentLabel':
+        return cls(*data)
+
+
+@slotted_dataclass
+class PartAssignment:
+    """パートと五線・ラベルの対応"""
+    part: str
+    staff: StaffGroup
+    label: InstrumentLabel
+    confidence: float
+
+    @property
+    def position(self) -> int:
+        return self.staff.position
+
+    def to_tuple(self) -> tuple:
+        return (self.part, self.staff.to_tuple(), self.label.to_tuple(), self.confidence)
+
+    @classmethod
+    def from_tuple(cls, data) -> 'PartAssignment':
+        part, staff, label, confidence = data
+        return cls(part, StaffGroup.from_tuple(staff), InstrumentLabel.from_tuple(label), confidence)
+
+
+@slotted_dataclass
+class Measure:
+    """小節の横範囲（PDF座標）"""
+    index: int
+    x_start: float
+    x_end: float
+
+    @property
+    def width(self) -> float:
+        return self.x_end - self.x_start
+
+    def to_tuple(self) -> tuple:
+        return (self.index, self.x_start, self.x_end)
+
+    @classmethod
+    def from_tuple(cls, data) -> 'Measure':
+        return cls(*data)
+
+
+@slotted_dataclass
+class System:
+    """1システム分の解析結果"""
+    page_num: int
+    index: int
+    rect: Optional[Tuple[float, float, float, float]] = None
+    instruments: List[InstrumentLabel] = field(default_factory=list)
+    assignments: Dict[str, PartAssignment] = field(default_factory=dict)
+    measures: List[Measure] = field(default_factory=list)
+    lyrics: Optional[List[Dict]] = None
+    chords: Optional[List[Dict]] = None
+
+    def assignment(self, part: str) -> Optional[PartAssignment]:
+        return self.assignments.get(part)
+
+    def has_part(self, part: str) -> bool:
+        return part in self.assignments or any(inst.part == part for inst in self.instruments)
+
+    def to_tuple(self) -> tuple:
+        return (
+            self.page_num,
+            self.index,
+            tuple(self.rect) if self.rect else None,
+            tuple(inst.to_tuple() for inst in self.instruments),
+            tuple((part, a.to_tuple()) for part, a in self.assignments.items()),
+            tuple(m.to_tuple() for m in self.measures),
+            self.lyrics,
+            self.chords,
+        )
+
+    @classmethod
+    def from_tuple(cls, data) -> 'System':
+        page_num, index, rect, instruments, assignments, measures, lyrics, chords = data
+        return cls(
+            page_num,
+            index,
+            tuple(rect) if rect else None,
+            [InstrumentLabel.from_tuple(inst) for inst in instruments],
+            {part: PartAssignment.from_tuple(a) for part, a in assignments},
+            [Measure.from_tuple(m) for m in measures],
+            lyrics,
+            chords,
+        )
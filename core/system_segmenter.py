@@ -0,0 +1,200 @@
+"""
+システム（段）分割
+ページを1回だけグレースケールでラスタ化し、行方向の投影プロファイルから五線を、
+五線どうしを左端でつなぐ縦線（システム線・ブラケット・ブレース）からシステムの境界を求める
+
+スキャンの傾きに対応するため、投影プロファイルは縦の短冊ごとに取り、
+隣り合う短冊のずれを相互相関で推定してから足し合わせる
+
+スキャン譜面でページ全体が1枚の埋め込み画像なら、描き直さずにその画像を元の解像度のまま使う
+
+縦線が1本も見つからないページ（ブラケットなしの譜面や線がかすれたスキャン）では、
+五線間の間隔が他より大きい箇所でシステムを区切る
+"""
+
+from dataclasses import field
+from typing import List, Optional, Tuple
+
+import fitz
+import numpy as np
+
+from core.page_image import PageImageSource
+from core.score_model import StaffGroup, slotted_dataclass
+
+
+@slotted_dataclass
+class SystemRegion:
+    """検出したシステム（PDF座標）"""
+    index: int
+    rect: Tuple[float, float, float, float]
+    staves: List[StaffGroup] = field(default_factory=list)
+    # 五線が縦線でつながっていたか（Falseは間隔による推定）
+    bracketed: bool = False
+
+    @property
+    def top(self) -> float:
+        return self.rect[1]
+
+    @property
+    def bottom(self) -> float:
+        return self.rect[3]
+
+
+@slotted_dataclass(eq=False)
+class PageSegmentation:
+    """ページのラスタとシステム分割の結果（後段のOCRは同じラスタを切り出して使う）"""
+    image: np.ndarray
+    scale: float
+    systems: List[SystemRegion] = field(default_factory=list)
+
+    def crop(self, region: SystemRegion, x0: float = 0.0, x1: Optional[float] = None) -> np.ndarray:
+        """システム領域（PDF座標の横範囲 x0〜x1）のラスタを切り出す"""
+        right = self.image.shape[1] if x1 is None else int(x1 * self.scale)
+        return self.image[int(region.top * self.scale):int(region.bottom * self.scale), int(x0 * self.scale):right]
+
+
+class SystemSegmenter:
+    """投影プロファイルとブラケットによるシステム分割"""
+
+    def __init__(self, zoom: float = 2.0, dark_threshold: int = 128, line_fill: float = 0.4,
+                 max_line_spacing: float = 15.0, bracket_reach: float = 12.0, bracket_fill: float = 0.9,
+                 strips: int = 8, max_strip_shift: int = 3):
+        self.zoom = zoom
+        self.dark_threshold = dark_threshold
+        # 傾き補正用の短冊数と、隣り合う短冊間で許容するずれ（px）
+        self.strips = strips
+        self.max_strip_shift = max_strip_shift
+        # 五線の線とみなす行の黒画素率
+        self.line_fill = line_fill
+        # 同じ五線に属する線の最大間隔（pt）
+        self.max_line_spacing = max_line_spacing
+        # 五線の左端からブラケットを探す範囲（pt）
+        self.bracket_reach = bracket_reach
+        # 五線間の行のうち縦線が通っている割合がこれ以上ならつながっているとみなす
+        self.bracket_fill = bracket_fill
+
+    def segment(self, page: fitz.Page, images: Optional[PageImageSource] = None) -> PageSegmentation:
+        """ページの画像（埋め込み画像、なければ zoom 倍で描いた画像）をシステムに分割
+
+        images: 抽出器が文書ごとに持つ取得元（OCRなど同じページの他の処理と画像を共有する）
+        """
+        image = (images if images is not None else PageImageSource()).get(page, self.zoom)
+        return self.segment_image(image.gray, image.scale)
+
+    def segment_image(self, gray: np.ndarray, scale: float) -> PageSegmentation:
+        """グレースケール画像（scale px/pt）をシステムに分割"""
+        dark = gray < self.dark_threshold
+        profile, drift = self._row_profile(dark)
+        staves = self._find_staves(profile, scale, drift)
+        if not staves:
+            return PageSegmentation(gray, scale, [])
+
+        connected = [self._is_connected(dark, scale, upper, lower) for upper, lower in zip(staves, staves[1:])]
+        bracketed = any(connected)
+        if not bracketed:
+            connected = self._connect_by_gap(staves)
+
+        groups = [[staves[0]]]
+        for link, (staff, extent) in zip(connected, staves[1:]):
+            if not link:
+                groups.append([])
+            groups[-1].append((staff, extent))
+
+        page_height = gray.shape[0] / scale
+        page_width = gray.shape[1] / scale
+        systems = []
+        for index, group in enumerate(groups):
+            first, last = group[0][0], group[-1][0]
+            margin = first.y_end - first.y_start
+            if index > 0:
+                top = (groups[index - 1][-1][0].y_end + first.y_start) / 2
+            else:
+                top = max(0.0, first.y_start - margin)
+            if index + 1 < len(groups):
+                bottom = (last.y_end + groups[index + 1][0][0].y_start) / 2
+            else:
+                bottom = min(page_height, last.y_end + margin)
+
+            system_staves = [
+                StaffGroup(staff.lines, staff.y_start, staff.y_end, position)
+                for position, (staff, _) in enumerate(group)
+            ]
+            systems.append(SystemRegion(index, (0.0, top, page_width, bottom), system_staves, bracketed))
+
+        return PageSegmentation(gray, scale, systems)
+
+    def _row_profile(self, dark: np.ndarray) -> Tuple[np.ndarray, int]:
+        """傾きを補正した行ごとの黒画素率と、ページ内の最大の縦ずれ（px）"""
+        height, width = dark.shape
+        strips = max(1, min(self.strips, width))
+        strip_width = width // strips
+        profiles = dark[:, :strip_width * strips].reshape(height, strips, strip_width).mean(axis=2)
+
+        # 隣の短冊とのずれを相互相関で求め、中央の短冊を基準に累積する
+        lags = range(-self.max_strip_shift, self.max_strip_shift + 1)
+        steps = [0]
+        for k in range(1, strips):
+            previous, current = profiles[:, k - 1], profiles[:, k]
+            steps.append(max(lags, key=lambda lag: float(np.dot(previous, np.roll(current, -lag)))))
+        offsets = np.cumsum(steps)
+        offsets -= offsets[strips // 2]
+
+        aligned = np.stack([np.roll(profiles[:, k], -int(offsets[k])) for k in range(strips)], axis=1)
+        return aligned.mean(axis=1), int(np.abs(offsets).max())
+
+    def _find_staves(self, row_fill: np.ndarray, scale: float, drift: int) -> List[Tuple[StaffGroup, Tuple[int, int]]]:
+        """行の黒画素率から五線を検出 -> [(五線, 傾きの分を広げた画素行の範囲)]"""
+        is_line = np.concatenate(([False], row_fill >= self.line_fill, [False]))
+        edges = np.flatnonzero(np.diff(is_line.astype(np.int8)))
+        starts, ends = edges[0::2], edges[1::2]
+        if len(starts) == 0:
+            return []
+
+        centers = (starts + ends - 1) / 2
+        max_gap = self.max_line_spacing * scale
+
+        staves = []
+        group = [0]
+        for k in range(1, len(centers) + 1):
+            if k < len(centers) and centers[k] - centers[group[-1]] <= max_gap:
+                group.append(k)
+                continue
+            if len(group) >= 3:
+                lines = tuple(float(centers[g]) / scale for g in group)
+                band = (max(0, int(starts[group[0]]) - drift), int(ends[group[-1]]) + drift)
+                staves.append((StaffGroup.from_lines(lines), band))
+            group = [k]
+        return staves
+
+    def _is_connected(self, dark: np.ndarray, scale: float, upper, lower) -> bool:
+        """2つの五線の間を、左端付近の縦線がほぼ切れ目なく通っているか"""
+        (staff, (upper_start, upper_end)), (_, (lower_start, _)) = upper, lower
+        if lower_start <= upper_end:
+            return True
+
+        # 五線の左端：ほぼすべての線が横切っている列が最も長く続く区間の始点
+        # （楽器ラベルの文字は列が途切れるため除外される。ノイズでの途切れは数pt分ならす）
+        crossed = dark[upper_start:upper_end].sum(axis=0) >= staff.line_count - 1
+        window = max(1, int(scale * 3))
+        crossed = np.convolve(crossed, np.ones(window), mode='same') >= window / 2
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], crossed.astype(np.int8), [0]))))
+        if len(edges) == 0:
+            return False
+        starts, ends = edges[0::2], edges[1::2]
+        left = int(starts[np.argmax(ends - starts)])
+
+        x0 = max(0, left - int(self.bracket_reach * scale))
+        x1 = left + max(2, int(scale * 1.5))
+        gap = dark[upper_end:lower_start, x0:x1]
+        return bool(gap.any(axis=1).mean() >= self.bracket_fill)
+
+    def _connect_by_gap(self, staves) -> List[bool]:
+        """縦線がない場合：五線間の間隔が中央値より十分大きい箇所を区切りとする"""
+        gaps = [lower.y_start - upper.y_end for (upper, _), (lower, _) in zip(staves, staves[1:])]
+        if not gaps:
+            return []
+        median_gap = sorted(gaps)[len(gaps) // 2]
+        return [
+            not (gap > median_gap * 1.4 and gap > upper.y_end - upper.y_start)
+            for gap, (upper, _) in zip(gaps, staves)
+        ]
@@ -5,6 +5,12 @@ Quick startup test for Band Part Key App
 
 import sys
 import os
+import subprocess
+import time
+
+# Webプロセスの起動時に読み込まれてはならない重い依存（抽出時に遅延import）
+HEAVY_MODULES = ['cv2', 'pytesseract', 'numpy', 'PIL', 'jsonschema']
+STARTUP_BUDGET_SECONDS = float(os.environ.get('STARTUP_BUDGET_SECONDS', 2.0))
 
 def test_imports():
     """Test critical imports"""
@@ -56,6 +62,49 @@ def test_directories():
     
     return all_good
 
+def test_startup_time():
+    """app モジュールのimport時間と重い依存の遅延読み込みを確認"""
+    print("\nMeasuring app startup...")
+
+    probe = (
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        "import app\n"
+        "elapsed = time.perf_counter() - start\n"
+        f"heavy = [m for m in {HEAVY_MODULES!r} if m in sys.modules]\n"
+        "print(json.dumps({'elapsed': elapsed, 'heavy': heavy}))\n"
+    )
+
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-c', probe],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    total = time.perf_counter() - start
+
+    if result.returncode != 0:
+        print(f"✗ import app failed:\n{result.stderr}")
+        return False
+
+    import json
+    stats = json.loads(result.stdout.strip().splitlines()[-1])
+    print(f"  import app: {stats['elapsed']:.3f}s (process total {total:.3f}s)")
+
+    all_good = True
+    if stats['heavy']:
+        print(f"✗ Heavy modules loaded at startup: {', '.join(stats['heavy'])}")
+        all_good = False
+    else:
+        print("✓ No heavy modules loaded at startup")
+
+    if stats['elapsed'] > STARTUP_BUDGET_SECONDS:
+        print(f"✗ Startup exceeds budget ({STARTUP_BUDGET_SECONDS:.1f}s)")
+        all_good = False
+    else:
+        print(f"✓ Startup within budget ({STARTUP_BUDGET_SECONDS:.1f}s)")
+
+    return all_good
+
 def main():
     """Run startup tests"""
     print("=" * 50)
@@ -69,6 +118,10 @@ def main():
     
     test_directories()
     
+    if not test_startup_time():
+        print("\n❌ Startup time test failed!")
+        sys.exit(1)
+    
     print("\n✅ All tests passed!")
     print("\nTo start the app:")
     print("  python app.py")
@@ -0,0 +1,170 @@
+import io
+import os
+import tempfile
+import unittest
+import zipfile
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from unittest import mock
+
+import fitz
+
+from app import create_app
+from benchmarks.synthetic_scores import SyntheticScoreSpec, generate_score
+from config import Config
+
+
+class CrashingPool:
+    """2つ目に投入した楽譜のワーカーだけが異常終了するプール（結果は submit 時に作る）"""
+
+    def __init__(self, *args, **kwargs):
+        self.submitted = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def submit(self, fn, job):
+        self.submitted += 1
+        future = Future()
+        if self.submitted == 2:
+            future.set_exception(BrokenProcessPool("worker died"))
+        else:
+            future.set_result(fn(job))
+        return future
+
+
+class AppFactoryTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+        class TestConfig(Config):
+            TESTING = True
+            UPLOAD_FOLDER = f"{self.temp_dir.name}/uploads"
+            TEMP_FOLDER = f"{self.temp_dir.name}/temp"
+
+            @staticmethod
+            def init_app(app):
+                pass
+
+        self.app = create_app(TestConfig)
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_preview_does_not_load_extractors(self):
+        pdf = fitz.open()
+        pdf.new_page(width=200, height=200)
+        data = pdf.tobytes()
+        pdf.close()
+
+        response = self.client.post(
+            "/api/upload",
+            data={"file": (io.BytesIO(data), "score.pdf")},
+            content_type="multipart/form-data",
+        )
+        self.assertEqual(response.status_code, 200)
+        file_id = response.get_json()["id"]
+
+        response = self.client.get(f"/api/preview/{file_id}/0")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "image/png")
+        response.close()
+
+        self.assertEqual(self.app.extensions["band_part_key"].extractors.loaded(), [])
+
+    def test_extract_writes_output_once_and_serves_ranges(self):
+        pdf_path = os.path.join(self.temp_dir.name, "score.pdf")
+        generate_score(pdf_path, SyntheticScoreSpec(pages=1, systems_per_page=2))
+        with open(pdf_path, "rb") as f:
+            response = self.client.post(
+                "/api/upload",
+                data={"file": (f, "score.pdf")},
+                content_type="multipart/form-data",
+            )
+        file_id = response.get_json()["id"]
+
+        response = self.client.post("/api/extract", json={"file_id": file_id, "engine": "adaptive"})
+        self.assertEqual(response.status_code, 200)
+        output_id = response.get_json()["output_id"]
+
+        # 出力は一時フォルダに1つだけ作られ、アップロード側には残らない
+        self.assertEqual(os.listdir(f"{self.temp_dir.name}/temp"), [f"{output_id}.pdf"])
+        self.assertEqual(os.listdir(f"{self.temp_dir.name}/uploads/{file_id}"), ["score.pdf"])
+
+        # 同じ条件の2回目は抽出せず、索引に記録した結果を返す
+        response = self.client.post("/api/extract", json={"file_id": file_id, "engine": "adaptive"})
+        self.assertTrue(response.get_json()["cached"])
+        self.assertEqual(response.get_json()["output_id"], output_id)
+
+        response = self.client.get(f"/api/download/{output_id}", headers={"Range": "bytes=0-7"})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(len(response.data), 8)
+        self.assertTrue(response.data.startswith(b"%PDF-"))
+        self.assertEqual(response.headers["Accept-Ranges"], "bytes")
+        response.close()
+
+    def post_setlist(self, **data):
+        files = []
+        for index in range(3):
+            pdf_path = os.path.join(self.temp_dir.name, f"song{index}.pdf")
+            generate_score(pdf_path, SyntheticScoreSpec(pages=1, systems_per_page=2, seed=index))
+            files.append((open(pdf_path, "rb"), f"song{index}.pdf"))
+        try:
+            return self.client.post("/api/setlist", data={"files": files, "engine": "adaptive", **data},
+                                    content_type="multipart/form-data")
+        finally:
+            for f, _ in files:
+                f.close()
+
+    def test_setlist_merges_scores_in_order(self):
+        response = self.post_setlist()
+        self.assertEqual(response.status_code, 200)
+        body = response.get_json()
+        self.assertEqual(body["status"], "completed")
+        self.assertEqual([score["title"] for score in body["scores"]], ["song0", "song1", "song2"])
+
+        response = self.client.get(f"/api/download/{body['output_id']}")
+        self.assertEqual(response.mimetype, "application/pdf")
+        with fitz.open(stream=response.data, filetype="pdf") as merged:
+            self.assertEqual([entry[1] for entry in merged.get_toc()], ["song0", "song1", "song2"])
+        response.close()
+
+        # 抽出済みの楽譜と存在しないIDを混ぜると、成功した分だけまとめて部分成功を返す
+        file_ids = [score["file_id"] for score in body["scores"]]
+        response = self.client.post("/api/setlist", json={"file_ids": [file_ids[0], "missing"], "engine": "adaptive"})
+        body = response.get_json()
+        self.assertEqual(body["status"], "partial")
+        self.assertTrue(body["scores"][0]["cached"])
+        self.assertEqual(body["scores"][1]["status"], "failed")
+
+    def test_setlist_zip_bundle(self):
+        body = self.post_setlist(format="zip").get_json()
+
+        response = self.client.get(f"/api/download/{body['output_id']}")
+        self.assertEqual(response.mimetype, "application/zip")
+        with zipfile.ZipFile(io.BytesIO(response.data)) as bundle:
+            self.assertEqual(bundle.namelist(), ["01_song0.pdf", "02_song1.pdf", "03_song2.pdf"])
+        response.close()
+
+    def test_setlist_rejects_invalid_measures_per_line(self):
+        for value in ("abc", "-2", "0"):
+            response = self.client.post("/api/setlist", json={"file_ids": ["x"], "measures_per_line": value})
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("measures_per_line", response.get_json()["error"])
+
+    def test_setlist_worker_crash_fails_only_that_score(self):
+        with mock.patch("app.ProcessPoolExecutor", CrashingPool):
+            response = self.post_setlist()
+
+        self.assertEqual(response.status_code, 200)
+        body = response.get_json()
+        self.assertEqual(body["status"], "partial")
+        self.assertEqual([score["status"] for score in body["scores"]], ["completed", "failed", "completed"])
+
+
+if __name__ == "__main__":
+    unittest.main()
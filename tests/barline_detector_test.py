@@ -0,0 +1,41 @@
+import os
+import tempfile
+import unittest
+
+import fitz
+
+from benchmarks.synthetic_scores import SyntheticScoreSpec, generate_score
+from core.barline_detector import BarlineDetector
+from core.system_segmenter import SystemSegmenter
+
+
+def with_score(spec, callback):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        pdf_path = os.path.join(temp_dir, "score.pdf")
+        truth = generate_score(pdf_path, spec)
+        pdf = fitz.open(pdf_path)
+        try:
+            return callback(pdf[0]), truth["pages"][0]["systems"]
+        finally:
+            pdf.close()
+
+
+class BarlineDetectorTest(unittest.TestCase):
+    def test_measures_match_barlines(self):
+        for scan in (False, True):
+            with self.subTest(scan=scan):
+                spec = SyntheticScoreSpec(pages=1, systems_per_page=3, measures_per_system=5, scan=scan)
+                detected, truth = with_score(
+                    spec, lambda page: BarlineDetector().detect(SystemSegmenter().segment(page))
+                )
+
+                self.assertEqual(len(detected), len(truth))
+                for measures, expected in zip(detected, truth):
+                    self.assertEqual([m.index for m in measures], [1, 2, 3, 4, 5])
+                    for measure, (x_start, x_end) in zip(measures, expected["measures"]):
+                        self.assertAlmostEqual(measure.x_start, x_start, delta=3)
+                        self.assertAlmostEqual(measure.x_end, x_end, delta=3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+import json
+import os
+import tempfile
+import unittest
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from unittest import mock
+
+from benchmarks.synthetic_scores import SyntheticScoreSpec, generate_score
+from core import batch_extract
+
+
+class CrashingPool:
+    """song1 のワーカーだけが異常終了するプール（結果は submit 時に作る）"""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def submit(self, fn, job):
+        future = Future()
+        if "song1" in job["input"]:
+            future.set_exception(BrokenProcessPool("worker died"))
+        else:
+            future.set_result(fn(job))
+        return future
+
+
+class BatchExtractTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.input_dir = os.path.join(self.temp_dir.name, "songbook")
+        self.output_dir = os.path.join(self.temp_dir.name, "out")
+        for index in range(3):
+            generate_score(os.path.join(self.input_dir, f"song{index}.pdf"),
+                           SyntheticScoreSpec(pages=1, systems_per_page=2, seed=index))
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def run_cli(self, *extra):
+        argv = [self.input_dir, "--engine", "adaptive", "--parts", "vocal,keyboard",
+                "--output-dir", self.output_dir, "--workers", "1", *extra]
+        with mock.patch("builtins.print"):
+            code = batch_extract.main(argv)
+        with open(os.path.join(self.output_dir, batch_extract.SUMMARY_NAME), encoding="utf-8") as f:
+            return code, json.load(f)
+
+    def test_extracts_then_skips_up_to_date(self):
+        code, summary = self.run_cli()
+
+        self.assertEqual(code, 0)
+        self.assertEqual(summary["totals"]["completed"], 3)
+
+    def test_worker_crash_fails_only_that_document(self):
+        with mock.patch.object(batch_extract, "ProcessPoolExecutor", CrashingPool), mock.patch("builtins.print"):
+            summary = batch_extract.run_batch(batch_extract.find_inputs([self.input_dir]), "adaptive",
+                                              self.output_dir, workers=2, config={})
+
+        self.assertEqual([r["status"] for r in summary["documents"]], ["completed", "failed", "completed"])
+        self.assertIn("BrokenProcessPool", summary["documents"][1]["error"])
+        for record in summary["documents"]:
+            self.assertTrue(os.path.exists(record["output"]))
+            self.assertGreater(record["wall_time"], 0)
+        self.assertFalse([name for name in os.listdir(self.output_dir) if name.endswith(".partial")])
+
+        # 内容が変わった文書だけ抽出し直す
+        generate_score(os.path.join(self.input_dir, "song1.pdf"), SyntheticScoreSpec(pages=2, seed=9))
+        _, summary = self.run_cli()
+        self.assertEqual([r["status"] for r in summary["documents"]], ["skipped", "completed", "skipped"])
+
+    def test_resumes_after_interruption(self):
+        calls = []
+        original = batch_extract.extract_document
+
+        def interrupted(job):
+            if len(calls) == 2:
+                raise KeyboardInterrupt
+            calls.append(job["input"])
+            return original(job)
+
+        with mock.patch.object(batch_extract, "extract_document", side_effect=interrupted):
+            with self.assertRaises(KeyboardInterrupt):
+                self.run_cli()
+
+        _, summary = self.run_cli()
+        self.assertEqual([r["status"] for r in summary["documents"]], ["skipped", "skipped", "completed"])
+
+    def test_parallel_workers(self):
+        summary = batch_extract.run_batch(batch_extract.find_inputs([self.input_dir]), "adaptive",
+                                          self.output_dir, workers=2, config={})
+        self.assertEqual(summary["totals"]["completed"], 3)
+
+    def test_worker_crash_fails_only_that_document(self):
+        with mock.patch.object(batch_extract, "ProcessPoolExecutor", CrashingPool), mock.patch("builtins.print"):
+            summary = batch_extract.run_batch(batch_extract.find_inputs([self.input_dir]), "adaptive",
+                                              self.output_dir, workers=2, config={})
+
+        self.assertEqual([r["status"] for r in summary["documents"]], ["completed", "failed", "completed"])
+        self.assertIn("BrokenProcessPool", summary["documents"][1]["error"])
+
+
+if __name__ == "__main__":
+    unittest.main()
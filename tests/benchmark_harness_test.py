@@ -0,0 +1,79 @@
+import os
+import tempfile
+import unittest
+
+import fitz
+
+from benchmarks.harness import Instrumentation, score_against_truth
+
+
+TRUTH = {
+    "pages": [
+        {
+            "page_index": 0,
+            "systems": [
+                {
+                    "staves": [
+                        {"part": "vocal", "bbox": [50, 100, 550, 140]},
+                        {"part": "guitar", "bbox": [50, 200, 550, 240]},
+                        {"part": "keyboard", "bbox": [50, 300, 550, 340]},
+                    ]
+                }
+            ],
+        }
+    ]
+}
+
+
+class ScoreAgainstTruthTest(unittest.TestCase):
+    def test_perfect_extraction(self):
+        placements = [
+            {"page_index": 0, "clip": [0, 95, 595, 145]},
+            {"page_index": 0, "clip": [0, 295, 595, 345]},
+        ]
+        score = score_against_truth(placements, TRUTH)
+        self.assertEqual(score["precision"], 1.0)
+        self.assertEqual(score["recall"], 1.0)
+        self.assertEqual(score["f1"], 1.0)
+
+    def test_guitar_counts_against_precision(self):
+        placements = [
+            {"page_index": 0, "clip": [0, 95, 595, 145]},
+            {"page_index": 0, "clip": [0, 195, 595, 245]},
+        ]
+        score = score_against_truth(placements, TRUTH)
+        self.assertEqual(score["precision"], 0.5)
+        self.assertEqual(score["recall"], 0.5)
+
+    def test_no_placements(self):
+        score = score_against_truth([], TRUTH)
+        self.assertEqual(score["f1"], 0.0)
+
+
+class InstrumentationTest(unittest.TestCase):
+    def test_records_clips_from_source_only(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            pdf_path = os.path.join(temp_dir, "input.pdf")
+            src = fitz.open()
+            page = src.new_page(width=400, height=400)
+            page.draw_line((10, 100), (390, 100))
+            src.save(pdf_path)
+            src.close()
+
+            src = fitz.open(pdf_path)
+            output = fitz.open()
+            target = output.new_page(width=400, height=400)
+
+            with Instrumentation(pdf_path) as instrumentation:
+                target.show_pdf_page(fitz.Rect(0, 0, 400, 100), src, 0, clip=fitz.Rect(0, 50, 400, 150))
+
+            target.show_pdf_page(fitz.Rect(0, 100, 400, 200), src, 0, clip=fitz.Rect(0, 0, 400, 10))
+            src.close()
+            output.close()
+
+            self.assertEqual(len(instrumentation.placements), 1)
+            self.assertEqual(instrumentation.placements[0]["clip"], [0, 50, 400, 150])
+
+
+if __name__ == "__main__":
+    unittest.main()
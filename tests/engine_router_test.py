@@ -0,0 +1,120 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import fitz
+
+from benchmarks.synthetic_scores import SyntheticScoreSpec, generate_score
+from core.engine_router import AdaptiveEngineRouter, PageRoute, VectorStaff, classify_label
+from core.final_smart_extractor_v17_accurate import FinalSmartExtractorV17Accurate
+from core.ocr_language import ENG_JPN
+
+
+def staff(top):
+    return VectorStaff(top, top + 32, 70, 555, 8)
+
+
+class ClassifyLabelTest(unittest.TestCase):
+    def test_excluded_parts_take_priority(self):
+        self.assertEqual(classify_label("Lead Gt."), "guitar")
+        self.assertEqual(classify_label("Vo.&Cho."), "vocal")
+        self.assertEqual(classify_label("キーボード"), "keyboard")
+        self.assertIsNone(classify_label("Tb."))
+
+
+class MapLabelsTest(unittest.TestCase):
+    def test_grand_staff_continuation(self):
+        router = AdaptiveEngineRouter()
+        staves = [staff(100), staff(160), staff(200)]
+        assigned, confidence = router.map_labels(staves, [("Vo.", 116), ("Key.", 176)])
+
+        self.assertEqual(assigned, ["vocal", "keyboard", "keyboard"])
+        self.assertGreater(confidence, 0.9)
+
+    def test_unlabelled_staves_lower_confidence(self):
+        router = AdaptiveEngineRouter()
+        staves = [staff(100), staff(200), staff(300)]
+        _, confidence = router.map_labels(staves, [("Vo.", 116)])
+
+        self.assertLess(confidence, router.confidence_target)
+
+
+class AdaptiveEngineRouterTest(unittest.TestCase):
+    def test_vector_score_stays_on_fast_path(self):
+        spec = SyntheticScoreSpec(pages=2, systems_per_page=3, label_style="ja", grand_staff_keyboard=True)
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            pdf_path = os.path.join(temp_dir, "score.pdf")
+            truth = generate_score(pdf_path, spec)
+
+            router = AdaptiveEngineRouter()
+            with mock.patch.object(router, "route_ocr") as route_ocr:
+                result = router.extract_adaptive(pdf_path)
+
+            route_ocr.assert_not_called()
+            self.assertEqual(result["details"]["escalations"], [])
+            self.assertTrue(os.path.exists(result["output_path"]))
+
+            # 検出した領域が正解のボーカル五線を含む
+            pdf = fitz.open(pdf_path)
+            try:
+                route = router.route_vector(pdf[0], 0, router.detect_vector_staves(pdf[0]), ["vocal"])
+            finally:
+                pdf.close()
+            vocal_truth = [
+                s["bbox"] for s in truth["pages"][0]["systems"][0]["staves"] if s["part"] == "vocal"
+            ][0]
+            clip = route.systems[0].parts[0][1]
+            self.assertLessEqual(clip.y0, vocal_truth[1])
+            self.assertGreaterEqual(clip.y1, vocal_truth[3])
+
+    def test_scan_page_escalates_to_ocr(self):
+        spec = SyntheticScoreSpec(pages=1, scan=True, scan_dpi=72)
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            pdf_path = os.path.join(temp_dir, "scan.pdf")
+            generate_score(pdf_path, spec)
+
+            router = AdaptiveEngineRouter()
+            with mock.patch.object(router, "route_ocr", return_value=PageRoute(0, "ocr", 0.8)) as route_ocr:
+                result = router.extract_adaptive(pdf_path)
+
+            route_ocr.assert_called_once()
+            self.assertEqual(
+                result["details"]["escalations"],
+                [{"page": 0, "attempts": ["vector", "ocr"], "path": "ocr", "confidence": 0.8}],
+            )
+
+    def test_ocr_language_is_decided_per_document(self):
+        spec = SyntheticScoreSpec(pages=1, scan=True, scan_dpi=72)
+        languages = []
+
+        def record_language(extractor, page, page_num):
+            languages.append(extractor.ocr_language.lang)
+            # 1つ目の文書で決まった言語（後の文書に引き継がれてはいけない）
+            extractor.ocr_language.lang = "eng"
+            return []
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            japanese_path = os.path.join(temp_dir, "ja.pdf")
+            generate_score(japanese_path, spec)
+            with fitz.open(japanese_path) as pdf:
+                pdf.xref_set_key(pdf.pdf_catalog(), "Lang", "(ja-JP)")
+                pdf.saveIncr()
+            latin_path = os.path.join(temp_dir, "en.pdf")
+            generate_score(latin_path, spec)
+
+            router = AdaptiveEngineRouter()
+            with mock.patch.object(FinalSmartExtractorV17Accurate, "extract_systems_accurately",
+                                   autospec=True, side_effect=record_language), \
+                    mock.patch("builtins.print"):
+                router.extract_adaptive(japanese_path)
+                router.extract_adaptive(latin_path)
+                router.extract_adaptive(japanese_path)
+
+        self.assertEqual(languages, [ENG_JPN, None, ENG_JPN])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+import os
+import tempfile
+import unittest
+
+from core.extractor_registry import RegisteredExtractor, get_spec, resolve_engine, select_engine
+
+
+def make_analysis(pdf_type, recommended_method):
+    return {
+        "pdf_type": {"type": pdf_type},
+        "extraction_config": {"recommended_method": recommended_method},
+    }
+
+
+class FakeMeasureBased:
+    def __init__(self):
+        self.calls = []
+
+    def extract_parts(self, pdf_path, selected_parts, measures_per_line=None, show_lyrics=False, output_path=None):
+        self.calls.append((pdf_path, selected_parts, measures_per_line, show_lyrics))
+        return output_path or "out.pdf"
+
+
+class FakeV17:
+    def __init__(self):
+        self.calls = []
+
+    def extract_smart_final(self, pdf_path, output_path=None, parts=None):
+        self.calls.append(parts)
+        return output_path or "out.pdf"
+
+
+class FakeLegacy:
+    """出力先を指定できない抽出器（入力と同じ場所に保存）"""
+
+    def extract_smart_final(self, pdf_path):
+        output_path = pdf_path.replace(".pdf", "_out.pdf")
+        with open(output_path, "wb") as f:
+            f.write(b"%PDF-1.4")
+        return output_path
+
+
+class SelectEngineTest(unittest.TestCase):
+    def test_follows_detector_recommendation(self):
+        self.assertEqual(select_engine(make_analysis("text_based", "measure_based")), "measure_based")
+        self.assertEqual(select_engine(make_analysis("image_based", "image_based")), "v17")
+        self.assertEqual(select_engine(make_analysis("hybrid", "smart")), "adaptive")
+
+    def test_skips_engine_without_requested_parts(self):
+        # 推奨エンジンがパートに対応していない場合は対応する最速のエンジンを選ぶ
+        self.assertEqual(select_engine(make_analysis("hybrid", "smart"), ["chord"]), "measure_based")
+
+    def test_falls_back_without_analysis(self):
+        self.assertEqual(select_engine(None), "measure_based")
+
+    def test_resolve_versioned_engine(self):
+        self.assertEqual(resolve_engine("v17@2"), "v17")
+        with self.assertRaises(KeyError):
+            resolve_engine("v17@9")
+        with self.assertRaises(KeyError):
+            resolve_engine("v99")
+
+
+class RegisteredExtractorTest(unittest.TestCase):
+    def test_maps_common_options(self):
+        instance = FakeMeasureBased()
+        result = RegisteredExtractor("measure_based", instance).extract(
+            "in.pdf", {"parts": ["vocal", "chord"], "measures_per_line": 4, "show_lyrics": None}
+        )
+
+        self.assertEqual(instance.calls, [("in.pdf", ["vocal", "chord"], 4, False)])
+        self.assertEqual(result.engine, "measure_based")
+        self.assertEqual(result.output_path, "out.pdf")
+        self.assertEqual(result.parts_extracted, ["vocal", "chord"])
+
+    def test_writes_to_requested_output_path(self):
+        instance = FakeMeasureBased()
+        result = RegisteredExtractor("measure_based", instance).extract("in.pdf", {}, output_path="temp/id.pdf")
+        self.assertEqual(result.output_path, "temp/id.pdf")
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            output_path = os.path.join(temp_dir, "id.pdf")
+            result = RegisteredExtractor("v16", FakeLegacy()).extract(
+                os.path.join(temp_dir, "in.pdf"), {}, output_path=output_path
+            )
+
+            self.assertEqual(result.output_path, output_path)
+            self.assertEqual(sorted(os.listdir(temp_dir)), ["id.pdf"])
+
+    def test_v17_reports_the_requested_parts(self):
+        instance = FakeV17()
+        result = RegisteredExtractor("v17", instance).extract("in.pdf", {"parts": ["vocal"]})
+        self.assertEqual(instance.calls, [["vocal"]])
+        self.assertEqual(result.parts_extracted, ["vocal"])
+
+        result = RegisteredExtractor("v17", instance).extract("in.pdf", {})
+        self.assertEqual(result.parts_extracted, ["vocal", "keyboard"])
+
+    def test_rejects_unsupported_parts(self):
+        with self.assertRaises(ValueError):
+            RegisteredExtractor("measure_based", FakeMeasureBased()).extract("in.pdf", {"parts": ["drums"]})
+
+    def test_rejects_part_selection_for_engines_without_it(self):
+        # v16 は parts を受け取らないため、一部のパートだけを要求されても全パートを出力してしまう
+        with self.assertRaises(ValueError):
+            RegisteredExtractor("v16", FakeLegacy()).extract("in.pdf", {"parts": ["vocal"]})
+        self.assertFalse(get_spec("v16").supports(parts=["vocal"]))
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            result = RegisteredExtractor("v16", FakeLegacy()).extract(
+                os.path.join(temp_dir, "in.pdf"), {"parts": ["keyboard", "vocal"]}
+            )
+        self.assertEqual(result.parts_extracted, ["vocal", "keyboard"])
+
+
+if __name__ == "__main__":
+    unittest.main()
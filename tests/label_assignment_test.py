@@ -0,0 +1,76 @@
+import itertools
+import random
+import unittest
+
+import numpy as np
+
+from core.label_assignment import assign_labels, solve_ordered_assignment
+from core.score_model import InstrumentLabel, StaffGroup
+
+
+def staves(*tops):
+    return [StaffGroup.from_lines([top + 8 * k for k in range(5)], position=i) for i, top in enumerate(tops)]
+
+
+def label(part, y_center, confidence=0.8):
+    return InstrumentLabel(part, 0, y_center, 0, part=part, confidence=confidence)
+
+
+def brute_force(cost, skip_cost):
+    n_labels, n_staves = cost.shape
+    best = float("inf")
+    for matched in itertools.product([False, True], repeat=n_labels):
+        rows = [i for i in range(n_labels) if matched[i]]
+        for columns in itertools.combinations(range(n_staves), len(rows)):
+            total = skip_cost * (n_labels - len(rows)) + sum(cost[r, c] for r, c in zip(rows, columns))
+            best = min(best, total)
+    return best
+
+
+class AssignLabelsTest(unittest.TestCase):
+    def test_keyboard_does_not_take_guitar_staff(self):
+        # キーボードのラベルがギターの五線に最も近くても、ギターと取り合わない
+        groups = staves(100, 180, 260)
+        result = assign_labels(groups, [label("vocal", 116), label("guitar", 196), label("keyboard", 210)])
+
+        self.assertEqual(result["vocal"].position, 0)
+        self.assertEqual(result["guitar"].position, 1)
+        self.assertEqual(result["keyboard"].position, 2)
+        self.assertLess(result["keyboard"].confidence, result["guitar"].confidence)
+
+    def test_far_labels_are_left_unassigned(self):
+        result = assign_labels(staves(100), [label("vocal", 200), label("keyboard", 150)])
+
+        self.assertNotIn("vocal", result)
+        self.assertEqual(result["keyboard"].position, 0)
+
+    def test_confidence_scales_with_distance(self):
+        result = assign_labels(staves(100), [label("keyboard", 116, confidence=1.0)])
+        self.assertEqual(result["keyboard"].confidence, 1.0)
+
+        result = assign_labels(staves(100), [label("keyboard", 166, confidence=1.0)])
+        self.assertAlmostEqual(result["keyboard"].confidence, 0.5)
+
+    def test_empty_inputs(self):
+        self.assertEqual(assign_labels([], [label("vocal", 0)]), {})
+        self.assertEqual(assign_labels(staves(100), []), {})
+
+
+class SolveOrderedAssignmentTest(unittest.TestCase):
+    def test_matches_brute_force(self):
+        rng = random.Random(0)
+        for _ in range(200):
+            n_labels, n_staves = rng.randint(1, 4), rng.randint(1, 5)
+            cost = np.array([[rng.random() for _ in range(n_staves)] for _ in range(n_labels)])
+            cost[cost > 0.9] = np.inf
+
+            assignment = solve_ordered_assignment(cost, skip_cost=1.0)
+            columns = [c for c in assignment if c is not None]
+            self.assertEqual(columns, sorted(set(columns)))
+
+            total = sum(1.0 if c is None else cost[r, c] for r, c in enumerate(assignment))
+            self.assertAlmostEqual(total, brute_force(cost, 1.0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+
+from core.label_classifier import LabelClassifier, classify_label
+from core.measure_based_extractor import MeasureBasedExtractor
+
+
+class LabelClassifierTest(unittest.TestCase):
+    def test_parts_and_priority(self):
+        cases = {
+            "Vo.": "vocal",
+            "Cho.": "vocal",
+            "Key.2": "keyboard",
+            "ピアノ": "keyboard",
+            "Lead Gt.": "guitar",
+            "E.Ba.": "bass",
+            "CHO": "chord",
+            "Chords": "chord",
+            "Keytar": None,
+            "Echo": None,
+            "Gt1": "guitar",
+            "Dr.": "drums",
+            # 除外パートの略記で始まる単語はラベルではない
+            "Bach": None,
+            "Basic": None,
+            "Baby": None,
+            "Drive": None,
+            "Drop": None,
+        }
+        for text, part in cases.items():
+            with self.subTest(text=text):
+                self.assertEqual(classify_label(text).part, part)
+
+    def test_all_parts_in_a_line_with_scores(self):
+        result = classify_label("Piano & Vo.")
+
+        self.assertEqual(result.parts, ["keyboard", "vocal"])
+        self.assertEqual(classify_label("Vo.").score, 1.0)
+        self.assertLess(result.score_for("vocal"), 1.0)
+
+    def test_ocr_confusions_are_normalized(self):
+        result = classify_label(" Vocai ")
+
+        self.assertEqual((result.text, result.part, result.corrected), ("Vocal", "vocal", True))
+        self.assertLess(result.score, 1.0)
+        self.assertEqual(LabelClassifier(corrections={}).classify("Vocai").text, "Vocai")
+
+    def test_measure_based_uses_shared_classifier(self):
+        extractor = MeasureBasedExtractor()
+
+        self.assertTrue(extractor._should_exclude("Gt.&Vo."))
+        self.assertEqual(extractor._identify_part_type("Keyb.", ["vocal", "keyboard"]), "keyboard")
+        self.assertIsNone(extractor._identify_part_type("Keyb.", ["vocal"]))
+        # コードはラベルではなくコード記号で検出する
+        self.assertIsNone(extractor._identify_part_type("Chord", ["chord"]))
+        # セクション名の Chorus は楽器ラベルにしない（他の抽出器ではボーカル）
+        self.assertIsNone(extractor._identify_part_type("Chorus", ["vocal", "keyboard"]))
+        self.assertEqual(extractor._identify_part_type("Vo.&Cho.", ["vocal", "keyboard"]), "vocal")
+        self.assertEqual(classify_label("Chorus").part, "vocal")
+
+
+if __name__ == "__main__":
+    unittest.main()
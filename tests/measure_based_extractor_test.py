@@ -0,0 +1,93 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import fitz
+
+from benchmarks.synthetic_scores import SyntheticScoreSpec, generate_score
+from core.measure_based_extractor import MeasureBasedExtractor
+
+BAND = ["vocal", "guitar", "bass", "keyboard", "drums"]
+
+
+def build_score(temp_dir, layouts, systems_per_page=2):
+    """(ページ数, パート順) ごとに合成スコアを作って連結"""
+    output = fitz.open()
+    truth_pages = []
+    for index, (pages, staff_order) in enumerate(layouts):
+        path = os.path.join(temp_dir, f"part{index}.pdf")
+        truth = generate_score(path, SyntheticScoreSpec(pages=pages, systems_per_page=systems_per_page, staff_order=staff_order,
+                                                        measures_per_system=6, seed=index))
+        with fitz.open(path) as part:
+            output.insert_pdf(part)
+        truth_pages.extend(truth["pages"])
+
+    pdf_path = os.path.join(temp_dir, "score.pdf")
+    output.save(pdf_path)
+    output.close()
+    return pdf_path, truth_pages
+
+
+class MeasureBasedSchedulingTest(unittest.TestCase):
+    def run_extract(self, layouts, systems_per_page=2):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            pdf_path, truth = build_score(temp_dir, layouts, systems_per_page)
+            extractor = MeasureBasedExtractor()
+
+            with mock.patch.object(extractor, "_extract_systems_from_page",
+                                   wraps=extractor._extract_systems_from_page) as accurate, \
+                    mock.patch.object(extractor, "_extract_systems_fast",
+                                      wraps=extractor._extract_systems_fast) as fast, \
+                    mock.patch.object(extractor, "_create_output_pdf",
+                                      wraps=extractor._create_output_pdf) as create_output:
+                output_path = extractor.extract_parts(pdf_path, ["vocal", "keyboard"])
+
+            self.assertTrue(os.path.exists(output_path))
+
+        systems = create_output.call_args[0][1]
+        accurate_pages = [c.args[1] for c in accurate.call_args_list]
+        fast_pages = [c.args[1] for c in fast.call_args_list]
+        return systems, accurate_pages, fast_pages, truth
+
+    def test_template_carries_forward(self):
+        systems, accurate_pages, fast_pages, truth = self.run_extract([(6, BAND)])
+
+        self.assertEqual(accurate_pages, [0, 1, 2])
+        self.assertEqual(fast_pages, [3, 4, 5])
+
+        # 高速処理のページも検出した各システムに、学習した位置で楽器を配置する
+        fast_systems = [s for s in systems if s.page_num == 4]
+        self.assertEqual(len(fast_systems), 2)
+        for system, expected in zip(fast_systems, truth[4]["systems"]):
+            self.assertEqual(len(system.measures), 6)
+            vocal = [inst for inst in system.instruments if inst.part == "vocal"][0]
+            vocal_staff = [s for s in expected["staves"] if s["part"] == "vocal"][0]
+            self.assertLess(abs(vocal.y_center - (vocal_staff["bbox"][1] + vocal_staff["bbox"][3]) / 2), 10)
+
+    def test_fast_systems_keep_only_their_own_instruments(self):
+        systems, _, fast_pages, truth = self.run_extract([(5, BAND)], systems_per_page=3)
+
+        self.assertEqual(fast_pages, [3, 4])
+        page_height = truth[3]["height"]
+        for page_num in fast_pages:
+            # 学習したテンプレートが隣のシステムの楽器を含まず、各システムにパートごと1つだけ配置する
+            fast_systems = [s for s in systems if s.page_num == page_num]
+            self.assertEqual(len(fast_systems), 3)
+            for system in fast_systems:
+                self.assertEqual(sorted(inst.part for inst in system.instruments), ["keyboard", "vocal"])
+                for inst in system.instruments:
+                    self.assertTrue(0 <= inst.y and inst.y + inst.height <= page_height)
+                    self.assertTrue(system.rect[1] <= inst.y_center <= system.rect[3])
+
+    def test_layout_change_triggers_accurate_path(self):
+        systems, accurate_pages, fast_pages, _ = self.run_extract([(4, BAND), (2, ["vocal", "keyboard"])])
+
+        # 5ページ目で五線の数が変わるため通常処理に戻り、学習し直したテンプレートで6ページ目を処理
+        self.assertEqual(accurate_pages, [0, 1, 2, 4])
+        self.assertEqual(fast_pages, [3, 4, 5])
+        self.assertEqual({s.page_num for s in systems}, set(range(6)))
+
+
+if __name__ == "__main__":
+    unittest.main()
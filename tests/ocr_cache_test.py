@@ -0,0 +1,82 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+from PIL import Image
+
+from core.ocr_cache import OCRCache
+
+
+def label_crop(noise=0):
+    image = np.full((60, 120), 255, dtype=np.uint8)
+    image[20:40, 10:90] = 20
+    # 二値化の閾値をまたがない濃淡の揺れ
+    return image - np.uint8(noise)
+
+
+class OCRCacheTest(unittest.TestCase):
+    def test_identical_crops_skip_tesseract(self):
+        cache = OCRCache()
+        with mock.patch("pytesseract.image_to_string", return_value="Vocal\nKey") as ocr:
+            first = cache.image_to_string(Image.fromarray(label_crop()), lang="eng+jpn")
+            second = cache.image_to_string(label_crop(noise=5), lang="eng+jpn")
+            # OCR設定が違えば別のキー
+            cache.image_to_string(label_crop(), lang="eng")
+
+        self.assertEqual(first, second)
+        self.assertEqual(ocr.call_count, 2)
+        stats = cache.stats()
+        self.assertEqual((stats["memory_hits"], stats["misses"]), (1, 2))
+        self.assertEqual(stats["hit_rate"], round(1 / 3, 4))
+
+    def test_disk_cache_is_shared(self):
+        data = {"text": ["Vo."], "conf": [90], "left": [1], "top": [2], "height": [10]}
+        with tempfile.TemporaryDirectory() as cache_dir:
+            with mock.patch("pytesseract.image_to_data", return_value=data) as ocr:
+                OCRCache(cache_dir=cache_dir).image_to_data(label_crop(), config="--psm 6")
+                other = OCRCache(cache_dir=cache_dir)
+                self.assertEqual(other.image_to_data(label_crop(), config="--psm 6"), data)
+
+            self.assertEqual(ocr.call_count, 1)
+            self.assertEqual(other.stats()["disk_hits"], 1)
+
+    def test_lru_eviction(self):
+        cache = OCRCache(max_entries=1)
+        with mock.patch("pytesseract.image_to_string", return_value="Vo") as ocr:
+            cache.image_to_string(label_crop())
+            cache.image_to_string(np.zeros((60, 120), dtype=np.uint8))
+            cache.image_to_string(label_crop())
+
+        self.assertEqual(ocr.call_count, 3)
+        self.assertEqual(cache.stats()["entries"], 1)
+
+    def test_disk_cache_is_capped_oldest_first(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = OCRCache(cache_dir=cache_dir, max_disk_bytes=1000)
+            crops = [np.full((60, 120), 255, dtype=np.uint8) for _ in range(10)]
+            for index, crop in enumerate(crops):
+                crop[index * 5:index * 5 + 4, :] = 0
+            with mock.patch("pytesseract.image_to_string", return_value="x" * 200):
+                for index, crop in enumerate(crops):
+                    cache.image_to_string(crop)
+                    # 書き込みの順序をファイルの時刻に残す
+                    for root, _, names in os.walk(cache_dir):
+                        for name in names:
+                            path = os.path.join(root, name)
+                            os.utime(path, (os.path.getmtime(path) - 1,) * 2)
+
+            files = [os.path.join(root, name) for root, _, names in os.walk(cache_dir) for name in names]
+            self.assertLessEqual(sum(os.path.getsize(path) for path in files), 1000)
+            self.assertGreater(len(files), 0)
+            # 最後に書いた切り抜きは残り、最初の切り抜きは消えている
+            other = OCRCache(cache_dir=cache_dir)
+            with mock.patch("pytesseract.image_to_string", return_value="x" * 200) as ocr:
+                other.image_to_string(crops[-1])
+                other.image_to_string(crops[0])
+            self.assertEqual(ocr.call_count, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import re
+import unittest
+
+import fitz
+
+from core.ocr_language import ENG, ENG_JPN, OCRLanguageSelector, document_language_hint
+from core.ocr_mosaic import MosaicLine
+
+
+def is_label(text):
+    return bool(re.search(r"Vo\.|Key|ボーカル|キーボード", text))
+
+
+class FakeMosaic:
+    """言語ごとに決まった行を返すモザイク"""
+
+    def __init__(self, results):
+        self.results = results
+        self.calls = []
+
+    def recognize_lines(self, lang="eng", config=""):
+        self.calls.append((lang, config))
+        return {0: [MosaicLine(text, confidence, (0, 0, 10, 10)) for text, confidence in self.results[lang]]}
+
+
+class OCRLanguageSelectorTest(unittest.TestCase):
+    def test_confident_latin_labels_stay_on_eng(self):
+        selector = OCRLanguageSelector()
+        mosaic = FakeMosaic({ENG: [("Vo.", 90), ("Key.", 85)], ENG_JPN: []})
+
+        selector.recognize_lines(mosaic, is_label)
+        selector.recognize_lines(mosaic, is_label)
+
+        self.assertEqual(selector.lang, ENG)
+        self.assertEqual([lang for lang, _ in mosaic.calls], [ENG, ENG])
+        self.assertIn("tessedit_char_whitelist", mosaic.calls[0][1])
+
+    def test_escalates_to_jpn_once_per_document(self):
+        selector = OCRLanguageSelector()
+        mosaic = FakeMosaic({ENG: [("n-tl", 30)], ENG_JPN: [("ボーカル", 80), ("キーボード", 75)]})
+
+        lines = selector.recognize_lines(mosaic, is_label)
+        selector.recognize_lines(mosaic, is_label)
+
+        self.assertEqual([line.text for line in lines[0]], ["ボーカル", "キーボード"])
+        self.assertEqual([lang for lang, _ in mosaic.calls], [ENG, ENG_JPN, ENG_JPN])
+        self.assertEqual(selector.escalations, 1)
+
+        selector.reset()
+        self.assertIsNone(selector.lang)
+
+    def test_pages_without_labels_leave_language_undecided(self):
+        selector = OCRLanguageSelector()
+        selector.recognize_lines(FakeMosaic({ENG: [], ENG_JPN: []}), is_label)
+        self.assertIsNone(selector.lang)
+
+
+class DocumentLanguageHintTest(unittest.TestCase):
+    def test_japanese_label_in_text_layer(self):
+        with fitz.open() as pdf:
+            page = pdf.new_page()
+            page.insert_text((20, 100), "ボーカル", fontname="japan")
+            self.assertEqual(document_language_hint(pdf), ENG_JPN)
+
+    def test_catalog_language(self):
+        with fitz.open() as pdf:
+            pdf.new_page().insert_text((20, 100), "Vo.")
+            self.assertIsNone(document_language_hint(pdf))
+            pdf.xref_set_key(pdf.pdf_catalog(), "Lang", "(ja-JP)")
+            self.assertEqual(document_language_hint(pdf), ENG_JPN)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import fitz
+import numpy as np
+
+from benchmarks.synthetic_scores import SyntheticScoreSpec, generate_score
+from core.final_smart_extractor_v17_accurate import FinalSmartExtractorV17Accurate
+from core.ocr_cache import OCRCache
+from core.ocr_mosaic import OCRMosaic
+
+
+def label_crop(rows, height=40, width=60):
+    """rows の (上端, 下端) に黒い帯を描いた切り抜き"""
+    image = np.full((height, width), 255, dtype=np.uint8)
+    for top, bottom in rows:
+        image[top:bottom, 5:45] = 0
+    return image
+
+
+def fake_image_to_data(texts):
+    """モザイク上の黒い帯を上から順に単語として返す image_to_data"""
+    def run(image, lang=None, config=None, output_type=None):
+        dark_rows = np.flatnonzero((np.asarray(image) < 128).any(axis=1))
+        bands = np.split(dark_rows, np.flatnonzero(np.diff(dark_rows) > 1) + 1) if dark_rows.size else []
+        data = {key: [] for key in ("text", "conf", "left", "top", "width", "height",
+                                    "block_num", "par_num", "line_num")}
+        for index, band in enumerate(bands):
+            columns = np.flatnonzero((np.asarray(image)[band] < 128).any(axis=0))
+            data["text"].append(texts[index])
+            data["conf"].append(90)
+            data["left"].append(int(columns[0]))
+            data["top"].append(int(band[0]))
+            data["width"].append(int(columns[-1] - columns[0] + 1))
+            data["height"].append(int(band[-1] - band[0] + 1))
+            data["block_num"].append(index + 1)
+            data["par_num"].append(1)
+            data["line_num"].append(1)
+        return data
+    return run
+
+
+class OCRMosaicTest(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch("core.ocr_mosaic.get_ocr_cache", return_value=OCRCache())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_words_are_mapped_back_to_crops(self):
+        mosaic = OCRMosaic()
+        mosaic.add("first", label_crop([(10, 20)]), origin=(0.0, 100.0), scale=2.0)
+        mosaic.add("second", label_crop([(4, 12), (24, 34)]), origin=(0.0, 300.0), scale=2.0)
+
+        with mock.patch("pytesseract.image_to_data",
+                        side_effect=fake_image_to_data(["Vocal", "Key", "Gt."])) as ocr:
+            words = mosaic.recognize()
+
+        self.assertEqual(ocr.call_count, 1)
+        self.assertEqual([w.text for w in words["first"]], ["Vocal"])
+        self.assertEqual([w.text for w in words["second"]], ["Key", "Gt."])
+        self.assertEqual(words["first"][0].rect, (2.5, 105.0, 22.5, 110.0))
+        self.assertEqual(words["second"][1].rect[1], 312.0)
+
+    def test_empty_mosaic_skips_ocr(self):
+        mosaic = OCRMosaic()
+        mosaic.add("empty", np.zeros((0, 10), dtype=np.uint8))
+
+        with mock.patch("pytesseract.image_to_data") as ocr:
+            self.assertEqual(mosaic.recognize_lines(), {})
+        ocr.assert_not_called()
+
+    def test_v17_runs_one_ocr_call_per_page(self):
+        spec = SyntheticScoreSpec(pages=1, systems_per_page=3)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            pdf_path = os.path.join(temp_dir, "score.pdf")
+            generate_score(pdf_path, spec)
+
+            extractor = FinalSmartExtractorV17Accurate()
+            extractor.debug_mode = False
+            # 言語は決定済みとして、eng → eng+jpn の再認識を含めない
+            extractor.ocr_language.lang = "eng"
+            empty = {key: [] for key in ("text", "conf", "left", "top", "width", "height",
+                                         "block_num", "par_num", "line_num")}
+            with fitz.open(pdf_path) as pdf, \
+                    mock.patch("pytesseract.image_to_data", return_value=empty) as ocr:
+                extractor.extract_systems_accurately(pdf[0], 0)
+
+        self.assertEqual(ocr.call_count, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
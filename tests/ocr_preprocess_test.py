@@ -0,0 +1,42 @@
+import unittest
+
+import numpy as np
+
+from core.ocr_preprocess import binarize, preprocess_for_ocr, remove_staff_lines
+
+
+def label_column():
+    """五線の左端がかかったラベル列（文字の高さ15px）"""
+    image = np.full((120, 300), 235, dtype=np.uint8)
+    for y in range(60, 110, 10):
+        image[y:y + 2, 120:] = 40
+    # 文字の代わりの縦画（1本は五線をまたぐ）
+    for x in (20, 30, 40):
+        image[20:35, x:x + 3] = 30
+    image[62:77, 130:133] = 30
+    return image
+
+
+class OCRPreprocessTest(unittest.TestCase):
+    def test_removes_staff_lines_but_keeps_crossing_strokes(self):
+        cleaned = remove_staff_lines(binarize(label_column()))
+
+        self.assertFalse((cleaned[80:82, 200:] < 128).any())
+        self.assertTrue((cleaned[62:77, 130:133] < 128).all())
+
+    def test_trims_to_ink_and_normalizes_height(self):
+        result = preprocess_for_ocr(label_column())
+
+        self.assertEqual(set(np.unique(result.image)) - {0, 255}, set())
+        self.assertAlmostEqual(result.scale, 2.0)
+        # 元画像の座標に戻せる
+        ys, xs = np.nonzero(result.image < 128)
+        self.assertEqual(tuple(round(v) for v in result.to_source(xs.min(), ys.min())), (20, 20))
+        self.assertEqual(result.packed().shape, (result.image.shape[0], (result.image.shape[1] + 7) // 8))
+
+    def test_blank_input(self):
+        self.assertTrue(preprocess_for_ocr(np.full((40, 40, 3), 255, dtype=np.uint8)).empty)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import os
+import tempfile
+import unittest
+
+import fitz
+
+from benchmarks.synthetic_scores import SyntheticScoreSpec, generate_score
+from core.output_composer import OutputComposer
+
+
+def placements(page_height):
+    """1ページを上下2つずつに切り抜いて並べる配置（同じ配置を2回含む）"""
+    clips = [fitz.Rect(0, 0, 595, page_height / 2), fitz.Rect(0, page_height / 2, 595, page_height)]
+    dests = [fitz.Rect(40, 40, 555, 240), fitz.Rect(40, 260, 555, 460)]
+    return list(zip(dests, clips)) * 2
+
+
+class OutputComposerTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.pdf_path = os.path.join(self.temp_dir.name, "score.pdf")
+        generate_score(self.pdf_path, SyntheticScoreSpec(pages=2, systems_per_page=3))
+        self.src_pdf = fitz.open(self.pdf_path)
+
+    def tearDown(self):
+        self.src_pdf.close()
+        self.temp_dir.cleanup()
+
+    def compose(self, path):
+        with OutputComposer(self.src_pdf) as composer:
+            for page_num in range(len(self.src_pdf)):
+                page = composer.new_page()
+                for dest, clip in placements(self.src_pdf[page_num].rect.height):
+                    composer.place(page, dest, page_num, clip=clip)
+            composer.save(path)
+            return composer.stats, composer.source_pages
+
+    def test_skips_duplicate_placements(self):
+        stats, source_pages = self.compose(os.path.join(self.temp_dir.name, "out.pdf"))
+
+        self.assertEqual(stats, {"placements": 4, "duplicates": 4})
+        self.assertEqual(source_pages, 2)
+
+    def test_source_page_imported_once(self):
+        path = os.path.join(self.temp_dir.name, "out.pdf")
+        self.compose(path)
+
+        with fitz.open(path) as output:
+            # 各出力ページは2つの切り抜きを置くが、どちらも同じ元ページのXObjectを参照する
+            for page in output:
+                xobjects = page.get_xobjects()
+                clips = [x for x in xobjects if x[2] == 0]
+                bases = {x[0] for x in xobjects if x[2] != 0}
+                self.assertEqual(len(clips), 2)
+                self.assertEqual(len(bases), 1)
+
+    def test_smaller_than_naive_output(self):
+        path = os.path.join(self.temp_dir.name, "out.pdf")
+        self.compose(path)
+
+        # 配置ごとに元PDFを開き直して保存する従来の組版
+        naive_path = os.path.join(self.temp_dir.name, "naive.pdf")
+        naive = fitz.open()
+        for page_num in range(len(self.src_pdf)):
+            page = naive.new_page(width=595, height=842)
+            for dest, clip in placements(self.src_pdf[page_num].rect.height):
+                with fitz.open(self.pdf_path) as src:
+                    page.show_pdf_page(dest, src, page_num, clip=clip)
+        naive.save(naive_path)
+        naive.close()
+
+        self.assertLess(os.path.getsize(path), os.path.getsize(naive_path))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,130 @@
+import gc
+import os
+import tempfile
+import unittest
+import weakref
+from unittest import mock
+
+import fitz
+import numpy as np
+
+from benchmarks.synthetic_scores import SyntheticScoreSpec, generate_score
+from core.measure_based_extractor import MeasureBasedExtractor
+from core.page_image import PageImageSource, embedded_page_image
+from core.system_segmenter import SystemSegmenter
+
+
+def image_page(pdf, gray, rect=None, width=612, height=792):
+    """グレースケール画像を1枚だけ貼ったページ"""
+    page = pdf.new_page(width=width, height=height)
+    pix = fitz.Pixmap(fitz.csGRAY, gray.shape[1], gray.shape[0], np.ascontiguousarray(gray).tobytes(), False)
+    page.insert_image(rect or page.rect, pixmap=pix)
+    return page
+
+
+class EmbeddedPageImageTest(unittest.TestCase):
+    def test_full_page_scan_is_decoded_at_native_resolution(self):
+        gray = np.full((1100, 850), 255, dtype=np.uint8)
+        gray[200:204, 100:700] = 0
+        with fitz.open() as pdf:
+            image = embedded_page_image(image_page(pdf, gray))
+
+        self.assertTrue(image.embedded)
+        self.assertAlmostEqual(image.scale, 850 / 612)
+        self.assertTrue(np.array_equal(image.gray, gray))
+        self.assertAlmostEqual(image.to_page(100, 200)[1], 200 / image.scale)
+
+    def test_offset_image_is_placed_on_page_coordinates(self):
+        gray = np.full((760, 580), 255, dtype=np.uint8)
+        gray[100, 50] = 0
+        with fitz.open() as pdf:
+            # 2倍の解像度の画像を (5, 5) からずらして貼る
+            image = embedded_page_image(image_page(pdf, gray, fitz.Rect(5, 5, 295, 385), 300, 390))
+
+        self.assertAlmostEqual(image.scale, 2.0)
+        self.assertEqual(image.gray.shape, (780, 600))
+        ys, xs = np.nonzero(image.gray < 128)
+        self.assertEqual(image.to_page(xs[0], ys[0]), (5 + 50 / 2, 5 + 100 / 2))
+        crop, origin = image.crop(fitz.Rect(30, 60, 50, 80))
+        self.assertEqual(origin, (60, 120))
+        self.assertEqual(crop.shape, (40, 40))
+
+    def test_vector_and_partial_pages_are_rendered(self):
+        with fitz.open() as pdf:
+            small = image_page(pdf, np.zeros((50, 50), dtype=np.uint8), fitz.Rect(0, 0, 100, 100))
+            self.assertIsNone(embedded_page_image(small))
+
+            vector = pdf.new_page(width=200, height=100)
+            vector.draw_line((10, 50), (190, 50))
+            self.assertIsNone(embedded_page_image(vector))
+
+            image = PageImageSource().get(vector, 1.5)
+            self.assertFalse(image.embedded)
+            self.assertEqual(image.gray.shape, (150, 300))
+
+    def test_pages_with_visible_text_are_rendered(self):
+        gray = np.full((1100, 850), 255, dtype=np.uint8)
+        with fitz.open() as pdf:
+            # スキャン画像に文字を重ねたページは画像だけでは文字が落ちる
+            overlay = image_page(pdf, gray)
+            overlay.insert_text((72, 72), "Vocal")
+            self.assertIsNone(embedded_page_image(overlay))
+
+            # OCR済みスキャンの透明なテキスト層は画像の見た目を変えない
+            ocr_layer = image_page(pdf, gray)
+            ocr_layer.insert_text((72, 72), "Vocal", render_mode=3)
+            self.assertTrue(embedded_page_image(ocr_layer).embedded)
+
+    def test_source_decodes_each_page_once(self):
+        gray = np.full((1100, 850), 255, dtype=np.uint8)
+        source = PageImageSource()
+        with fitz.open() as pdf:
+            page = image_page(pdf, gray)
+            first = source.get(page, 2.0)
+            self.assertIs(source.get(page, 300 / 72), first)
+            # 解像度が足りない用途には描き直した画像を返す
+            rendered = source.get(page, 300 / 72, min_scale=200 / 72)
+            self.assertFalse(rendered.embedded)
+            self.assertAlmostEqual(rendered.scale, 300 / 72)
+            self.assertIs(source.get(pdf[0], 300 / 72, min_scale=200 / 72), rendered)
+
+    def test_source_does_not_keep_closed_documents(self):
+        source = PageImageSource()
+        pdf = fitz.open()
+        source.get(image_page(pdf, np.full((1100, 850), 255, dtype=np.uint8)), 2.0)
+        document = weakref.ref(pdf)
+        pdf.close()
+        del pdf
+        gc.collect()
+
+        self.assertIsNone(document())
+
+
+class SegmenterScanTest(unittest.TestCase):
+    def test_scanned_score_is_segmented_from_the_embedded_image(self):
+        spec = SyntheticScoreSpec(pages=1, systems_per_page=3, scan=True, scan_dpi=150)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            pdf_path = os.path.join(temp_dir, "scan.pdf")
+            generate_score(pdf_path, spec)
+            with fitz.open(pdf_path) as pdf:
+                segmentation = SystemSegmenter().segment(pdf[0])
+
+        self.assertAlmostEqual(segmentation.scale, 150 / 72, places=2)
+        self.assertEqual(len(segmentation.systems), 3)
+
+    def test_extractor_releases_page_images_after_each_document(self):
+        spec = SyntheticScoreSpec(pages=1, systems_per_page=2, scan=True, scan_dpi=150)
+        extractor = MeasureBasedExtractor()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            pdf_path = os.path.join(temp_dir, "scan.pdf")
+            generate_score(pdf_path, spec)
+            with mock.patch.object(extractor, "_extract_systems_from_page", return_value=[]), \
+                    mock.patch("builtins.print"):
+                extractor.extract_parts(pdf_path, ["vocal", "keyboard"], output_path=os.path.join(temp_dir, "out.pdf"))
+
+        self.assertEqual(extractor.page_images._images, {})
+        self.assertIsNone(extractor.page_images._document)
+
+
+if __name__ == "__main__":
+    unittest.main()
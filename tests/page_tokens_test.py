@@ -0,0 +1,67 @@
+import unittest
+from unittest import mock
+
+import fitz
+
+from core.measure_based_extractor import MeasureBasedExtractor
+from core.ocr_cache import OCRCache
+from core.page_tokens import PageTokenIndex
+from core.score_model import InstrumentLabel
+
+SCALE = 300 / 72.0
+
+
+def ocr_data(words):
+    """(テキスト, left, top, 信頼度) のリスト -> 300 DPI の image_to_data 結果"""
+    return {
+        "text": [w[0] for w in words],
+        "left": [w[1] for w in words],
+        "top": [w[2] for w in words],
+        "width": [40 for _ in words],
+        "height": [30 for _ in words],
+        "conf": [w[3] for w in words],
+    }
+
+
+class PageTokenIndexTest(unittest.TestCase):
+    def test_query_by_rect_and_confidence(self):
+        index = PageTokenIndex.from_ocr_data(
+            ocr_data([("Key", 40, 1250, 90), ("Vo.", 40, 833, 90), ("", 0, 0, -1), ("C", 800, 880, 10)]),
+            SCALE
+        )
+
+        self.assertEqual([t.text for t in index.query()], ["Vo.", "C", "Key"])
+        self.assertEqual([t.text for t in index.query(x1=100)], ["Vo.", "Key"])
+        self.assertEqual([t.text for t in index.query(y0=250)], ["Key"])
+        self.assertEqual([t.text for t in index.query(min_confidence=20)], ["Vo.", "Key"])
+        self.assertAlmostEqual(index.query(x1=100)[0].y, 833 / SCALE)
+
+
+class MeasureBasedTokenReuseTest(unittest.TestCase):
+    def test_labels_chords_and_lyrics_share_one_ocr_pass(self):
+        data = ocr_data([("Vo.", 40, 833, 90), ("Key", 40, 1250, 90),
+                         ("C", 800, 880, 80), ("G7", 1200, 885, 80), ("ai", 1000, 900, 80)])
+        extractor = MeasureBasedExtractor()
+        system = [InstrumentLabel("Vo.", 10, 200, 10, part="vocal"),
+                  InstrumentLabel("Key", 10, 300, 10, part="keyboard")]
+
+        with fitz.open() as pdf, \
+                mock.patch("core.page_tokens.get_ocr_cache", return_value=OCRCache()), \
+                mock.patch("pytesseract.image_to_data", return_value=data) as ocr, \
+                mock.patch("builtins.print"):
+            page = pdf.new_page(width=595, height=842)
+            # 空白ページはOCRしないため、左上と右下に印を置く（インクへの切り詰めでずれない位置）
+            for x, y in ((0, 0), (593, 840)):
+                page.draw_rect(fitz.Rect(x, y, x + 2, y + 2), color=(0, 0, 0), fill=(0, 0, 0))
+            labels = extractor._ocr_extract_labels(page)
+            chords = extractor._detect_chords_by_omr(page, system)
+            lyrics = extractor._extract_lyrics(page, system)
+
+        self.assertEqual(ocr.call_count, 1)
+        self.assertEqual([label.text for label in labels], ["Vo.", "Key"])
+        self.assertEqual(sorted(c["text"] for group in chords.values() for c in group), ["C", "G7"])
+        self.assertIn("ai", [lyric["text"] for lyric in lyrics])
+
+
+if __name__ == "__main__":
+    unittest.main()
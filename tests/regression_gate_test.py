@@ -0,0 +1,77 @@
+import unittest
+from unittest import mock
+
+from benchmarks.regression_gate import compare, measure_extractor
+
+
+BASELINE = {
+    "suites": {
+        "extract_v17": {
+            "pages_per_sec": 2.0,
+            "stages": {"detect_staff_lines_v17": 0.1, "save_output_v17": 0.001},
+        }
+    }
+}
+
+
+def make_current(pages_per_sec, staff_time, save_time=0.001):
+    return {
+        "suites": {
+            "extract_v17": {
+                "pages_per_sec": pages_per_sec,
+                "stages": {"detect_staff_lines_v17": staff_time, "save_output_v17": save_time},
+            }
+        }
+    }
+
+
+class CompareTest(unittest.TestCase):
+    def test_within_tolerance(self):
+        regressions = compare(make_current(1.8, 0.11), BASELINE, 0.3, 0.3, 0.0)
+        self.assertEqual(regressions, [])
+
+    def test_throughput_drop(self):
+        regressions = compare(make_current(1.0, 0.1), BASELINE, 0.3, 0.3, 0.0)
+        self.assertEqual(len(regressions), 1)
+        self.assertIn("pages/sec", regressions[0])
+
+    def test_stage_slowdown(self):
+        regressions = compare(make_current(2.0, 0.2), BASELINE, 0.3, 0.3, 0.0)
+        self.assertEqual(len(regressions), 1)
+        self.assertIn("detect_staff_lines_v17", regressions[0])
+
+    def test_min_seconds_absorbs_tiny_stages(self):
+        regressions = compare(make_current(2.0, 0.1, save_time=0.004), BASELINE, 0.3, 0.3, 0.005)
+        self.assertEqual(regressions, [])
+
+    def test_stage_set_changes_are_flagged(self):
+        current = make_current(2.0, 0.1)
+        stages = current["suites"]["extract_v17"]["stages"]
+        stages["segment_systems"] = stages.pop("detect_staff_lines_v17")
+
+        regressions = compare(current, BASELINE, 0.3, 0.3, 0.0)
+        self.assertEqual(len(regressions), 2)
+        self.assertIn("segment_systems: not in baseline", regressions[0])
+        self.assertIn("detect_staff_lines_v17: in baseline but not measured", regressions[1])
+
+    def test_suites_missing_from_baseline_are_flagged(self):
+        current = make_current(2.0, 0.1)
+        current["suites"]["extract_measure_based"] = {"pages_per_sec": 1.0, "stages": {}}
+
+        regressions = compare(current, BASELINE, 0.3, 0.3, 0.0)
+        self.assertEqual(regressions, ["extract_measure_based: not in baseline (update it with --update-baseline)"])
+
+
+class MeasureExtractorTest(unittest.TestCase):
+    def test_failed_extraction_fails_the_gate(self):
+        extract = mock.Mock(return_value=None)
+        with mock.patch("benchmarks.regression_gate.load_extractor", return_value=(object(), extract, {})), \
+                mock.patch("benchmarks.regression_gate._page_count", return_value=1):
+            with self.assertRaises(RuntimeError) as raised:
+                measure_extractor("v17", [("/tmp/score.pdf", None)], repeat=1)
+
+        self.assertIn("score.pdf", str(raised.exception))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,40 @@
+import os
+import tempfile
+import unittest
+
+from utils.request_profiler import RequestProfiler
+
+
+def busy(n):
+    return sum(i * i for i in range(n))
+
+
+class RequestProfilerTest(unittest.TestCase):
+    def test_cprofile_saves_pstats_and_text(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            profiler = RequestProfiler({"PROFILING_ENABLED": True}, temp_dir)
+            result, profile_id = profiler.run("extract_parts", busy, 1000)
+
+            self.assertEqual(result, busy(1000))
+            self.assertTrue(os.path.exists(profiler.get_profile_path(profile_id, "pstats")))
+            with open(profiler.get_profile_path(profile_id, "text"), encoding="utf-8") as f:
+                self.assertIn("busy", f.read())
+
+    def test_sampling_saves_collapsed(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            config = {"PROFILING_ENABLED": True, "PROFILING_MODE": "sampling", "PROFILING_SAMPLE_INTERVAL": 0.001}
+            profiler = RequestProfiler(config, temp_dir)
+            _, profile_id = profiler.run("get_preview", busy, 300000)
+
+            self.assertIsNotNone(profiler.get_profile_path(profile_id, "collapsed"))
+            self.assertIsNone(profiler.get_profile_path(profile_id, "pstats"))
+
+    def test_rejects_path_traversal(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            profiler = RequestProfiler({"PROFILING_ENABLED": True}, temp_dir)
+            self.assertIsNone(profiler.get_profile_path("../metadata", "text"))
+            self.assertIsNone(profiler.get_profile_path("x", "html"))
+
+
+if __name__ == "__main__":
+    unittest.main()
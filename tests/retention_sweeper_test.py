@@ -0,0 +1,79 @@
+import os
+import tempfile
+import time
+import unittest
+
+from utils.file_handler import FileHandler
+from utils.retention_sweeper import RetentionSweeper
+
+
+class RetentionSweeperTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.upload_folder = os.path.join(self.temp_dir.name, "uploads")
+        self.temp_folder = os.path.join(self.temp_dir.name, "temp")
+        os.makedirs(self.upload_folder)
+        os.makedirs(self.temp_folder)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def make_handler(self, **config):
+        config = {"UPLOAD_FOLDER": self.upload_folder, "TEMP_FOLDER": self.temp_folder,
+                  "STORAGE_MIN_FREE_RATIO": 0, **config}
+        return FileHandler(config)
+
+    def write(self, path, size, age_minutes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(b"\0" * size)
+        used = time.time() - age_minutes * 60
+        os.utime(path, (used, used))
+        os.utime(os.path.dirname(path), (used, used))
+
+    def test_expired_files_are_counted(self):
+        self.write(os.path.join(self.upload_folder, "old", "score.pdf"), 1000, 90)
+        self.write(os.path.join(self.upload_folder, "new", "score.pdf"), 1000, 5)
+        self.write(os.path.join(self.temp_folder, "old_v17.pdf"), 500, 90)
+
+        stats = self.make_handler(FILE_RETENTION_MINUTES=60).cleanup_old_files()
+
+        self.assertEqual(stats, {"files": 2, "bytes": 1500, "errors": []})
+        self.assertEqual(os.listdir(self.upload_folder), ["new"])
+        self.assertEqual(os.listdir(self.temp_folder), [])
+
+    def test_quota_evicts_least_recently_used(self):
+        size = 300 * 1024
+        for index, age in enumerate([40, 30, 20, 10]):
+            self.write(os.path.join(self.temp_folder, f"out{index}.pdf"), size, age)
+
+        handler = self.make_handler(STORAGE_QUOTA_MB=1, STORAGE_EVICT_TARGET_RATIO=0.8)
+        # 最も古いファイルも、ダウンロードされれば最近使われたものとして残る
+        handler.get_output_path("out0")
+        stats = handler.enforce_quota()
+
+        # 1200KB → 上限1MBの80%（819KB）以下になるまで、最後に使われたのが古い順に削除
+        self.assertEqual(stats["files"], 2)
+        self.assertEqual(stats["bytes"], 2 * size)
+        self.assertEqual(sorted(os.listdir(self.temp_folder)), ["out0.pdf", "out3.pdf"])
+
+    def test_sweep_accumulates_totals(self):
+        self.write(os.path.join(self.temp_folder, "old.pdf"), 100, 90)
+        sweeper = RetentionSweeper(self.make_handler(FILE_RETENTION_MINUTES=60), interval=0.01)
+
+        sweeper.start()
+        try:
+            deadline = time.time() + 5
+            while sweeper.totals["runs"] < 2 and time.time() < deadline:
+                time.sleep(0.01)
+        finally:
+            sweeper.stop()
+
+        self.assertFalse(sweeper.running)
+        self.assertGreaterEqual(sweeper.totals["runs"], 2)
+        self.assertEqual(sweeper.totals["files_freed"], 1)
+        self.assertEqual(sweeper.totals["bytes_freed"], 100)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import pickle
+import unittest
+
+from core.score_model import InstrumentLabel, Measure, PartAssignment, StaffGroup, System
+
+
+def make_system():
+    staff = StaffGroup.from_lines([100, 108, 116, 124, 132], position=1)
+    label = InstrumentLabel("Vo.", 10, 110, 12, part="vocal", confidence=0.8)
+    return System(
+        page_num=2,
+        index=0,
+        rect=(0, 90, 595, 300),
+        instruments=[label],
+        assignments={"vocal": PartAssignment("vocal", staff, label, 0.8)},
+        measures=[Measure(1, 60, 200), Measure(2, 200, 340)],
+        lyrics=[{"text": "あ", "x": 70, "y": 140}],
+    )
+
+
+class ScoreModelTest(unittest.TestCase):
+    def test_instances_have_no_dict(self):
+        system = make_system()
+        for obj in (system, system.instruments[0], system.measures[0], system.assignment("vocal"),
+                    system.assignment("vocal").staff):
+            self.assertFalse(hasattr(obj, "__dict__"), type(obj).__name__)
+
+        with self.assertRaises(AttributeError):
+            system.measures[0].number = 1
+
+    def test_defaults_are_not_shared(self):
+        first = System(0, 0)
+        first.instruments.append(InstrumentLabel("Key.", 0, 0))
+        self.assertEqual(System(0, 1).instruments, [])
+
+    def test_tuple_round_trip(self):
+        system = make_system()
+        restored = System.from_tuple(system.to_tuple())
+
+        self.assertEqual(restored, system)
+        self.assertEqual(restored.assignment("vocal").position, 1)
+        self.assertTrue(restored.has_part("vocal"))
+        self.assertFalse(restored.has_part("keyboard"))
+
+    def test_pickle_round_trip(self):
+        system = make_system()
+        self.assertEqual(pickle.loads(pickle.dumps(system)), system)
+
+    def test_derived_geometry(self):
+        staff = StaffGroup.from_lines([100, 108, 116, 124, 132])
+        self.assertEqual((staff.y_start, staff.y_end, staff.y_center, staff.line_count), (90, 142, 116, 5))
+        self.assertEqual(InstrumentLabel("Vo.", 10, 110, 12).bbox, (10, 110, 60, 122))
+        self.assertEqual(Measure(1, 60, 200).width, 140)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+import io
+import json
+import os
+import tempfile
+import time
+import unittest
+
+from werkzeug.datastructures import FileStorage
+
+from utils.file_handler import FileHandler
+from utils.storage_index import StorageIndex
+
+
+class StorageIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.upload_folder = os.path.join(self.temp_dir.name, "uploads")
+        self.temp_folder = os.path.join(self.temp_dir.name, "temp")
+        os.makedirs(self.upload_folder)
+        os.makedirs(self.temp_folder)
+        self.handler = FileHandler({"UPLOAD_FOLDER": self.upload_folder, "TEMP_FOLDER": self.temp_folder,
+                                    "STORAGE_MIN_FREE_RATIO": 0, "FILE_RETENTION_MINUTES": 60})
+
+    def tearDown(self):
+        self.handler.index.close()
+        self.temp_dir.cleanup()
+
+    def upload(self, file_id, data=b"%PDF-1.4 score"):
+        return self.handler.save_upload(FileStorage(io.BytesIO(data), "score.pdf"), file_id, "スコア.pdf")
+
+    def test_uses_wal_journal(self):
+        mode = self.handler.index._connection().execute("PRAGMA journal_mode").fetchone()[0]
+        self.assertEqual(mode, "wal")
+
+    def test_upload_lookup_and_metadata(self):
+        path = self.upload("a")
+
+        self.assertEqual(self.handler.get_upload_path("a"), path)
+        self.assertIsNone(self.handler.get_upload_path("missing"))
+        metadata = self.handler.get_metadata("a")
+        self.assertEqual(metadata["original_filename"], "スコア.pdf")
+        self.assertEqual(metadata["file_size"], len(b"%PDF-1.4 score"))
+        self.assertFalse(os.path.exists(os.path.join(self.upload_folder, "a", "metadata.json")))
+
+    def test_legacy_upload_is_indexed_on_lookup(self):
+        upload_dir = os.path.join(self.upload_folder, "old")
+        os.makedirs(upload_dir)
+        with open(os.path.join(upload_dir, "score.pdf"), "wb") as f:
+            f.write(b"%PDF-1.4")
+        with open(os.path.join(upload_dir, "metadata.json"), "w", encoding="utf-8") as f:
+            json.dump({"original_filename": "old.pdf"}, f)
+
+        self.assertEqual(self.handler.get_upload_path("old"), os.path.join(upload_dir, "score.pdf"))
+        self.assertEqual(self.handler.get_upload_record("old")["original_filename"], "old.pdf")
+
+    def test_find_output_by_content_engine_and_params(self):
+        self.upload("a")
+        self.upload("b")  # 同じ内容を別IDでアップロード
+        params = {"version": "1", "options": {"parts": ["vocal"]}}
+        output_id = self.handler.output_id_for("a", "adaptive", params)
+        output_path = self.handler.build_output_path(output_id)
+        with open(output_path, "wb") as f:
+            f.write(b"%PDF-1.4 out")
+        self.handler.register_output(output_id, output_path, upload_id="a", engine="adaptive", params=params,
+                                     result={"engine": "adaptive"})
+
+        self.assertEqual(self.handler.find_output("b", "adaptive", params)["result"], {"engine": "adaptive"})
+        self.assertIsNone(self.handler.find_output("b", "adaptive", {"version": "1", "options": {}}))
+        self.assertIsNone(self.handler.find_output("b", "v17", params))
+        self.assertEqual(self.handler.get_output_path(output_id), output_path)
+
+        # ファイルが消えた結果は使わない
+        os.remove(output_path)
+        self.assertIsNone(self.handler.find_output("b", "adaptive", params))
+        self.assertIsNone(self.handler.get_output_path(output_id))
+
+    def test_retention_uses_index_timestamps(self):
+        self.upload("old")
+        self.upload("new")
+        old = time.time() - 90 * 60
+        with self.handler.index._connection() as conn:
+            conn.execute("UPDATE uploads SET last_used = ? WHERE id = 'old'", (old,))
+
+        stats = self.handler.cleanup_old_files()
+
+        self.assertEqual(stats["files"], 1)
+        self.assertEqual(os.listdir(self.upload_folder), ["new"])
+        self.assertIsNone(self.handler.get_upload_record("old"))
+
+    def test_shared_between_instances(self):
+        self.upload("a")
+        other = StorageIndex(self.handler.index.db_path)
+        try:
+            self.assertEqual(other.get_upload("a")["size"], len(b"%PDF-1.4 score"))
+        finally:
+            other.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import json
+import os
+import tempfile
+import unittest
+
+import fitz
+
+from benchmarks.synthetic_scores import SyntheticScoreSpec, generate_score
+
+
+class SyntheticScoreTest(unittest.TestCase):
+    def test_vector_score_matches_truth(self):
+        spec = SyntheticScoreSpec(pages=2, systems_per_page=3, staff_order=("vocal", "keyboard", "bass"))
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            pdf_path = os.path.join(temp_dir, "score.pdf")
+            truth = generate_score(pdf_path, spec)
+
+            with open(os.path.join(temp_dir, "score.json"), encoding="utf-8") as f:
+                self.assertEqual(json.load(f), json.loads(json.dumps(truth)))
+
+            pdf = fitz.open(pdf_path)
+            try:
+                self.assertEqual(len(pdf), 2)
+                self.assertEqual(len(truth["pages"][0]["systems"]), 3)
+
+                # テキスト層のラベル位置が正解の五線と一致する
+                staff = truth["pages"][0]["systems"][1]["staves"][1]
+                self.assertEqual(staff["part"], "keyboard")
+                words = [w for w in pdf[0].get_text("words") if w[4] == "Key."]
+                self.assertEqual(len(words), 3)
+                label_center = (words[1][1] + words[1][3]) / 2
+                self.assertTrue(staff["bbox"][1] <= label_center <= staff["bbox"][3])
+            finally:
+                pdf.close()
+
+    def test_scan_variant_has_no_text_layer(self):
+        spec = SyntheticScoreSpec(pages=1, scan=True, scan_dpi=72, noise=0.05, skew_deg=0.5)
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            pdf_path = os.path.join(temp_dir, "scan.pdf")
+            truth = generate_score(pdf_path, spec)
+
+            pdf = fitz.open(pdf_path)
+            try:
+                self.assertEqual(truth["variant"], "scan")
+                self.assertEqual(pdf[0].get_text().strip(), "")
+                self.assertEqual(len(pdf[0].get_images()), 1)
+            finally:
+                pdf.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import fitz
+import numpy as np
+
+from benchmarks.synthetic_scores import SyntheticScoreSpec, generate_score
+from core.final_smart_extractor_v17_accurate import FinalSmartExtractorV17Accurate
+from core.output_composer import OutputComposer
+from core.score_model import InstrumentLabel
+from core.system_segmenter import SystemSegmenter
+
+
+def segment_score(spec):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        pdf_path = os.path.join(temp_dir, "score.pdf")
+        truth = generate_score(pdf_path, spec)
+        pdf = fitz.open(pdf_path)
+        try:
+            segmentation = SystemSegmenter().segment(pdf[0])
+        finally:
+            pdf.close()
+    return segmentation, truth["pages"][0]["systems"]
+
+
+class SystemSegmenterTest(unittest.TestCase):
+    def test_detects_varying_system_counts(self):
+        for systems_per_page in (1, 3, 4):
+            for scan in (False, True):
+                with self.subTest(systems_per_page=systems_per_page, scan=scan):
+                    spec = SyntheticScoreSpec(
+                        pages=1, systems_per_page=systems_per_page, scan=scan,
+                        staff_order=["vocal", "guitar", "keyboard"], grand_staff_keyboard=True,
+                    )
+                    segmentation, truth = segment_score(spec)
+
+                    self.assertEqual([len(s.staves) for s in segmentation.systems], [len(s["staves"]) for s in truth])
+                    self.assertTrue(all(s.bracketed for s in segmentation.systems))
+                    for region, expected in zip(segmentation.systems, truth):
+                        # 検出領域は正解のシステムの五線をすべて含む
+                        self.assertLessEqual(region.top, expected["staves"][0]["bbox"][1])
+                        self.assertGreaterEqual(region.bottom, expected["staves"][-1]["bbox"][3])
+                        self.assertEqual([s.position for s in region.staves], list(range(len(region.staves))))
+
+    def test_splits_by_gap_without_brackets(self):
+        # 五線を 3つ + (大きな間隔) + 1つ で並べた、縦線のない画像
+        image = np.full((400, 300), 255, dtype=np.uint8)
+        for top in (20, 80, 140, 320):
+            for k in range(5):
+                image[top + k * 8, 20:280] = 0
+
+        segmentation = SystemSegmenter().segment_image(image, 1.0)
+
+        self.assertEqual([len(s.staves) for s in segmentation.systems], [3, 1])
+        self.assertFalse(segmentation.systems[0].bracketed)
+
+    def test_blank_page(self):
+        segmentation = SystemSegmenter().segment_image(np.full((100, 100), 255, dtype=np.uint8), 1.0)
+        self.assertEqual(segmentation.systems, [])
+
+
+def fake_labels(segmentation, region, ocr_lines=None):
+    # OCRの代わりに、各五線の中央にラベルを置く
+    parts = ["vocal", "guitar", "keyboard"]
+    return [
+        InstrumentLabel(part, 0, staff.y_center, 0, part=part, confidence=0.8)
+        for part, staff in zip(parts, region.staves)
+    ]
+
+
+class V17SegmentationTest(unittest.TestCase):
+    def test_processes_only_detected_systems(self):
+        spec = SyntheticScoreSpec(pages=1, systems_per_page=3, staff_order=["vocal", "guitar", "keyboard"])
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            pdf_path = os.path.join(temp_dir, "score.pdf")
+            generate_score(pdf_path, spec)
+
+            extractor = FinalSmartExtractorV17Accurate()
+            extractor.debug_mode = False
+
+            pdf = fitz.open(pdf_path)
+            try:
+                with mock.patch.object(extractor, "detect_all_instrument_labels_v17", side_effect=fake_labels) as labels:
+                    systems = extractor.extract_systems_accurately(pdf[0], 0)
+            finally:
+                pdf.close()
+
+        self.assertEqual(labels.call_count, 3)
+        self.assertEqual([s.index for s in systems], [0, 1, 2])
+        self.assertEqual([s.assignment("keyboard").position for s in systems], [2, 2, 2])
+
+    def test_places_only_requested_parts(self):
+        spec = SyntheticScoreSpec(pages=1, systems_per_page=3, staff_order=["vocal", "guitar", "keyboard"])
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            pdf_path = os.path.join(temp_dir, "score.pdf")
+            generate_score(pdf_path, spec)
+
+            extractor = FinalSmartExtractorV17Accurate()
+            extractor.debug_mode = False
+            with mock.patch.object(extractor, "detect_all_instrument_labels_v17", side_effect=fake_labels), \
+                    mock.patch.object(extractor, "detect_score_start", return_value=0), \
+                    mock.patch.object(OutputComposer, "place", autospec=True) as place, \
+                    mock.patch("builtins.print"):
+                extractor.extract_smart_final(pdf_path, os.path.join(temp_dir, "out.pdf"), parts=["keyboard"])
+
+        # 3システム × キーボードのみ（ボーカルの五線は配置しない）
+        self.assertEqual(place.call_count, 3)
+        self.assertEqual(extractor.parts, ("vocal", "keyboard"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,8 +1,28 @@
+import hashlib
+import json
 import os
 import shutil
-from datetime import datetime, timedelta
+import time
+from datetime import datetime
+from typing import NamedTuple, Optional, Tuple
+
 from werkzeug.utils import secure_filename
 
+from utils.storage_index import StorageIndex, params_key
+
+# アップロードの保存・ハッシュ計算の読み書き単位
+CHUNK_SIZE = 1024 * 1024
+
+
+class StorageEntry(NamedTuple):
+    """保持期間・容量管理の単位（アップロードはfile_idのディレクトリごと）"""
+    path: str
+    size: int
+    last_used: float
+    # 索引のレコード（table, id）。索引にないファイルは None
+    record: Optional[Tuple[str, str]] = None
+
+
 class FileHandler:
     """ファイル操作のユーティリティクラス"""
     
@@ -12,6 +32,15 @@ class FileHandler:
         self.temp_folder = config.get('TEMP_FOLDER', 'temp')
         self.allowed_extensions = config.get('ALLOWED_EXTENSIONS', {'pdf'})
         self.retention_minutes = config.get('FILE_RETENTION_MINUTES', 60)
+        # 容量上限（0で無効）と、ディスク空き容量がこの割合を下回ったら古いものから削除
+        self.quota_bytes = config.get('STORAGE_QUOTA_MB', 0) * 1024 * 1024
+        self.min_free_ratio = config.get('STORAGE_MIN_FREE_RATIO', 0)
+        self.evict_target_ratio = config.get('STORAGE_EVICT_TARGET_RATIO', 0.8)
+        # アップロード・抽出結果の索引（未指定時はアップロードフォルダと同じ階層に作成）
+        index_path = config.get('STORAGE_INDEX_PATH') or os.path.join(
+            os.path.dirname(os.path.abspath(self.upload_folder)), 'storage_index.sqlite3'
+        )
+        self.index = StorageIndex(index_path)
     
     def allowed_file(self, filename):
         """許可されたファイル拡張子かチェック"""
@@ -34,39 +63,90 @@ class FileHandler:
         # ファイルパス
         filepath = os.path.join(upload_dir, safe_filename)
         
-        # ファイルを保存
-        file.save(filepath)
+        # ファイルを保存（書き込みながら内容のハッシュを計算）
+        digest = hashlib.sha256()
+        size = 0
+        with open(filepath, 'wb') as f:
+            for chunk in iter(lambda: file.stream.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+                f.write(chunk)
+                size += len(chunk)
         
-        # メタデータを保存
-        self._save_metadata(file_id, {
-            'original_filename': filename,
-            'safe_filename': safe_filename,
-            'upload_time': datetime.now().isoformat(),
-            'file_size': os.path.getsize(filepath)
-        })
+        # 索引に登録
+        self.index.add_upload(file_id, filepath, size, digest.hexdigest(), original_filename=filename)
         
         return filepath
     
     def get_upload_path(self, file_id):
         """アップロードファイルのパスを取得"""
-        upload_dir = os.path.join(self.upload_folder, file_id)
+        record = self.index.get_upload(file_id)
+        if record:
+            if os.path.exists(record['path']):
+                self.index.touch('uploads', file_id)
+                return record['path']
+            self.index.remove('uploads', file_id)
+            return None
         
-        if not os.path.exists(upload_dir):
+        # 索引がない旧形式のアップロード：ディレクトリ内の最初のPDFファイルを索引に登録
+        upload_dir = os.path.join(self.upload_folder, file_id)
+        if not os.path.isdir(upload_dir):
             return None
         
-        # ディレクトリ内の最初のPDFファイルを返す
         for file in os.listdir(upload_dir):
             if file.endswith('.pdf'):
-                return os.path.join(upload_dir, file)
+                filepath = os.path.join(upload_dir, file)
+                metadata = self._read_legacy_metadata(file_id) or {}
+                self.index.add_upload(file_id, filepath, os.path.getsize(filepath), self._file_hash(filepath),
+                                      original_filename=metadata.get('original_filename'))
+                return filepath
         
         return None
     
+    def update_upload(self, file_id, **fields):
+        """アップロードの page_count・profile（PDFタイプ解析結果）を記録"""
+        self.index.update_upload(file_id, **fields)
+    
+    def get_upload_record(self, file_id):
+        return self.index.get_upload(file_id)
+    
+    def build_output_path(self, output_id, extension='.pdf'):
+        """抽出結果の保存先（抽出器はここへ直接書き出す）"""
+        os.makedirs(self.temp_folder, exist_ok=True)
+        return os.path.join(self.temp_folder, f"{output_id}{extension}")
+    
+    def register_output(self, output_id, output_path, upload_id=None, engine=None, params=None, result=None):
+        """抽出結果を索引に登録（同じ内容・エンジン・パラメータの再抽出時に再利用する）"""
+        self.index.add_output(output_id, output_path, os.path.getsize(output_path),
+                              upload_id=upload_id, engine=engine, params=params, result=result)
+    
+    def find_output(self, file_id, engine, params):
+        """同じ内容のPDFを同じエンジン・パラメータで抽出済みならその記録を返す"""
+        record = self.index.find_output(file_id, engine, params)
+        if record and os.path.exists(record['path']):
+            return record
+        return None
+    
+    @staticmethod
+    def output_id_for(file_id, engine, params):
+        """抽出結果のID（パラメータごとに別ファイルにする）"""
+        return f"{file_id}_{engine}_{params_key(params)}"
+    
     def get_output_path(self, output_id):
         """出力ファイルのパスを取得"""
+        record = self.index.get_output(output_id)
+        if record:
+            if os.path.exists(record['path']):
+                self.index.touch('outputs', output_id)
+                return record['path']
+            self.index.remove('outputs', output_id)
+            return None
+        
+        # 索引にない出力（旧形式）
         output_file = f"{output_id}.pdf"
         output_path = os.path.join(self.temp_folder, output_file)
         
         if os.path.exists(output_path):
+            self.touch(output_path)
             return output_path
         
         # _extracted.pdf のパターンも試す
@@ -74,63 +154,145 @@ class FileHandler:
         output_path = os.path.join(self.temp_folder, output_file)
         
         if os.path.exists(output_path):
+            self.touch(output_path)
             return output_path
         
         return None
     
     def cleanup_old_files(self):
-        """古いファイルを削除"""
-        current_time = datetime.now()
-        cutoff_time = current_time - timedelta(minutes=self.retention_minutes)
-        
-        # アップロードフォルダのクリーンアップ
-        self._cleanup_directory(self.upload_folder, cutoff_time)
-        
-        # 一時フォルダのクリーンアップ
-        self._cleanup_directory(self.temp_folder, cutoff_time)
+        """最終利用から保持期間を過ぎたファイルを削除し、削除した件数・バイト数を返す"""
+        cutoff = time.time() - self.retention_minutes * 60
+        stats = self._empty_stats()
+        for entry in self.storage_entries():
+            if entry.last_used < cutoff:
+                self._remove_entry(entry, stats)
+        return stats
     
-    def _cleanup_directory(self, directory, cutoff_time):
-        """指定ディレクトリの古いファイルを削除"""
-        if not os.path.exists(directory):
-            return
+    def enforce_quota(self):
+        """容量上限・ディスク空き容量の閾値を超えている場合、最後に使われたのが古い順に削除"""
+        stats = self._empty_stats()
+        entries = self.storage_entries()
+        total = sum(entry.size for entry in entries)
         
-        for item in os.listdir(directory):
-            item_path = os.path.join(directory, item)
-            
-            # ファイルの最終更新時刻を取得
-            try:
-                mtime = datetime.fromtimestamp(os.path.getmtime(item_path))
-                
-                if mtime < cutoff_time:
-                    if os.path.isdir(item_path):
-                        shutil.rmtree(item_path)
-                    else:
-                        os.remove(item_path)
-            except Exception:
-                # エラーが発生した場合はスキップ
-                pass
-    
-    def _save_metadata(self, file_id, metadata):
-        """メタデータを保存"""
-        import json
+        limit = self.quota_bytes if self.quota_bytes > 0 else None
+        if self.min_free_ratio > 0:
+            usage = shutil.disk_usage(self.temp_folder if os.path.exists(self.temp_folder) else '.')
+            shortage = usage.total * self.min_free_ratio - usage.free
+            if shortage > 0:
+                disk_limit = total - shortage
+                limit = disk_limit if limit is None else min(limit, disk_limit)
         
-        metadata_path = os.path.join(self.upload_folder, file_id, 'metadata.json')
+        if limit is None or total <= limit:
+            return stats
         
-        with open(metadata_path, 'w', encoding='utf-8') as f:
-            json.dump(metadata, f, ensure_ascii=False, indent=2)
+        # 閾値を超えたら、上限の target_ratio まで減らす（毎回の削除を避けるため少し余裕を持たせる）
+        target = limit * self.evict_target_ratio
+        for entry in sorted(entries, key=lambda e: e.last_used):
+            if total <= target:
+                break
+            if self._remove_entry(entry, stats):
+                total -= entry.size
+        return stats
     
-    def get_metadata(self, file_id):
-        """メタデータを取得"""
-        import json
+    def storage_entries(self):
+        """アップロード（file_idごとのディレクトリ）と一時ファイルの一覧"""
+        entries = []
+        indexed = {os.path.abspath(self.index.db_path)}
+        for table, record_id, path, size, last_used in self.index.records():
+            entry_path = os.path.dirname(path) if table == 'uploads' else path
+            indexed.add(os.path.abspath(entry_path))
+            entries.append(StorageEntry(entry_path, size, last_used, (table, record_id)))
         
+        # 索引にないファイル（プレビュー・プロファイル・旧形式）は最終更新時刻で判定
+        for directory in (self.upload_folder, self.temp_folder):
+            try:
+                items = list(os.scandir(directory))
+            except FileNotFoundError:
+                continue
+            for item in items:
+                if os.path.abspath(item.path) in indexed or item.path.startswith(self.index.db_path):
+                    continue
+                try:
+                    entries.append(StorageEntry(item.path, self._entry_size(item), item.stat().st_mtime))
+                except FileNotFoundError:
+                    # 走査中に他のワーカーが削除した
+                    continue
+        return entries
+    
+    def touch(self, path):
+        """最終利用時刻を更新（保持期間・LRU削除の基準）"""
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+    
+    def _entry_size(self, item):
+        if not item.is_dir(follow_symlinks=False):
+            return item.stat(follow_symlinks=False).st_size
+        size = 0
+        for root, _, files in os.walk(item.path):
+            for name in files:
+                try:
+                    size += os.lstat(os.path.join(root, name)).st_size
+                except FileNotFoundError:
+                    continue
+        return size
+    
+    def _remove_entry(self, entry, stats):
+        try:
+            if os.path.isdir(entry.path) and not os.path.islink(entry.path):
+                shutil.rmtree(entry.path)
+            else:
+                os.remove(entry.path)
+        except FileNotFoundError:
+            self._remove_record(entry)
+            return False
+        except OSError as e:
+            stats['errors'].append(f"{entry.path}: {e}")
+            return False
+        self._remove_record(entry)
+        stats['files'] += 1
+        stats['bytes'] += entry.size
+        return True
+    
+    def _remove_record(self, entry):
+        if entry.record:
+            self.index.remove(*entry.record)
+    
+    @staticmethod
+    def _empty_stats():
+        return {'files': 0, 'bytes': 0, 'errors': []}
+    
+    @staticmethod
+    def _file_hash(path):
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+    
+    def _read_legacy_metadata(self, file_id):
+        """索引導入前のアップロードに残る metadata.json"""
         metadata_path = os.path.join(self.upload_folder, file_id, 'metadata.json')
-        
         if not os.path.exists(metadata_path):
             return None
-        
         with open(metadata_path, 'r', encoding='utf-8') as f:
             return json.load(f)
     
+    def get_metadata(self, file_id):
+        """メタデータを取得"""
+        record = self.index.get_upload(file_id)
+        if not record:
+            return self._read_legacy_metadata(file_id)
+        return {
+            'original_filename': record['original_filename'],
+            'safe_filename': os.path.basename(record['path']),
+            'upload_time': datetime.fromtimestamp(record['created']).isoformat(),
+            'file_size': record['size'],
+            'page_count': record['page_count'],
+            'hash': record['hash'],
+        }
+    
     def delete_file(self, file_id):
         """ファイルと関連データを削除"""
         # アップロードディレクトリを削除
@@ -141,4 +303,8 @@ class FileHandler:
         # 関連する一時ファイルも削除
         for file in os.listdir(self.temp_folder):
             if file.startswith(file_id):
-                os.remove(os.path.join(self.temp_folder, file))
\ No newline at end of file
+                os.remove(os.path.join(self.temp_folder, file))
+        
+        for output in self.index.outputs_for_upload(file_id):
+            self.index.remove('outputs', output['id'])
+        self.index.remove('uploads', file_id)
\ No newline at end of file
@@ -0,0 +1,128 @@
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+PROFILE_FORMATS = {
+    'pstats': ('.pstats', 'application/octet-stream'),
+    'text': ('.txt', 'text/plain; charset=utf-8'),
+    'collapsed': ('.collapsed', 'text/plain; charset=utf-8'),
+}
+
+
+class SamplingProfiler:
+    """対象スレッドのスタックを一定間隔で採取し、flamegraph用のcollapsed形式に集計"""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.samples = Counter()
+        self._target_thread_id = None
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._target_thread_id = threading.get_ident()
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self._target_thread_id)
+            if frame is None:
+                continue
+
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.samples[';'.join(reversed(stack))] += 1
+
+    def collapsed(self):
+        """flamegraph.pl / speedscope で読み込めるcollapsed stack形式"""
+        return '\n'.join(f"{stack} {count}" for stack, count in self.samples.most_common()) + '\n'
+
+
+class RequestProfiler:
+    """リクエスト単位のオンデマンドプロファイリング（設定で有効化）"""
+
+    def __init__(self, config, output_dir):
+        self.enabled = bool(config.get('PROFILING_ENABLED', False))
+        self.mode = config.get('PROFILING_MODE', 'cprofile')
+        self.sample_interval = float(config.get('PROFILING_SAMPLE_INTERVAL', 0.005))
+        self.header_name = config.get('PROFILING_HEADER', 'X-Profile')
+        self.output_dir = output_dir
+        # cProfileは同時に1つしか有効にできないため直列化する
+        self._lock = threading.Lock()
+
+    def is_requested(self, request):
+        """ヘッダー・クエリ・JSONボディのいずれかでプロファイルが要求されたか"""
+        if not self.enabled:
+            return False
+
+        truthy = {'1', 'true', 'yes', 'on'}
+        if request.headers.get(self.header_name, '').lower() in truthy:
+            return True
+        if request.args.get('profile', '').lower() in truthy:
+            return True
+
+        data = request.get_json(silent=True) if request.is_json else None
+        return isinstance(data, dict) and bool(data.get('profile'))
+
+    def run(self, name, func, *args, **kwargs):
+        """関数をプロファイラ下で実行し、(戻り値, プロファイルID) を返す"""
+        profile_id = f"{name}_{time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+        os.makedirs(self.output_dir, exist_ok=True)
+
+        if self.mode == 'sampling':
+            profiler = SamplingProfiler(self.sample_interval)
+            profiler.start()
+            try:
+                result = func(*args, **kwargs)
+            finally:
+                profiler.stop()
+                self._write(profile_id, 'collapsed', profiler.collapsed())
+            return result, profile_id
+
+        with self._lock:
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                result = func(*args, **kwargs)
+            finally:
+                profiler.disable()
+                self._save_cprofile(profile_id, profiler)
+        return result, profile_id
+
+    def get_profile_path(self, profile_id, fmt):
+        """保存済みプロファイルのパスを取得"""
+        if fmt not in PROFILE_FORMATS or os.path.basename(profile_id) != profile_id:
+            return None
+
+        path = os.path.join(self.output_dir, profile_id + PROFILE_FORMATS[fmt][0])
+        return path if os.path.exists(path) else None
+
+    def _save_cprofile(self, profile_id, profiler):
+        base_path = os.path.join(self.output_dir, profile_id)
+        profiler.dump_stats(base_path + PROFILE_FORMATS['pstats'][0])
+
+        report = io.StringIO()
+        stats = pstats.Stats(profiler, stream=report)
+        stats.sort_stats('cumulative').print_stats(50)
+        self._write(profile_id, 'text', report.getvalue())
+
+    def _write(self, profile_id, fmt, content):
+        path = os.path.join(self.output_dir, profile_id + PROFILE_FORMATS[fmt][0])
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
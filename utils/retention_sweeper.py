@@ -0,0 +1,74 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class RetentionSweeper:
+    """uploads/ と temp/ を定期的に掃除するバックグラウンドスレッド
+
+    1回の掃除で、保持期間を過ぎたファイルの削除と、容量上限・ディスク空き容量に応じた
+    LRU削除（FileHandler.enforce_quota）を行い、削除した件数・バイト数を累計する
+    """
+
+    def __init__(self, file_handler, interval=300):
+        self.file_handler = file_handler
+        self.interval = interval
+        self.totals = {'runs': 0, 'files_freed': 0, 'bytes_freed': 0, 'errors': 0, 'last_run': None}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running or self.interval <= 0:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='retention-sweeper', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def sweep(self):
+        """1回掃除して、今回の削除件数・バイト数を返す"""
+        with self._lock:
+            expired = self.file_handler.cleanup_old_files()
+            evicted = self.file_handler.enforce_quota()
+
+            result = {
+                'expired_files': expired['files'],
+                'evicted_files': evicted['files'],
+                'files_freed': expired['files'] + evicted['files'],
+                'bytes_freed': expired['bytes'] + evicted['bytes'],
+                'errors': expired['errors'] + evicted['errors'],
+            }
+            self.totals['runs'] += 1
+            self.totals['files_freed'] += result['files_freed']
+            self.totals['bytes_freed'] += result['bytes_freed']
+            self.totals['errors'] += len(result['errors'])
+            self.totals['last_run'] = time.time()
+
+        if result['files_freed'] or result['errors']:
+            logger.info(
+                "Retention sweep: freed %d files (%d bytes; expired=%d, evicted=%d), errors=%d",
+                result['files_freed'], result['bytes_freed'],
+                result['expired_files'], result['evicted_files'], len(result['errors'])
+            )
+        for error in result['errors']:
+            logger.warning("Retention sweep could not remove %s", error)
+        return result
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.sweep()
+            except Exception:
+                logger.exception("Retention sweep failed")
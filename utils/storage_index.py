@@ -0,0 +1,194 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS uploads (
+    id TEXT PRIMARY KEY,
+    hash TEXT,
+    path TEXT NOT NULL,
+    original_filename TEXT,
+    size INTEGER NOT NULL DEFAULT 0,
+    page_count INTEGER,
+    profile TEXT,
+    created REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS uploads_hash ON uploads (hash);
+CREATE INDEX IF NOT EXISTS uploads_last_used ON uploads (last_used);
+
+CREATE TABLE IF NOT EXISTS outputs (
+    id TEXT PRIMARY KEY,
+    upload_id TEXT,
+    upload_hash TEXT,
+    engine TEXT,
+    params_key TEXT,
+    params TEXT,
+    result TEXT,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL DEFAULT 0,
+    created REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS outputs_lookup ON outputs (upload_hash, engine, params_key);
+CREATE INDEX IF NOT EXISTS outputs_upload ON outputs (upload_id);
+CREATE INDEX IF NOT EXISTS outputs_last_used ON outputs (last_used);
+"""
+
+TABLES = ('uploads', 'outputs')
+
+# JSONで保存する列
+JSON_COLUMNS = ('profile', 'params', 'result')
+
+
+def params_key(params) -> str:
+    """抽出パラメータの短いダイジェスト（出力IDと結果キャッシュのキー）"""
+    encoded = json.dumps(params, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(encoded.encode('utf-8')).hexdigest()[:12]
+
+
+class StorageIndex:
+    """アップロード・抽出結果の索引（WALモードのSQLite）
+
+    ファイルの場所・サイズ・最終利用時刻を記録し、ID検索と保持期間・LRUの判定を
+    ディレクトリ走査なしで行う。接続はスレッドごとに持ち、複数ワーカーからの同時アクセスはWALに任せる
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # ------------------------------------------------------------
+    # アップロード
+    # ------------------------------------------------------------
+
+    def add_upload(self, upload_id, path, size, file_hash=None, original_filename=None, page_count=None):
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO uploads (id, hash, path, original_filename, size, page_count, created, last_used)'
+                ' VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (upload_id, file_hash, path, original_filename, size, page_count, now, now)
+            )
+
+    def get_upload(self, upload_id):
+        return self._get('uploads', upload_id)
+
+    def update_upload(self, upload_id, **fields):
+        """page_count・profile などを更新"""
+        self._update('uploads', upload_id, fields)
+
+    # ------------------------------------------------------------
+    # 抽出結果
+    # ------------------------------------------------------------
+
+    def add_output(self, output_id, path, size, upload_id=None, engine=None, params=None, result=None):
+        upload = self.get_upload(upload_id) if upload_id else None
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO outputs'
+                ' (id, upload_id, upload_hash, engine, params_key, params, result, path, size, created, last_used)'
+                ' VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (output_id, upload_id, upload['hash'] if upload else None, engine,
+                 params_key(params) if params is not None else None,
+                 self._dump(params), self._dump(result), path, size, now, now)
+            )
+
+    def get_output(self, output_id):
+        return self._get('outputs', output_id)
+
+    def find_output(self, upload_id, engine, params):
+        """同じ内容のアップロード・エンジン・パラメータで作った抽出結果（最新）"""
+        upload = self.get_upload(upload_id)
+        if not upload or not upload['hash']:
+            return None
+        row = self._connection().execute(
+            'SELECT * FROM outputs WHERE upload_hash = ? AND engine = ? AND params_key = ?'
+            ' ORDER BY created DESC LIMIT 1',
+            (upload['hash'], engine, params_key(params))
+        ).fetchone()
+        return self._decode(row)
+
+    def outputs_for_upload(self, upload_id):
+        rows = self._connection().execute('SELECT * FROM outputs WHERE upload_id = ?', (upload_id,)).fetchall()
+        return [self._decode(row) for row in rows]
+
+    # ------------------------------------------------------------
+    # 保持期間・容量管理
+    # ------------------------------------------------------------
+
+    def touch(self, table, record_id):
+        """最終利用時刻を更新"""
+        with self._connection() as conn:
+            conn.execute(f'UPDATE {self._table(table)} SET last_used = ? WHERE id = ?', (time.time(), record_id))
+
+    def remove(self, table, record_id):
+        with self._connection() as conn:
+            conn.execute(f'DELETE FROM {self._table(table)} WHERE id = ?', (record_id,))
+
+    def records(self):
+        """全レコードの (table, id, path, size, last_used)。最後に使われたのが古い順"""
+        rows = self._connection().execute(
+            'SELECT ? AS tbl, id, path, size, last_used FROM uploads'
+            ' UNION ALL SELECT ? AS tbl, id, path, size, last_used FROM outputs'
+            ' ORDER BY last_used',
+            TABLES
+        ).fetchall()
+        return [tuple(row) for row in rows]
+
+    # ------------------------------------------------------------
+
+    def _get(self, table, record_id):
+        row = self._connection().execute(
+            f'SELECT * FROM {self._table(table)} WHERE id = ?', (record_id,)
+        ).fetchone()
+        return self._decode(row)
+
+    def _update(self, table, record_id, fields):
+        if not fields:
+            return
+        columns = ', '.join(f'{name} = ?' for name in fields)
+        values = [self._dump(value) if name in JSON_COLUMNS else value for name, value in fields.items()]
+        with self._connection() as conn:
+            conn.execute(f'UPDATE {self._table(table)} SET {columns} WHERE id = ?', (*values, record_id))
+
+    @staticmethod
+    def _table(table):
+        if table not in TABLES:
+            raise ValueError(f"unknown table: {table}")
+        return table
+
+    @staticmethod
+    def _dump(value):
+        return None if value is None else json.dumps(value, ensure_ascii=False, default=str)
+
+    @staticmethod
+    def _decode(row):
+        if row is None:
+            return None
+        record = dict(row)
+        for name in JSON_COLUMNS:
+            if record.get(name) is not None:
+                record[name] = json.loads(record[name])
+        return record